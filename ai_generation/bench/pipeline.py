@@ -0,0 +1,131 @@
+"""Throughput / latency benchmark of the agent pipeline against the fake provider (no network, no quota).
+
+Every scenario of the grid (max calls x draft mode x fan-out x concurrent decks) generates
+``--decks`` decks through agent_generate with FakeProvider standing in for Gemini and Groq, and
+reports p50/p95/p99 end-to-end deck latency, decks/minute and how often stages fell back:
+
+    python bench/pipeline.py --decks 40 --max-calls 1,2,3 --draft-mode single,per-slide \\
+        --workers 1,8 --fake "latency=lognormal:0.3,0.5;error_rate=0.05;truncate_rate=0.02;fence_rate=0.3"
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from src.fakeprovider import FakeConfig, install_fake_providers  # noqa: E402
+from src.generator import agent_generate, load_datacontext  # noqa: E402
+from src.providers import ProviderPool  # noqa: E402
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    idx = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+def _ints(s: str) -> List[int]:
+    return [int(x) for x in s.split(",") if x.strip()]
+
+
+def run_scenario(ctx, *, decks: int, max_calls: int, draft_mode: str, fanout: int, workers: int, provider_concurrency: int, max_slides: int) -> Dict[str, Any]:
+    pool = ProviderPool(limits={"gemini": provider_concurrency, "groq": provider_concurrency})
+    latencies: List[float] = []
+    fallbacks = 0
+    stage_counts: Dict[str, int] = {}
+
+    def one(i: int) -> None:
+        nonlocal fallbacks
+        run_stats: Dict[str, Any] = {}
+        started = time.perf_counter()
+        agent_generate(
+            topic=f"Benchmark deck {i}",
+            max_slides=max_slides,
+            lang="uk",
+            api_key="fake",
+            model_name="fake-gemini",
+            ctx=ctx,
+            max_calls=max_calls,
+            groq_api_key="fake",
+            groq_model="fake-groq",
+            draft_mode=draft_mode,
+            fanout=fanout,
+            run_stats=run_stats,
+            providers=pool,
+        )
+        latencies.append(time.perf_counter() - started)
+        for stage in (run_stats.get("stages") or {}).values():
+            stage_counts[stage["provider"]] = stage_counts.get(stage["provider"], 0) + 1
+            if stage["provider"] == "fallback":
+                fallbacks += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        list(ex.map(one, range(decks)))
+    wall = time.perf_counter() - started
+    calls = sum(getattr(p, "calls", 0) for p in pool._providers.values())
+    failures = sum(getattr(p, "failures", 0) for p in pool._providers.values())
+    return {
+        "max_calls": max_calls,
+        "draft_mode": draft_mode,
+        "fanout": fanout,
+        "workers": workers,
+        "decks": decks,
+        "wall_s": round(wall, 3),
+        "decks_per_min": round(decks / wall * 60, 1) if wall else None,
+        "p50_s": round(percentile(latencies, 0.50), 3),
+        "p95_s": round(percentile(latencies, 0.95), 3),
+        "p99_s": round(percentile(latencies, 0.99), 3),
+        "mean_s": round(statistics.mean(latencies), 3) if latencies else None,
+        "provider_calls": calls,
+        "provider_errors": failures,
+        "stage_fallbacks": fallbacks,
+        "stage_winners": stage_counts,
+    }
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--decks", type=int, default=20, help="Decks per scenario")
+    p.add_argument("--max-calls", type=_ints, default=[3], help="Comma list, e.g. 1,2,3")
+    p.add_argument("--draft-mode", type=lambda s: [x for x in s.split(",") if x], default=["single"], help="Comma list of single,per-slide,fused")
+    p.add_argument("--fanout", type=_ints, default=[4], help="Comma list; used by per-slide mode")
+    p.add_argument("--workers", type=_ints, default=[4], help="Comma list of concurrent decks")
+    p.add_argument("--provider-concurrency", type=int, default=0, help="In-flight requests per fake provider (0 = unlimited)")
+    p.add_argument("--max-slides", type=int, default=8)
+    p.add_argument("--fake", type=str, default="latency=lognormal:0.2,0.5;fence_rate=0.3;seed=1", help="FakeConfig spec, see src/fakeprovider.py")
+    p.add_argument("--data-dir", type=str, default=str(ROOT.parent / "data"))
+    p.add_argument("--json", type=str, default=None, help="Write all scenario results as JSON")
+    args = p.parse_args()
+
+    ctx = load_datacontext(Path(args.data_dir) / "templates.json", Path(args.data_dir) / "themes.json")
+    install_fake_providers(FakeConfig.parse(args.fake), ctx)
+
+    results = []
+    print(f"{'calls':>5} {'mode':>9} {'fan':>3} {'conc':>4} | {'p50':>6} {'p95':>6} {'p99':>6} | {'decks/min':>9} {'errors':>6} {'fallbk':>6}")
+    for max_calls, mode, fanout, workers in itertools.product(args.max_calls, args.draft_mode, args.fanout, args.workers):
+        if mode != "per-slide" and fanout != args.fanout[0]:
+            continue  # fan-out only applies to per-slide drafting
+        r = run_scenario(ctx, decks=args.decks, max_calls=max_calls, draft_mode=mode, fanout=fanout, workers=workers,
+                         provider_concurrency=args.provider_concurrency, max_slides=args.max_slides)
+        results.append(r)
+        print(f"{max_calls:>5} {mode:>9} {fanout if mode == 'per-slide' else '-':>3} {workers:>4} | {r['p50_s']:>6.2f} {r['p95_s']:>6.2f} {r['p99_s']:>6.2f} | "
+              f"{r['decks_per_min']:>9} {r['provider_errors']:>6} {r['stage_fallbacks']:>6}", flush=True)
+    if args.json:
+        Path(args.json).write_text(json.dumps({"fake": args.fake, "scenarios": results}, ensure_ascii=False, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
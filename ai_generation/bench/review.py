@@ -0,0 +1,82 @@
+"""Throughput of the rule-based reviewer (src/reviewrules.py) on synthetic drafts.
+
+Builds messy drafts for every layout in templates.json (Markdown/HTML in text, long Ukrainian
+bullets, too many bullets, strings where lists belong, stray keys) and reviews them:
+
+    python bench/review.py --slides 20000
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from src.fieldspec import compile_templates  # noqa: E402
+from src.reviewrules import deck_rules  # noqa: E402
+
+WORDS = (
+    "штучний інтелект у освіті допомагає вчителям готувати уроки швидше та точніше, "
+    "а учням — отримувати персональні пояснення; дані аналітика безпека стратегія ризики"
+).split()
+
+
+def sentence(rng: random.Random, lo: int, hi: int) -> str:
+    text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(lo, hi)))
+    return rng.choice((text, f"**{text}**", f"- {text}", f"<b>{text}</b>", f"1. {text}", f"[{text}](http://x)"))
+
+
+def messy_value(spec: str, rng: random.Random) -> Any:
+    if "[]" in spec:
+        items = [sentence(rng, 3, 18) for _ in range(rng.randint(1, 9))]
+        return items if rng.random() < 0.8 else "\n".join(items)
+    if spec.startswith("[") or spec.startswith("{"):
+        return "image.png" if "src" in spec else [{"name": sentence(rng, 1, 3), "role": sentence(rng, 1, 4), "x": 1}]
+    if "boolean" in spec:
+        return rng.choice(("true", "ні", True))
+    return sentence(rng, 2, 10) if rng.random() < 0.9 else [sentence(rng, 2, 6)]
+
+
+def make_slides(templates: List[Dict[str, Any]], count: int, rng: random.Random) -> List[Dict[str, Any]]:
+    layouts = [(t["layout_key"], t["fieldsSchema"]) for t in templates if isinstance(t.get("fieldsSchema"), dict)]
+    slides = []
+    for _ in range(count):
+        lk, schema = rng.choice(layouts)
+        fields = {name: messy_value(spec, rng) for name, spec in schema.items()}
+        if rng.random() < 0.3:
+            fields["speaker_notes"] = sentence(rng, 5, 20)
+        slides.append({"layout_key": lk, "fields": fields})
+    return slides
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--slides", type=int, default=20000, help="Slides to review")
+    ap.add_argument("--templates", type=str, default=str(ROOT.parent / "data" / "templates.json"))
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    templates = json.loads(Path(args.templates).read_text(encoding="utf-8-sig"))
+    compiled = compile_templates(templates)
+    rules = deck_rules(compiled)
+    slides = make_slides(templates, args.slides, random.Random(args.seed))
+
+    started = time.perf_counter()
+    reviewed, fixes = rules.review(slides)
+    elapsed = time.perf_counter() - started
+    valid = sum(1 for s in reviewed if compiled.is_valid_slide(s))
+    before = sum(1 for s in slides if compiled.is_valid_slide(s))
+    print(f"slides={len(slides)} {elapsed:.3f}s {len(slides) / elapsed:,.0f} slides/s "
+          f"({elapsed / len(slides) * 1e6:.1f} µs/slide); schema-valid before={before} after={valid}")
+    print("fixes: " + ", ".join(f"{kind}={n}" for kind, n in sorted(fixes.items())))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,80 @@
+"""Slides kept from cut-off model responses by the salvaging parser (src/jsonstream.salvage_json).
+
+Every deck in data/ (or the given files) is serialized the way a model answers, optionally inside
+a ```json fence with prose, and cut at the given fractions of its length - a response stopped by
+the output token limit. For each cut it reports the share of the deck's slides salvaged, against
+the slides wholly before the cut (the most any parser can keep), and parse throughput. Without
+salvaging every cut response failed json.loads and the whole stage was redone or stubbed.
+
+    python bench/salvage.py --cuts 0.5,0.9,0.95,0.99
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from src.jsonstream import salvage_json  # noqa: E402
+
+
+def deck_slides(path: Path) -> List[Dict[str, Any]]:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8-sig"))
+    except (OSError, ValueError):
+        return []
+    if isinstance(data, dict):
+        data = data.get("slides")
+    if not isinstance(data, list):
+        return []
+    return [s for s in data if isinstance(s, dict) and isinstance(s.get("layout_key"), str) and isinstance(s.get("fields"), dict)]
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("decks", nargs="*", help="Deck files (default: every deck in ../data)")
+    ap.add_argument("--cuts", type=str, default="0.5,0.75,0.9,0.95,0.99", help="Comma-separated fractions of the response kept")
+    ap.add_argument("--fence", action="store_true", help="Wrap responses in a ```json fence with prose before it")
+    args = ap.parse_args()
+
+    cuts = [float(c) for c in args.cuts.split(",") if c.strip()]
+    paths = [Path(p) for p in args.decks] or sorted((ROOT.parent / "data").glob("*.json"))
+    decks = [slides for slides in map(deck_slides, paths) if len(slides) >= 2]
+    print(f"decks={len(decks)} slides={sum(len(d) for d in decks)}")
+    for frac in cuts:
+        total = possible = kept = wrong = chars = 0
+        elapsed = 0.0
+        for slides in decks:
+            # offsets where each slide's text ends, to count the slides a perfect parser could keep
+            ends, text = [], '{"title": "Deck", "slides": ['
+            for i, slide in enumerate(slides):
+                text += (", " if i else "") + json.dumps(slide, ensure_ascii=False)
+                ends.append(len(text))
+            text += "]}"
+            cut = int(len(text) * frac)
+            head = "Ось результат:\n```json\n" if args.fence else ""
+            response = head + text[:cut]
+            started = time.perf_counter()
+            found = salvage_json(response)
+            got = found.items("slides") or []
+            elapsed += time.perf_counter() - started
+            chars += len(response)
+            total += len(slides)
+            possible += sum(1 for e in ends if e <= cut)
+            kept += len(got)
+            wrong += sum(1 for a, b in zip(got, slides) if a != b)
+        print(
+            f"cut at {frac:.0%}: kept {kept}/{total} slides ({kept / max(total, 1):.1%}), "
+            f"{kept / max(possible, 1):.1%} of the {possible} complete before the cut, {wrong} altered; "
+            f"{chars / max(elapsed, 1e-9) / 1e6:.1f} M chars/s"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,95 @@
+"""Validation pass rate of the existing decks under the exported deck JSON Schema (src/schemaexport.py).
+
+For every slide of every deck in data/ (or the given files) compares, before and after the
+rule-based reviewer (src/reviewrules.py):
+  - validate:  schema.validate_deck's check (what the pipeline ships),
+  - schema:    the exported JSON Schema (the shape --draft-mode fused constrains the model to),
+  - capped:    the same schema with the prompt's limits (--max-bullets, default 6).
+A schema that rejects slides validation accepts, once reviewed, would lower the pass rate
+of constrained output; the report shows where the two disagree.
+
+    python bench/schema.py
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from src.fieldspec import compile_templates  # noqa: E402
+from src.reviewrules import MAX_BULLETS, deck_rules  # noqa: E402
+from src.schemaexport import check, deck_json_schema  # noqa: E402
+
+
+def deck_slides(path: Path) -> List[Dict[str, Any]]:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8-sig"))
+    except (OSError, ValueError):
+        return []
+    if isinstance(data, dict):
+        data = data.get("slides")
+    if not isinstance(data, list):
+        return []
+    return [s for s in data if isinstance(s, dict) and isinstance(s.get("layout_key"), str) and isinstance(s.get("fields"), dict)]
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("decks", nargs="*", help="Deck files (default: every deck in ../data)")
+    ap.add_argument("--templates", type=str, default=str(ROOT.parent / "data" / "templates.json"))
+    ap.add_argument("--max-bullets", type=int, default=MAX_BULLETS)
+    ap.add_argument("--show", type=int, default=5, help="Disagreements to print")
+    args = ap.parse_args()
+
+    templates = json.loads(Path(args.templates).read_text(encoding="utf-8-sig"))
+    compiled = compile_templates(templates)
+    rules = deck_rules(compiled)
+    item = deck_json_schema(templates)["properties"]["slides"]["items"]
+    capped = deck_json_schema(templates, max_bullets=args.max_bullets)["properties"]["slides"]["items"]
+    paths = [Path(p) for p in args.decks] or sorted((ROOT.parent / "data").glob("*.json"))
+
+    counts: Counter = Counter()
+    reasons: Counter = Counter()
+    shown = 0
+    for path in paths:
+        slides = deck_slides(path)
+        if not slides:
+            continue
+        counts["decks"] += 1
+        reviewed, _ = rules.review(slides)
+        for phase, batch in (("raw", slides), ("reviewed", reviewed)):
+            for i, slide in enumerate(batch):
+                valid = compiled.is_valid_slide(slide)
+                errors = check(item, slide)
+                counts[f"{phase} slides"] += 1
+                counts[f"{phase} validate"] += valid
+                counts[f"{phase} schema"] += not errors
+                counts[f"{phase} capped"] += not check(capped, slide)
+                if valid != (not errors):
+                    counts[f"{phase} disagree"] += 1
+                    reasons[errors[0].split(": ", 1)[-1] if errors else "validate only"] += 1
+                    if phase == "reviewed" and shown < args.show:
+                        print(f"{path.name} slide[{i}]: validate={valid} schema={errors[:2]}")
+                        shown += 1
+
+    print(f"decks={counts['decks']}")
+    for phase in ("raw", "reviewed"):
+        n = counts[f"{phase} slides"] or 1
+        print(
+            f"{phase:>8}: slides={counts[f'{phase} slides']} validate={counts[f'{phase} validate'] / n:.1%} "
+            f"schema={counts[f'{phase} schema'] / n:.1%} capped={counts[f'{phase} capped'] / n:.1%} "
+            f"disagree={counts[f'{phase} disagree']}"
+        )
+    if reasons:
+        print("disagreements: " + ", ".join(f"{r} x{n}" for r, n in reasons.most_common(5)))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,102 @@
+"""Cold-start benchmark for cli.py, based on ``python -X importtime``.
+
+Runs an offline generation several times in fresh interpreters and reports the wall time, the
+total import time and the slowest top-level imports. Exits with status 1 when the median wall
+time exceeds ``--budget-ms`` so the cold-start budget can be tracked in CI:
+
+    python bench/startup.py --runs 5 --budget-ms 400 --json startup.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def parse_importtime(stderr: str) -> Tuple[int, Dict[str, int]]:
+    """Return (sum of self times, {top-level module: cumulative us}) from -X importtime output."""
+    total = 0
+    top: Dict[str, int] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative, name = line[len("import time:"):].split("|", 2)
+        try:
+            total += int(self_us)
+        except ValueError:
+            continue
+        name = name.rstrip()
+        if not name.startswith("  "):  # one leading space = imported directly by the entry script
+            top[name.strip()] = int(cumulative)
+    return total, top
+
+
+def run_once(args: argparse.Namespace, out: Path) -> Tuple[float, int, Dict[str, int]]:
+    cmd = [sys.executable, "-X", "importtime", str(ROOT / "cli.py"), "--topic", args.topic, "--offline", "--no-cache", "--out", str(out)]
+    if args.no_snapshot:
+        cmd.append("--no-snapshot")
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="0")
+    started = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True, env=env)
+    wall = time.perf_counter() - started
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stdout + proc.stderr)
+        raise SystemExit(f"cli.py failed with exit code {proc.returncode}")
+    total, top = parse_importtime(proc.stderr)
+    return wall, total, top
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--runs", type=int, default=5)
+    p.add_argument("--topic", default="Startup benchmark")
+    p.add_argument("--budget-ms", type=float, default=None, help="Fail when the median wall time exceeds this")
+    p.add_argument("--no-snapshot", action="store_true", help="Benchmark without the context snapshot")
+    p.add_argument("--top", type=int, default=10, help="How many slow imports to list")
+    p.add_argument("--json", default=None, help="Write results as JSON")
+    args = p.parse_args()
+
+    walls: List[float] = []
+    imports: List[int] = []
+    per_module: Dict[str, List[int]] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        out = Path(tmp) / "deck.json"
+        run_once(args, out)  # warm-up: bytecode and snapshot are written once, like any repeat invocation
+        for _ in range(max(1, args.runs)):
+            wall, total, top = run_once(args, out)
+            walls.append(wall * 1000)
+            imports.append(total // 1000)
+            for name, us in top.items():
+                per_module.setdefault(name, []).append(us)
+
+    slow = sorted(((statistics.median(v) / 1000, k) for k, v in per_module.items()), reverse=True)[: args.top]
+    result = {
+        "runs": len(walls),
+        "wall_ms_median": round(statistics.median(walls), 1),
+        "wall_ms_min": round(min(walls), 1),
+        "import_ms_median": statistics.median(imports),
+        "slowest_imports_ms": {name: round(ms, 1) for ms, name in slow},
+        "budget_ms": args.budget_ms,
+    }
+    print(f"startup: median {result['wall_ms_median']} ms (min {result['wall_ms_min']} ms), imports {result['import_ms_median']} ms over {len(walls)} runs")
+    for ms, name in slow:
+        print(f"  {ms:8.1f} ms  {name}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(result, indent=2), encoding="utf-8")
+    if args.budget_ms is not None and result["wall_ms_median"] > args.budget_ms:
+        print(f"over budget: {result['wall_ms_median']} ms > {args.budget_ms} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
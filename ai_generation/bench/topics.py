@@ -0,0 +1,89 @@
+"""Lookup latency of the near-duplicate topic index (src/topicindex.py) as it grows.
+
+Fills an in-memory TopicIndex with synthetic Ukrainian/English topics, then times lookups of
+reworded variants (case, punctuation, one word swapped) and of unrelated topics:
+
+    python bench/topics.py --entries 1000,10000,50000 --queries 2000
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from src.topicindex import TopicIndex  # noqa: E402
+
+WORDS = (
+    "штучний інтелект освіта освіті оборона аналітика дані навчання глибоке глибокого мережі нейронні "
+    "управління рішення рішень безпека кібербезпека економіка медицина право історія культура мова "
+    "школа університет бізнес маркетинг фінанси стратегія ризики інновації цифрова трансформація "
+    "ai machine learning education data analytics cloud security strategy finance marketing design "
+    "product research policy health energy climate web presenter powerpoint deep networks"
+).split()
+CONNECTORS = ("у", "в", "для", "та", "і", "in", "for", "and", "of")
+
+
+def make_topic(rng: random.Random) -> str:
+    words = rng.sample(WORDS, rng.randint(2, 4))
+    words.insert(rng.randint(1, len(words)), rng.choice(CONNECTORS))
+    return " ".join(words).capitalize()
+
+
+def reword(topic: str, rng: random.Random) -> str:
+    words = topic.split()
+    i = rng.randrange(len(words))
+    words[i] = rng.choice(CONNECTORS) if words[i].lower() in CONNECTORS else words[i]
+    text = " ".join(words)
+    return rng.choice((text.upper(), text.lower() + "!", f"«{text}»", text + " ?"))
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--entries", type=str, default="1000,10000,50000", help="Comma-separated index sizes")
+    ap.add_argument("--queries", type=int, default=2000, help="Lookups per size (half near-duplicates, half unrelated)")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    plan = {"title": "x", "outline": [{"layout_key": "Title Slide", "title": "x"}]}
+    for size in (int(x) for x in args.entries.split(",") if x.strip()):
+        rng = random.Random(args.seed)
+        index = TopicIndex()
+        topics = [make_topic(rng) for _ in range(size)]
+        started = time.perf_counter()
+        for topic in topics:
+            index.add(topic, lang="uk", max_slides=8, plan=plan)
+        build = time.perf_counter() - started
+
+        near: List[float] = []
+        far: List[float] = []
+        hits = 0
+        for q in range(args.queries):
+            related = q % 2 == 0
+            query = reword(rng.choice(topics), rng) if related else " ".join(rng.choice(("zz", "qx", "йй")) for _ in range(4))
+            t0 = time.perf_counter()
+            match = index.lookup(query, lang="uk", max_slides=8)
+            (near if related else far).append((time.perf_counter() - t0) * 1000)
+            hits += int(related and match is not None and match.similarity >= 0.8)
+        print(
+            f"entries={size:>6} build={build:.2f}s "
+            f"near p50={statistics.median(near):.3f}ms p99={percentile(near, 0.99):.3f}ms "
+            f"unrelated p50={statistics.median(far):.3f}ms p99={percentile(far, 0.99):.3f}ms "
+            f"near-dup hits={hits}/{len(near)}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
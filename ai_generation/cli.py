@@ -2,11 +2,230 @@ from __future__ import annotations
 
 import argparse
 import json
+import re
+import time
+from contextlib import ExitStack, contextmanager
 from pathlib import Path
 import sys
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
-from src.config import load_settings
-from src.generator import load_datacontext, agent_generate
+from src.cache import ResponseCache
+from src.config import Settings, load_settings, parse_provider_order
+from src.generator import DataContext, load_datacontext, agent_generate, configure_providers, provider_chains
+from src.hedging import HedgePolicy
+from src.journal import Journal
+from src.library import DeckLibrary
+from src.providers import default_pool, set_provider_concurrency
+from src.topicindex import TopicIndex
+
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent / ".cache" / "responses"
+DEFAULT_SNAPSHOT_DIR = Path(__file__).resolve().parent / ".cache" / "context"
+DEFAULT_BREAKER_STATE = Path(__file__).resolve().parent / ".cache" / "breakers.json"
+DEFAULT_RATE_LIMIT_DB = Path(__file__).resolve().parent / ".cache" / "ratelimit.sqlite3"
+DEFAULT_PLANS_DIR = Path(__file__).resolve().parent / ".cache" / "plans"
+DEFAULT_TOPIC_INDEX = Path(__file__).resolve().parent / ".cache" / "topics.jsonl"
+DEFAULT_LIBRARY_INDEX = Path(__file__).resolve().parent / ".cache" / "library.sqlite3"
+DEFAULT_JOBS_DIR = Path(__file__).resolve().parent / ".cache" / "jobs"
+
+
+def slugify(s: str) -> str:
+    s = s.lower().strip()
+    s = re.sub(r"[^a-z0-9\u0400-\u04FF]+", "-", s)  # keep latin + cyrillic
+    s = re.sub(r"-+", "-", s).strip("-")
+    return s or "generated"
+
+
+def _add_data_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--data-dir", type=str, default=None, help="Directory containing templates.json and themes.json (defaults to ../data)")
+    p.add_argument("--templates", type=str, default=None, help="Explicit path to templates.json (overrides --data-dir)")
+    p.add_argument("--themes", type=str, default=None, help="Explicit path to themes.json (overrides --data-dir)")
+    p.add_argument("--no-snapshot", action="store_true", help=f"Always re-parse templates/themes instead of using the context snapshot in {DEFAULT_SNAPSHOT_DIR}")
+
+
+def _resolve_data_paths(args: argparse.Namespace) -> Tuple[Path, Path]:
+    data_dir = Path(args.data_dir) if args.data_dir else (Path(__file__).resolve().parents[1] / "data")
+    templates_path = Path(args.templates) if args.templates else (data_dir / "templates.json")
+    themes_path = Path(args.themes) if args.themes else (data_dir / "themes.json")
+
+    if not templates_path.exists():
+        raise FileNotFoundError(f"templates.json not found at {templates_path}")
+    if not themes_path.exists():
+        raise FileNotFoundError(f"themes.json not found at {themes_path}")
+    return templates_path, themes_path
+
+
+def _load_context(args: argparse.Namespace, templates_path: Path, themes_path: Path) -> DataContext:
+    if args.no_snapshot:
+        return load_datacontext(templates_path, themes_path)
+    from src.snapshot import load_datacontext_snapshot
+
+    return load_datacontext_snapshot(templates_path, themes_path, DEFAULT_SNAPSHOT_DIR, verbose=getattr(args, "verbose", False))
+
+
+def _add_draft_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--draft-mode", choices=["single", "per-slide", "fused"], default="single", help="single = one drafter request per deck; per-slide = concurrent requests per outline window; fused = one schema-constrained call plans and drafts the deck")
+    p.add_argument("--fanout", type=int, default=4, help="Max concurrent drafter requests per deck in per-slide mode")
+    p.add_argument("--draft-window", type=int, default=1, help="Outline items per drafter request in per-slide mode")
+    p.add_argument("--draft-retries", type=int, default=1, help="Extra attempts for a failed slide window before falling back to stub")
+    p.add_argument("--llm-review", action="store_true", help="Send slides that still fail their schema after the rule-based review to the reviewer model (one more call)")
+
+
+def _add_hedge_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--hedge", action="store_true", help="Race Gemini and Groq per stage: fire Groq if Gemini is slower than its recent latency percentile")
+    p.add_argument("--hedge-percentile", type=float, default=0.9, help="Latency percentile of the primary provider used as the hedge delay")
+    p.add_argument("--hedge-delay", type=float, default=10.0, help="Hedge delay in seconds until enough latency samples exist")
+
+
+def _add_plan_reuse_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--plan-reuse-threshold", type=float, default=0.75, help="Reuse the stored plan of a past topic at least this similar (character n-gram Jaccard, 0..1) instead of calling the planner")
+    p.add_argument("--topic-index", type=str, default=None, help=f"JSON-lines index of past topics and their plans (defaults to {DEFAULT_TOPIC_INDEX})")
+    p.add_argument("--no-plan-reuse", action="store_true", help="Always call the planner; do not look up or record similar topics")
+
+
+def _topic_index(args: argparse.Namespace) -> Optional[TopicIndex]:
+    if args.no_plan_reuse:
+        return None
+    if args.fake:
+        return TopicIndex()  # synthetic plans stay out of the persisted index
+    return TopicIndex(Path(args.topic_index) if args.topic_index else DEFAULT_TOPIC_INDEX)
+
+
+def _response_cache(args: argparse.Namespace) -> Optional[ResponseCache]:
+    # fake providers answer under the real provider names and configs, so their synthetic text
+    # would be replayed by later real runs under the same keys
+    if args.no_cache or args.offline or args.fake:
+        return None
+    return ResponseCache(Path(args.cache_dir) if args.cache_dir else DEFAULT_CACHE_DIR)
+
+
+def _add_example_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--examples", type=int, default=0, metavar="K", help="Add up to K example slides per planned layout to drafter prompts, picked from the deck library by BM25 relevance (0 = off)")
+    p.add_argument("--library", type=str, action="append", default=None, metavar="DIR", help="Directory of deck JSON files to pick examples from (repeatable; defaults to the data dir)")
+    p.add_argument("--library-index", type=str, default=None, help=f"SQLite BM25 index of the deck library (defaults to {DEFAULT_LIBRARY_INDEX})")
+
+
+def _deck_library(args: argparse.Namespace) -> Optional[DeckLibrary]:
+    if args.examples <= 0:
+        return None
+    roots = [Path(d) for d in args.library] if args.library else [_resolve_data_paths(args)[0].parent]
+    return DeckLibrary(Path(args.library_index) if args.library_index else DEFAULT_LIBRARY_INDEX, roots)
+
+
+def _add_retry_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--retries", type=int, default=2, help="Retries per provider call on transient errors (429/5xx/timeouts), with exponential backoff and jitter")
+    p.add_argument("--retry-base-delay", type=float, default=0.5, help="Backoff base delay in seconds (doubles per retry, full jitter)")
+    p.add_argument("--breaker-threshold", type=int, default=5, help="Consecutive transient failures that open a provider's circuit breaker")
+    p.add_argument("--breaker-cooldown", type=float, default=60.0, help="Seconds an open breaker skips its provider before letting a probe call through")
+    p.add_argument("--breaker-state", type=str, default=str(DEFAULT_BREAKER_STATE), help="File the breaker states persist in between runs ('' = in memory only; ignored with --fake)")
+
+
+def _apply_retry(args: argparse.Namespace) -> None:
+    from src.resilience import BreakerRegistry, RetryPolicy
+
+    # fake providers share the real names, so their simulated outages must not reach the persisted state
+    state = Path(args.breaker_state) if args.breaker_state and not args.fake else None
+    default_pool().set_resilience(
+        RetryPolicy(retries=max(0, args.retries), base_delay=args.retry_base_delay),
+        BreakerRegistry(state, threshold=args.breaker_threshold, cooldown=args.breaker_cooldown),
+    )
+
+
+def _add_rate_limit_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--rate-limit", action="append", default=[], metavar="NAME=RPM/TPM",
+                   help="Requests/tokens per minute for a provider or provider:model, e.g. gemini=15/1000000 (repeatable; overrides GEMINI_RPM/GEMINI_TPM/GROQ_RPM/GROQ_TPM)")
+    p.add_argument("--rate-limit-db", type=str, default=str(DEFAULT_RATE_LIMIT_DB), help="SQLite file holding the budgets shared by all processes on this host ('' = this process only; ignored with --fake)")
+
+
+def _apply_rate_limits(args: argparse.Namespace, settings: Settings) -> None:
+    from src.ratelimit import RateLimit, RateLimiter
+
+    limits = dict(settings.rate_limits)
+    for spec in args.rate_limit:
+        name, sep, value = spec.partition("=")
+        if not sep:
+            raise SystemExit(f"--rate-limit expects NAME=RPM/TPM, got '{spec}'")
+        limits[name.strip()] = RateLimit.parse(value.strip())
+    if not any(limit.active for limit in limits.values()):
+        return
+    # a fake run must not spend (or wait on) the real providers' shared budget
+    db = Path(args.rate_limit_db) if args.rate_limit_db and not args.fake else None
+    default_pool().set_rate_limiter(RateLimiter(db, limits))
+
+
+def _add_provider_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--providers", type=str, default=None, metavar="ORDER",
+                   help="Providers each stage tries, in order: 'local,gemini,groq' for all stages or 'gemini,groq;draft=local,gemini' per stage "
+                        "(plan, draft, review, fused; overrides PROVIDERS). 'local' is the OpenAI-compatible server at LOCAL_BASE_URL")
+
+
+def _apply_providers(args: argparse.Namespace, settings: Settings) -> None:
+    """--providers (or PROVIDERS) into Settings.provider_order; the local backend is set up from Settings.local_*."""
+    if args.providers:
+        try:
+            settings.provider_order = parse_provider_order(args.providers)
+        except ValueError as e:
+            raise SystemExit(f"--providers: {e}")
+    elif settings.providers_spec and not args.offline:
+        try:
+            settings.provider_order = parse_provider_order(settings.providers_spec)
+        except ValueError as e:
+            raise SystemExit(f"PROVIDERS: {e}")
+    configure_providers(settings)
+
+
+def _add_fake_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--fake", type=str, default=None, metavar="SPEC",
+                   help="Use the fake LLM provider instead of Gemini/Groq, e.g. 'latency=lognormal:0.3,0.5;error_rate=0.05;fence_rate=0.3' (see src/fakeprovider.py)")
+
+
+def _apply_fake(args: argparse.Namespace, settings: Settings, ctx: DataContext) -> None:
+    """With --fake, route every provider to FakeProvider and give Gemini/Groq placeholder keys (no network)."""
+    if not args.fake:
+        return
+    from src.fakeprovider import FakeConfig, install_fake_providers
+
+    install_fake_providers(FakeConfig.parse(args.fake), ctx)
+    settings.google_api_key = "fake"
+    settings.groq_api_key = "fake"
+
+
+def _add_trace_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--trace", type=str, default=None, metavar="FILE", help="Append per-stage/per-call trace spans to this JSON-lines file")
+    p.add_argument("--metrics", type=str, default=None, metavar="FILE", help="Write Prometheus text-format metrics to this file (rewritten after every deck)")
+    p.add_argument("--profile", type=str, default=None, metavar="DIR", help="Run under cProfile + tracemalloc and save profile.pstats, profile.txt and tracemalloc.txt to DIR")
+
+
+@contextmanager
+def _observed(args: argparse.Namespace) -> Iterator[None]:
+    """Tracing (--trace/--metrics) and profiling (--profile) around a run; no-ops when the flags are absent."""
+    with ExitStack() as stack:
+        if args.trace or args.metrics:
+            from src.tracing import Tracer, set_tracer
+
+            tracer = Tracer(args.trace, args.metrics)
+            set_tracer(tracer)
+            stack.callback(tracer.close)
+            stack.callback(set_tracer, None)
+        if args.profile:
+            from src.profiling import profile_run
+
+            stack.enter_context(profile_run(Path(args.profile)))
+        yield
+
+
+def _draft_options(args: argparse.Namespace) -> Dict[str, Any]:
+    return {
+        "draft_mode": args.draft_mode,
+        "fanout": args.fanout,
+        "draft_window": args.draft_window,
+        "draft_retries": args.draft_retries,
+        "hedge": HedgePolicy(percentile=args.hedge_percentile, default_delay=args.hedge_delay) if args.hedge else None,
+        "topics": _topic_index(args),
+        "reuse_threshold": args.plan_reuse_threshold,
+        "library": _deck_library(args),
+        "examples_per_layout": args.examples,
+        "llm_review": args.llm_review,
+    }
 
 
 def parse_args() -> argparse.Namespace:
@@ -14,79 +233,404 @@ def parse_args() -> argparse.Namespace:
     g = p.add_mutually_exclusive_group(required=True)
     g.add_argument("--topic", type=str, help="Topic/title for the presentation")
     g.add_argument("--prompt-file", type=str, help="Path to a text/markdown prompt file (topic/brief)")
-    p.add_argument("--data-dir", type=str, default=None, help="Directory containing templates.json and themes.json (defaults to ../data)")
-    p.add_argument("--templates", type=str, default=None, help="Explicit path to templates.json (overrides --data-dir)")
-    p.add_argument("--themes", type=str, default=None, help="Explicit path to themes.json (overrides --data-dir)")
-    p.add_argument("--out", type=str, default=None, help="Output JSON path (defaults to <data-dir>/slides_<slug>.json)")
+    g.add_argument("--resume", type=str, metavar="JOB", help="Continue an interrupted or partly failed job from its stage journal (topic, lang, size and output are taken from it)")
+    _add_data_args(p)
+    p.add_argument("--out", type=str, default=None, help="Output JSON path (defaults to <data-dir>/slides_<slug>.json, or the --update deck)")
+    p.add_argument("--update", type=str, default=None, metavar="DECK", help="Existing deck JSON to update: keep slides the new plan still contains, draft only new/changed outline items")
     p.add_argument("--lang", type=str, default="uk", help="Language hint (uk/en/...) for generation")
     p.add_argument("--max-slides", type=int, default=8, help="Max slides to generate (hint)")
     p.add_argument("--offline", action="store_true", help="Force stub (no network)")
-    p.add_argument("--max-calls", type=int, default=3, help="Max Gemini calls (0..3): 3=plan+draft+review, 2=plan+draft, 1=draft only, 0=offline")
+    p.add_argument("--max-calls", type=int, default=3, help="Max Gemini calls (0..3): 3=plan+draft+review (review only with --llm-review), 2=plan+draft, 1=draft only, 0=offline")
+    p.add_argument("--cache-dir", type=str, default=None, help=f"Directory for cached model responses (defaults to {DEFAULT_CACHE_DIR})")
+    p.add_argument("--no-cache", action="store_true", help="Disable the on-disk response cache (always off with --fake)")
+    _add_draft_args(p)
+    _add_hedge_args(p)
+    _add_plan_reuse_args(p)
+    _add_example_args(p)
+    _add_retry_args(p)
+    _add_rate_limit_args(p)
+    _add_provider_args(p)
+    _add_fake_args(p)
+    _add_trace_args(p)
+    p.add_argument("--no-journal", action="store_true", help=f"Do not keep the per-job stage journal in {DEFAULT_JOBS_DIR} that --resume continues from")
+    p.add_argument("--stream", action="store_true", help="Stream the drafter response and append each validated slide to <out>.partial.jsonl as it arrives")
     p.add_argument("--verbose", action="store_true", help="Verbose agent logs")
     return p.parse_args()
 
 
+def parse_batch_args(argv: List[str]) -> argparse.Namespace:
+    p = argparse.ArgumentParser(prog="cli.py batch", description="Generate many decks concurrently from a JSONL/CSV manifest")
+    p.add_argument("--manifest", type=str, required=True, help="JSONL or CSV with topic|prompt_file, lang?, max_slides?, max_calls?, out?")
+    _add_data_args(p)
+    p.add_argument("--out-dir", type=str, default=None, help="Directory for decks without an explicit 'out' (defaults to the templates folder)")
+    p.add_argument("--report", type=str, default=None, help="Summary report path (defaults to <out-dir>/batch_report.json)")
+    p.add_argument("--resume", action="store_true", help="Continue each deck's latest unfinished job (same output path) from its stage journal")
+    p.add_argument("--no-journal", action="store_true", help=f"Do not keep per-deck stage journals in {DEFAULT_JOBS_DIR}")
+    p.add_argument("--workers", type=int, default=4, help="Decks generated concurrently")
+    p.add_argument("--gemini-concurrency", type=int, default=2, help="Max in-flight Gemini requests across workers (0 = unlimited)")
+    p.add_argument("--groq-concurrency", type=int, default=2, help="Max in-flight Groq requests across workers (0 = unlimited)")
+    p.add_argument("--offline", action="store_true", help="Force stub (no network)")
+    p.add_argument("--max-calls", type=int, default=3, help="Default Gemini call budget per deck (manifest 'max_calls' overrides)")
+    p.add_argument("--cache-dir", type=str, default=None, help=f"Directory for cached model responses (defaults to {DEFAULT_CACHE_DIR})")
+    p.add_argument("--no-cache", action="store_true", help="Disable the on-disk response cache (always off with --fake)")
+    _add_draft_args(p)
+    _add_hedge_args(p)
+    _add_plan_reuse_args(p)
+    _add_example_args(p)
+    _add_retry_args(p)
+    _add_rate_limit_args(p)
+    _add_provider_args(p)
+    _add_fake_args(p)
+    _add_trace_args(p)
+    p.add_argument("--verbose", action="store_true", help="Verbose agent logs")
+    return p.parse_args(argv)
+
+
+def parse_serve_args(argv: List[str]) -> argparse.Namespace:
+    p = argparse.ArgumentParser(prog="cli.py serve", description="Local generation daemon: warm context and provider clients, bounded priority job queue, HTTP API")
+    _add_data_args(p)
+    p.add_argument("--host", type=str, default="127.0.0.1", help="Bind address (keep it on localhost)")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--workers", type=int, default=2, help="Decks generated concurrently")
+    p.add_argument("--queue-size", type=int, default=100, help="Max queued jobs; further submissions get HTTP 503")
+    p.add_argument("--cors-origin", action="append", default=[], metavar="ORIGIN",
+                   help="Origin allowed to call the API from a browser, e.g. http://localhost:8000 for the SPA (repeatable; none by default)")
+    p.add_argument("--gemini-concurrency", type=int, default=2, help="Max in-flight Gemini requests across workers (0 = unlimited)")
+    p.add_argument("--groq-concurrency", type=int, default=2, help="Max in-flight Groq requests across workers (0 = unlimited)")
+    p.add_argument("--offline", action="store_true", help="Force stub (no network)")
+    p.add_argument("--max-calls", type=int, default=3, help="Default Gemini call budget per deck (a job's 'max_calls' overrides)")
+    p.add_argument("--cache-dir", type=str, default=None, help=f"Directory for cached model responses (defaults to {DEFAULT_CACHE_DIR})")
+    p.add_argument("--no-cache", action="store_true", help="Disable the on-disk response cache (always off with --fake)")
+    _add_draft_args(p)
+    _add_hedge_args(p)
+    _add_plan_reuse_args(p)
+    _add_example_args(p)
+    _add_retry_args(p)
+    _add_rate_limit_args(p)
+    _add_provider_args(p)
+    _add_fake_args(p)
+    _add_trace_args(p)
+    p.add_argument("--verbose", action="store_true", help="Verbose agent and request logs")
+    return p.parse_args(argv)
+
+
+def serve_main(argv: List[str]) -> int:
+    from src.server import GenerationServer, make_http_server
+
+    args = parse_serve_args(argv)
+    settings = load_settings()
+    templates_path, themes_path = _resolve_data_paths(args)
+    ctx = _load_context(args, templates_path, themes_path)
+    _apply_providers(args, settings)
+    _apply_fake(args, settings, ctx)
+    default_pool().set_timeout(settings.timeout)
+    _apply_retry(args)
+    _apply_rate_limits(args, settings)
+    set_provider_concurrency({"gemini": args.gemini_concurrency, "groq": args.groq_concurrency})
+    cache = _response_cache(args)
+    service = GenerationServer(
+        ctx=ctx,
+        settings=settings,
+        workers=args.workers,
+        queue_size=args.queue_size,
+        max_calls=args.max_calls,
+        offline=args.offline,
+        cache=cache,
+        options=_draft_options(args),
+        verbose=args.verbose,
+    )
+    httpd = make_http_server(service, args.host, args.port, allow_origins=args.cors_origin)
+    service.start()
+    host, port = httpd.server_address[:2]
+    print(f"Serving on http://{host}:{port} ({args.workers} workers, queue {args.queue_size}{', offline' if args.offline else ''})", flush=True)
+    with _observed(args):
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            httpd.server_close()
+            service.stop(timeout=5)
+    return 0
+
+
+def parse_local_server_args(argv: List[str]) -> argparse.Namespace:
+    p = argparse.ArgumentParser(prog="cli.py local-server", description="Stand-in OpenAI-compatible model server for offline runs and tests: set LOCAL_BASE_URL=http://<host>:<port>/v1")
+    _add_data_args(p)
+    p.add_argument("--host", type=str, default="127.0.0.1", help="Bind address (keep it on localhost)")
+    p.add_argument("--port", type=int, default=8080)
+    p.add_argument("--model", type=str, default="local", help="Model id reported by /v1/models")
+    p.add_argument("--fake", type=str, default="latency=const:0.05", metavar="SPEC",
+                   help="Simulated latency, errors, truncation and fences of the answers, as for --fake (see src/fakeprovider.py)")
+    p.add_argument("--verbose", action="store_true", help="Log every request")
+    return p.parse_args(argv)
+
+
+def local_server_main(argv: List[str]) -> int:
+    from src.fakeprovider import FakeConfig
+    from src.localserver import LocalModelServer, make_local_server
+
+    args = parse_local_server_args(argv)
+    templates_path, themes_path = _resolve_data_paths(args)
+    ctx = _load_context(args, templates_path, themes_path)
+    service = LocalModelServer(ctx, FakeConfig.parse(args.fake), model=args.model, verbose=args.verbose)
+    httpd = make_local_server(service, args.host, args.port)
+    host, port = httpd.server_address[:2]
+    print(f"Local model server on http://{host}:{port}/v1 (model '{args.model}')", flush=True)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+    return 0
+
+
+def parse_validate_args(argv: List[str]) -> argparse.Namespace:
+    p = argparse.ArgumentParser(prog="cli.py validate", description="Stream-validate deck files (.json or slides.jsonl) against templates.json in constant memory")
+    p.add_argument("decks", nargs="+", help="Deck files: a JSON array / {\"slides\": [...]} or one slide per line (.jsonl)")
+    p.add_argument("--templates", type=str, default=None, help="Path to templates.json (defaults to ../data/templates.json)")
+    return p.parse_args(argv)
+
+
+def validate_main(argv: List[str]) -> int:
+    from src.schema import validate_deck_file
+
+    args = parse_validate_args(argv)
+    templates_path = Path(args.templates) if args.templates else (Path(__file__).resolve().parents[1] / "data" / "templates.json")
+    templates = json.loads(templates_path.read_text(encoding="utf-8-sig"))
+    failed = 0
+    for deck in args.decks:
+        count = 0
+        for index, offset, error in validate_deck_file(deck, templates):
+            where = f"slide[{index}]" if index >= 0 else "file"
+            print(f"{deck}: {where} @ byte {offset}: {error}", flush=True)
+            count += 1
+        failed += bool(count)
+    print(f"Validated {len(args.decks)} deck(s), {failed} with issues")
+    return 1 if failed else 0
+
+
+def parse_schema_args(argv: List[str]) -> argparse.Namespace:
+    p = argparse.ArgumentParser(prog="cli.py schema", description="Export templates.json fieldsSchema as a deck JSON Schema (a union discriminated by layout_key) or a Gemini response_schema")
+    p.add_argument("--templates", type=str, default=None, help="Path to templates.json (defaults to ../data/templates.json)")
+    p.add_argument("--flavor", choices=["json-schema", "gemini"], default="json-schema", help="json-schema = draft 2020-12 with oneOf; gemini = the flattened form Gemini's response_schema accepts")
+    p.add_argument("--layouts", type=str, default=None, help="Comma-separated layout_key subset (default: all templates)")
+    p.add_argument("--max-slides", type=int, default=None, help="Cap the slides array (maxItems)")
+    p.add_argument("--max-bullets", type=int, default=None, help="Cap every array-of-strings field (maxItems)")
+    p.add_argument("--out", type=str, default=None, help="Write here instead of stdout")
+    return p.parse_args(argv)
+
+
+def schema_main(argv: List[str]) -> int:
+    from src.schemaexport import deck_json_schema, gemini_response_schema
+
+    args = parse_schema_args(argv)
+    templates_path = Path(args.templates) if args.templates else (Path(__file__).resolve().parents[1] / "data" / "templates.json")
+    templates = json.loads(templates_path.read_text(encoding="utf-8-sig"))
+    export = deck_json_schema if args.flavor == "json-schema" else gemini_response_schema
+    layouts = [x.strip() for x in args.layouts.split(",") if x.strip()] if args.layouts else None
+    text = json.dumps(export(templates, layout_keys=layouts, max_slides=args.max_slides, max_bullets=args.max_bullets), ensure_ascii=False, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + "\n", encoding="utf-8")
+        print(f"Saved: {args.out}")
+    else:
+        print(text)
+    return 0
+
+
+def batch_main(argv: List[str]) -> int:
+    from src.batch import load_manifest, run_batch, write_report
+
+    args = parse_batch_args(argv)
+    settings = load_settings()
+    templates_path, themes_path = _resolve_data_paths(args)
+    ctx = _load_context(args, templates_path, themes_path)
+    _apply_providers(args, settings)
+    _apply_fake(args, settings, ctx)
+    items = load_manifest(args.manifest)
+    out_dir = Path(args.out_dir) if args.out_dir else templates_path.parent
+    report_path = Path(args.report) if args.report else (out_dir / "batch_report.json")
+
+    default_pool().set_timeout(settings.timeout)
+    _apply_retry(args)
+    _apply_rate_limits(args, settings)
+    set_provider_concurrency({"gemini": args.gemini_concurrency, "groq": args.groq_concurrency})
+    cache = _response_cache(args)
+
+    started = time.perf_counter()
+    with _observed(args):
+        results = run_batch(
+            items,
+            ctx=ctx,
+            settings=settings,
+            default_out=lambda item: out_dir / f"slides_{slugify(item.topic)}.json",
+            workers=args.workers,
+            max_calls=args.max_calls,
+            offline=args.offline,
+            cache=cache,
+            options=_draft_options(args),
+            verbose=args.verbose,
+            jobs_dir=None if (args.no_journal or args.offline or args.max_calls <= 0) else DEFAULT_JOBS_DIR,
+            resume=args.resume,
+        )
+    report = write_report(results, report_path, wall_time=time.perf_counter() - started)
+    print(f"Batch: {report['ok']} ok, {report['stub']} stub, {report['error']} error in {report['wall_time']:.2f}s")
+    print(f"Report: {report_path}")
+    unfinished = sum(1 for r in results if r.job)
+    if unfinished:
+        print(f"Unfinished jobs: {unfinished} (rerun with --resume to retry only their failed stages)")
+    return 1 if report["error"] else 0
+
+
 def main() -> int:
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        return batch_main(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "validate":
+        return validate_main(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        return serve_main(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "schema":
+        return schema_main(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "local-server":
+        return local_server_main(sys.argv[2:])
     args = parse_args()
     settings = load_settings()
 
-    if args.topic:
+    journal = None
+    if args.resume:
+        # repeat the interrupted call: topic and deck shape come from the job, stages from its journal
+        journal = Journal.open(DEFAULT_JOBS_DIR, args.resume)
+        meta = journal.meta
+        topic_text = meta["topic"]
+        args.lang, args.max_slides = meta.get("lang", args.lang), meta.get("max_slides", args.max_slides)
+        args.out = args.out or meta.get("out")
+        args.update = args.update or meta.get("update")
+    elif args.topic:
         topic_text = args.topic
     else:
         topic_path = Path(args.prompt_file)
         topic_text = topic_path.read_text(encoding="utf-8").strip()
 
     # Resolve data paths
-    data_dir = Path(args.data_dir) if args.data_dir else (Path(__file__).resolve().parents[1] / "data")
-    templates_path = Path(args.templates) if args.templates else (data_dir / "templates.json")
-    themes_path = Path(args.themes) if args.themes else (data_dir / "themes.json")
+    templates_path, themes_path = _resolve_data_paths(args)
+    ctx = _load_context(args, templates_path, themes_path)
+    _apply_providers(args, settings)
+    _apply_fake(args, settings, ctx)
 
-    if not templates_path.exists():
-        raise FileNotFoundError(f"templates.json not found at {templates_path}")
-    if not themes_path.exists():
-        raise FileNotFoundError(f"themes.json not found at {themes_path}")
+    existing = existing_intents = None
+    if args.update:
+        from src.update import load_deck, load_plan, slide_intents
 
-    ctx = load_datacontext(templates_path, themes_path)
+        existing = load_deck(Path(args.update))
+        existing_intents = slide_intents(existing, load_plan(DEFAULT_PLANS_DIR, Path(args.update)))
 
-    # Default output: same folder as templates/themes
-    def slugify(s: str) -> str:
-        import re as _re
-        s = s.lower().strip()
-        s = _re.sub(r"[^a-z0-9\u0400-\u04FF]+", "-", s)  # keep latin + cyrillic
-        s = _re.sub(r"-+", "-", s).strip("-")
-        return s or "generated"
-
-    out_path = Path(args.out) if args.out else (templates_path.parent / f"slides_{slugify(topic_text) or 'generated'}.json")
+    # Default output: same folder as templates/themes (the updated deck is rewritten in place)
+    if args.out:
+        out_path = Path(args.out)
+    elif args.update:
+        out_path = Path(args.update)
+    else:
+        out_path = templates_path.parent / f"slides_{slugify(topic_text)}.json"
     out_path.parent.mkdir(parents=True, exist_ok=True)
-
-    try:
-        data = agent_generate(
-            topic=topic_text,
-            max_slides=args.max_slides,
-            lang=args.lang,
-            api_key=None if args.offline else settings.google_api_key,
-            model_name=settings.model,
-            ctx=ctx,
-            verbose=args.verbose,
-            max_calls=max(0, min(3, args.max_calls)),
-            groq_api_key=None if args.offline else settings.groq_api_key,
-            groq_model=settings.groq_model,
-        )
-    except Exception as e:
-        sys.stderr.write(f"[warn] agent failed ({e}); writing stub deck\n")
-        data = agent_generate(
-            topic=topic_text,
-            max_slides=args.max_slides,
-            lang=args.lang,
-            api_key=None,
-            model_name=settings.model,
-            ctx=ctx,
-            verbose=args.verbose,
-            max_calls=0,
-            groq_api_key=None,
-            groq_model=settings.groq_model,
+    if journal is None and not (args.no_journal or args.offline or args.max_calls <= 0):
+        journal = Journal.create(
+            DEFAULT_JOBS_DIR, topic=topic_text, lang=args.lang, max_slides=args.max_slides,
+            out=str(out_path.resolve()), update=str(Path(args.update).resolve()) if args.update else None,
         )
 
+    cache = _response_cache(args)
+
+    default_pool().set_timeout(settings.timeout)
+    _apply_retry(args)
+    _apply_rate_limits(args, settings)
+    run_stats: Dict[str, Any] = {}
+
+    on_slide = None
+    partial_file = None
+    if args.stream:
+        partial_path = out_path.with_suffix(".partial.jsonl")
+        partial_file = open(partial_path, "w", encoding="utf-8")
+        started = time.perf_counter()
+
+        def on_slide(index: int, slide: Dict[str, Any]) -> None:
+            # one line per slide; a later line with the same index supersedes an earlier one
+            partial_file.write(json.dumps({"index": index, "slide": slide}, ensure_ascii=False) + "\n")
+            partial_file.flush()
+            if args.verbose:
+                print(f"[stream] slide {index + 1} at {time.perf_counter() - started:.2f}s: {slide['layout_key']}")
+
+    with _observed(args):
+        try:
+            data = agent_generate(
+                topic=topic_text,
+                max_slides=args.max_slides,
+                lang=args.lang,
+                api_key=None if args.offline else settings.google_api_key,
+                model_name=settings.model,
+                ctx=ctx,
+                verbose=args.verbose,
+                max_calls=max(0, min(3, args.max_calls)),
+                groq_api_key=None if args.offline else settings.groq_api_key,
+                groq_model=settings.groq_model,
+                cache=cache,
+                on_slide=on_slide,
+                run_stats=run_stats,
+                existing=existing,
+                existing_intents=existing_intents,
+                journal=journal,
+                chains=provider_chains(settings, offline=args.offline),
+                **_draft_options(args),
+            )
+        except Exception as e:
+            resume = f" (finished stages are kept: rerun with --resume {journal.job})" if journal is not None else ""
+            sys.stderr.write(f"[warn] agent failed ({e}); writing stub deck{resume}\n")
+            data = agent_generate(
+                topic=topic_text,
+                max_slides=args.max_slides,
+                lang=args.lang,
+                api_key=None,
+                model_name=settings.model,
+                ctx=ctx,
+                verbose=args.verbose,
+                max_calls=0,
+                groq_api_key=None,
+                groq_model=settings.groq_model,
+            )
+
+    if partial_file is not None:
+        partial_file.close()
+        print(f"Partial: {partial_file.name}")
+
+    if args.verbose and run_stats.get("stages"):
+        for label, info in run_stats["stages"].items():
+            wait = f" (rate limit wait {info['rate_wait']:.2f}s)" if info.get("rate_wait") else ""
+            cut = " truncated" if info.get("truncated") else ""
+            print(f"[{label}] provider={info['provider']} hedged={info['hedged']} {info['elapsed']:.2f}s{wait}{cut}")
+    if args.verbose and run_stats.get("review"):
+        rv = run_stats["review"]
+        fixes = ", ".join(f"{kind}={n}" for kind, n in sorted(rv["fixes"].items())) or "none"
+        print(f"[reviewer] rule fixes: {fixes}; {rv['failing']} of {rv['slides']} slide(s) failed local validation, {rv['sent']} sent; "
+              f"{rv['calls_freed']} call(s) of --max-calls freed")
+
+    job = run_stats.get("job")
+    if job and not job["finished"]:
+        print(f"Job {job['id']}: {', '.join(job['fallbacks'])} fell back to local output; rerun with --resume {job['id']} to retry only those stages")
+
+    if run_stats.get("update"):
+        up = run_stats["update"]
+        print(f"Update: reused {up['reused']} of {up['outline']} slide(s), drafted {up['drafted']}; "
+              f"saved {up['calls_saved']} call(s), ~{up['tokens_saved']} tokens")
+    if run_stats.get("plan"):
+        # the outline (with intents) a later --update of this deck diffs against
+        from src.update import save_plan
+
+        save_plan(DEFAULT_PLANS_DIR, out_path, run_stats["plan"])
+
+    if args.verbose and cache is not None:
+        st = cache.stats
+        print(f"[cache] hits={st.hits} misses={st.misses} writes={st.writes} evictions={st.evictions}")
+
     out_payload = data["slides"] if isinstance(data, dict) and "slides" in data else data
     out_path.write_text(json.dumps(out_payload, ensure_ascii=False, indent=2), encoding="utf-8")
     print(f"Saved: {out_path}")
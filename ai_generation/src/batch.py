@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import csv
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .cache import ResponseCache
+from .config import Settings
+from .generator import DataContext, agent_generate, provider_chains
+from .journal import Journal
+
+
+@dataclass
+class BatchItem:
+    topic: str
+    out: Optional[str] = None
+    lang: str = "uk"
+    max_slides: int = 8
+    max_calls: Optional[int] = None
+
+
+@dataclass
+class BatchResult:
+    topic: str
+    out: str
+    status: str  # ok | stub | error
+    slides: int
+    wall_time: float
+    error: Optional[str] = None
+    stages: Optional[Dict[str, Any]] = None
+    prompts: Optional[Dict[str, Any]] = None
+    job: Optional[str] = None  # unfinished job to continue with --resume
+
+
+def _row_to_item(row: Dict[str, Any], base_dir: Path) -> BatchItem:
+    topic = str(row.get("topic") or "").strip()
+    prompt_file = row.get("prompt_file")
+    if not topic and prompt_file:
+        p = Path(prompt_file)
+        if not p.is_absolute():
+            p = base_dir / p
+        topic = p.read_text(encoding="utf-8").strip()
+    if not topic:
+        raise ValueError(f"manifest row without topic/prompt_file: {row}")
+    item = BatchItem(topic=topic)
+    if row.get("out"):
+        item.out = str(row["out"])
+    if row.get("lang"):
+        item.lang = str(row["lang"])
+    if row.get("max_slides") not in (None, ""):
+        item.max_slides = int(row["max_slides"])
+    if row.get("max_calls") not in (None, ""):
+        item.max_calls = int(row["max_calls"])
+    return item
+
+
+def load_manifest(path) -> List[BatchItem]:
+    """Read a JSONL (one object per line) or CSV (header row) manifest of decks to build.
+
+    Recognized columns: topic or prompt_file, lang, max_slides, max_calls, out.
+    """
+    path = Path(path)
+    base_dir = path.parent
+    items: List[BatchItem] = []
+    if path.suffix.lower() == ".csv":
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            for row in csv.DictReader(f):
+                items.append(_row_to_item(row, base_dir))
+    else:
+        with open(path, "r", encoding="utf-8-sig") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                items.append(_row_to_item(json.loads(line), base_dir))
+    return items
+
+
+def generate_with_fallback(
+    item: BatchItem,
+    *,
+    ctx: DataContext,
+    settings: Settings,
+    max_calls: int = 3,
+    offline: bool = False,
+    cache: Optional[ResponseCache] = None,
+    options: Optional[Dict[str, Any]] = None,
+    verbose: bool = False,
+    run_stats: Optional[Dict[str, Any]] = None,
+    journal: Optional[Journal] = None,
+) -> Tuple[List[Dict[str, Any]], str, Optional[str]]:
+    """Generate one deck; on failure fall back to a stub deck. Returns (slides, "ok" | "stub", error)."""
+    calls = max_calls if item.max_calls is None else item.max_calls
+    status, error = "ok", None
+    try:
+        data = agent_generate(
+            topic=item.topic,
+            max_slides=item.max_slides,
+            lang=item.lang,
+            api_key=None if offline else settings.google_api_key,
+            model_name=settings.model,
+            ctx=ctx,
+            verbose=verbose,
+            max_calls=max(0, min(3, calls)),
+            groq_api_key=None if offline else settings.groq_api_key,
+            groq_model=settings.groq_model,
+            cache=cache,
+            run_stats=run_stats,
+            journal=journal,
+            chains=provider_chains(settings, offline=offline),
+            **(options or {}),
+        )
+    except Exception as e:
+        sys.stderr.write(f"[warn] agent failed for '{item.topic}' ({e}); writing stub deck\n")
+        status, error = "stub", str(e)
+        data = agent_generate(
+            topic=item.topic,
+            max_slides=item.max_slides,
+            lang=item.lang,
+            api_key=None,
+            model_name=settings.model,
+            ctx=ctx,
+            verbose=verbose,
+            max_calls=0,
+            groq_api_key=None,
+            groq_model=settings.groq_model,
+        )
+    slides = data["slides"] if isinstance(data, dict) and "slides" in data else data
+    return slides, status, error
+
+
+def run_batch(
+    items: List[BatchItem],
+    *,
+    ctx: DataContext,
+    settings: Settings,
+    default_out: Callable[[BatchItem], Path],
+    workers: int = 4,
+    max_calls: int = 3,
+    offline: bool = False,
+    cache: Optional[ResponseCache] = None,
+    options: Optional[Dict[str, Any]] = None,
+    verbose: bool = False,
+    jobs_dir: Optional[Path] = None,
+    resume: bool = False,
+) -> List[BatchResult]:
+    """Generate every item on a bounded thread pool sharing one DataContext; results keep manifest order.
+
+    ``options`` holds extra agent_generate keyword arguments applied to every deck (e.g. draft_mode, fanout).
+    With ``jobs_dir`` each deck journals its stages as its own job; ``resume`` continues the latest
+    unfinished job writing the same output instead of starting a new one.
+    """
+    options = dict(options or {})
+
+    def build(item: BatchItem) -> BatchResult:
+        out_path = Path(item.out) if item.out else default_out(item)
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        started = time.perf_counter()
+        run_stats: Dict[str, Any] = {}
+        journal = None
+        if jobs_dir is not None:
+            journal = Journal.latest(jobs_dir, out=str(out_path.resolve())) if resume else None
+            if journal is None:
+                journal = Journal.create(jobs_dir, topic=item.topic, lang=item.lang, max_slides=item.max_slides, out=str(out_path.resolve()))
+        try:
+            slides, status, error = generate_with_fallback(
+                item, ctx=ctx, settings=settings, max_calls=max_calls, offline=offline,
+                cache=cache, options=options, verbose=verbose, run_stats=run_stats, journal=journal,
+            )
+            out_path.write_text(json.dumps(slides, ensure_ascii=False, indent=2), encoding="utf-8")
+            count = len(slides)
+        except Exception as e:
+            status, error, count = "error", str(e), 0
+        wall = time.perf_counter() - started
+        if verbose:
+            print(f"[batch] {status} {wall:.2f}s {out_path}")
+        return BatchResult(
+            topic=item.topic,
+            out=str(out_path),
+            status=status,
+            slides=count,
+            wall_time=round(wall, 3),
+            error=error,
+            stages=run_stats.get("stages"),
+            prompts=run_stats.get("prompts"),
+            job=journal.job if journal is not None and journal.dir.exists() else None,
+        )
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return list(pool.map(build, items))
+
+
+def write_report(results: List[BatchResult], path, *, wall_time: float) -> Dict[str, Any]:
+    report = {
+        "total": len(results),
+        "ok": sum(1 for r in results if r.status == "ok"),
+        "stub": sum(1 for r in results if r.status == "stub"),
+        "error": sum(1 for r in results if r.status == "error"),
+        "wall_time": round(wall_time, 3),
+        "deck_time_sum": round(sum(r.wall_time for r in results), 3),
+        "decks": [asdict(r) for r in results],
+    }
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    Path(path).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    return report
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+def make_cache_key(provider: str, model: str, stage: str, system: str, prompt: str, generation_config: Optional[Dict[str, Any]] = None) -> str:
+    """Content address for a single LLM call: sha256 over every input that can change the response."""
+    payload = json.dumps(
+        {
+            "provider": provider,
+            "model": model,
+            "stage": stage,
+            "system": system,
+            "prompt": prompt,
+            "generation_config": generation_config or {},
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    writes: int = 0
+    evictions: int = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "writes": self.writes, "evictions": self.evictions}
+
+
+@dataclass
+class ResponseCache:
+    """On-disk cache of raw model responses, one JSON file per key (<dir>/<k[:2]>/<k>.json).
+
+    Entries older than ``max_age`` seconds are treated as misses; once the directory grows
+    past ``max_entries`` or ``max_bytes`` the least recently used files are removed.
+    """
+
+    directory: Path
+    max_age: Optional[float] = 30 * 24 * 3600
+    max_entries: int = 5000
+    max_bytes: int = 200 * 1024 * 1024
+    stats: CacheStats = field(default_factory=CacheStats)
+
+    def __post_init__(self) -> None:
+        self.directory = Path(self.directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            st = path.stat()
+        except OSError:
+            self.stats.misses += 1
+            return None
+        if self.max_age is not None and time.time() - st.st_mtime > self.max_age:
+            self.discard(key)
+            self.stats.misses += 1
+            return None
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+            text = entry["text"]
+        except (OSError, ValueError, KeyError, TypeError):
+            self.discard(key)
+            self.stats.misses += 1
+            return None
+        # touch for LRU ordering; failure here is harmless
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        self.stats.hits += 1
+        return text
+
+    def put(self, key: str, text: str, meta: Optional[Dict[str, Any]] = None) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        entry = {"key": key, "created": time.time(), "meta": meta or {}, "text": text}
+        # write-then-rename so concurrent readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except OSError:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            return
+        self.stats.writes += 1
+        # a full directory scan per write is wasteful; amortize it
+        if self.stats.writes % 32 == 1:
+            self.evict()
+
+    def discard(self, key: str) -> None:
+        try:
+            self._path(key).unlink()
+        except OSError:
+            pass
+
+    def evict(self) -> int:
+        """Drop expired entries, then the oldest ones until size/count limits hold. Returns removed count."""
+        entries = []
+        for p in self.directory.glob("*/*.json"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        now = time.time()
+        removed = 0
+        total = sum(e[1] for e in entries)
+        entries.sort(key=lambda e: e[0])
+        keep = []
+        for mtime, size, p in entries:
+            if self.max_age is not None and now - mtime > self.max_age:
+                try:
+                    p.unlink()
+                    removed += 1
+                    total -= size
+                except OSError:
+                    pass
+            else:
+                keep.append((mtime, size, p))
+        while keep and (len(keep) > self.max_entries or total > self.max_bytes):
+            _, size, p = keep.pop(0)
+            try:
+                p.unlink()
+                removed += 1
+                total -= size
+            except OSError:
+                pass
+        self.stats.evictions += removed
+        return removed
@@ -1,10 +1,12 @@
 from __future__ import annotations
 
 import os
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
 
-from dotenv import load_dotenv
+PROVIDER_NAMES = ("gemini", "groq", "local")
+# pipeline stages whose provider order can be set separately ("default" covers the rest)
+PROVIDER_STAGES = ("plan", "draft", "review", "fused")
 
 
 @dataclass
@@ -14,9 +16,63 @@ class Settings:
     timeout: int = 60
     groq_api_key: Optional[str] = None
     groq_model: str = "llama3-70b-8192"
+    # "provider" or "provider:model" -> ratelimit.RateLimit (requests/tokens per minute)
+    rate_limits: Dict[str, Any] = field(default_factory=dict)
+    # OpenAI-compatible server (llama.cpp, vLLM, src/localserver.py), e.g. http://127.0.0.1:8080/v1
+    local_base_url: Optional[str] = None
+    local_model: str = "local"
+    local_api_key: Optional[str] = None
+    local_concurrency: int = 4
+    local_timeout: float = 300.0
+    local_connect_timeout: float = 5.0
+    local_keepalive: float = 60.0  # seconds an idle connection is kept open for the next call
+    # stage (PROVIDER_STAGES) or "default" -> provider names tried in order
+    provider_order: Dict[str, List[str]] = field(default_factory=dict)
+    providers_spec: str = ""  # PROVIDERS as given; provider_order stays empty when it does not parse
+
+    def providers_for(self, stage: str) -> List[str]:
+        """Provider names stage ``stage`` tries, in order: the local server first when one is configured."""
+        order = self.provider_order.get(stage) or self.provider_order.get("default")
+        if order:
+            return list(order)
+        return (["local"] if self.local_base_url else []) + ["gemini", "groq"]
+
+
+def parse_provider_order(spec: str) -> Dict[str, List[str]]:
+    """'local,gemini,groq' (every stage) or 'gemini,groq;draft=local,gemini;review=groq' (per stage)."""
+    order: Dict[str, List[str]] = {}
+    for part in spec.split(";"):
+        if not part.strip():
+            continue
+        stage, sep, names = part.rpartition("=")
+        stage = stage.strip() if sep else "default"
+        if stage not in PROVIDER_STAGES and stage != "default":
+            raise ValueError(f"unknown stage '{stage}' in provider order (expected one of {', '.join(PROVIDER_STAGES)})")
+        chain = [n.strip() for n in names.split(",") if n.strip()]
+        unknown = [n for n in chain if n not in PROVIDER_NAMES]
+        if unknown:
+            raise ValueError(f"unknown provider '{unknown[0]}' in provider order (expected {', '.join(PROVIDER_NAMES)})")
+        order[stage] = chain
+    return order
+
+
+def _env_int(name: str) -> int:
+    try:
+        return max(0, int(os.getenv(name, "0") or 0))
+    except ValueError:
+        return 0
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name) or default)
+    except ValueError:
+        return default
 
 
 def load_settings() -> Settings:
+    from dotenv import load_dotenv  # imported here to keep module import cheap
+
     load_dotenv(override=False)
     key = os.getenv("GOOGLE_API_KEY")
     model = os.getenv("MODEL", "gemini-1.5-pro")
@@ -27,4 +83,27 @@ def load_settings() -> Settings:
         timeout = int(timeout_str)
     except ValueError:
         timeout = 60
-    return Settings(google_api_key=key, model=model, timeout=timeout, groq_api_key=groq_key, groq_model=groq_model)
+    rate_limits: Dict[str, Any] = {}
+    for provider in PROVIDER_NAMES:
+        rpm, tpm = _env_int(f"{provider.upper()}_RPM"), _env_int(f"{provider.upper()}_TPM")
+        if rpm or tpm:
+            from .ratelimit import RateLimit
+
+            rate_limits[provider] = RateLimit(rpm, tpm)
+    providers_spec = os.getenv("PROVIDERS", "")
+    try:
+        provider_order = parse_provider_order(providers_spec)
+    except ValueError:
+        provider_order = {}  # reported by the CLI (cli._apply_providers), not on every import of settings
+    return Settings(
+        google_api_key=key, model=model, timeout=timeout, groq_api_key=groq_key, groq_model=groq_model, rate_limits=rate_limits,
+        local_base_url=os.getenv("LOCAL_BASE_URL") or None,
+        local_model=os.getenv("LOCAL_MODEL", "local"),
+        local_api_key=os.getenv("LOCAL_API_KEY") or None,
+        local_concurrency=_env_int("LOCAL_CONCURRENCY") or 4,
+        local_timeout=_env_float("LOCAL_TIMEOUT", 300.0),
+        local_connect_timeout=_env_float("LOCAL_CONNECT_TIMEOUT", 5.0),
+        local_keepalive=_env_float("LOCAL_KEEPALIVE", 60.0),
+        provider_order=provider_order,
+        providers_spec=providers_spec,
+    )
@@ -0,0 +1,282 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import math
+import random
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from .cache import make_cache_key
+from .fieldspec import Node, compile_templates
+from .generator import DataContext
+from .providers import GEMINI_GENERATION_CONFIG, GROQ_GENERATION_CONFIG, LOCAL_GENERATION_CONFIG, Provider, register_provider
+
+_CONFIGS = {"gemini": GEMINI_GENERATION_CONFIG, "groq": GROQ_GENERATION_CONFIG, "local": LOCAL_GENERATION_CONFIG}
+
+
+@dataclass
+class LatencyModel:
+    """Seconds per call. ``kind``: const (a), uniform (a..b), normal (mean a, sd b), lognormal (median a, sigma b)."""
+
+    kind: str = "lognormal"
+    a: float = 0.3
+    b: float = 0.5
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyModel":
+        """'lognormal:0.3,0.5', 'uniform:0.1,1', 'normal:0.5,0.1' or 'const:0.2' / '0.2'."""
+        kind, _, args = spec.partition(":")
+        if not args:
+            return cls("const", float(kind), 0.0)
+        nums = [float(x) for x in args.split(",")]
+        return cls(kind.strip(), nums[0], nums[1] if len(nums) > 1 else 0.0)
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "const":
+            value = self.a
+        elif self.kind == "uniform":
+            value = rng.uniform(self.a, self.b)
+        elif self.kind == "normal":
+            value = rng.gauss(self.a, self.b)
+        elif self.kind == "lognormal":
+            value = self.a * math.exp(rng.gauss(0.0, self.b))
+        else:
+            raise ValueError(f"unknown latency distribution '{self.kind}'")
+        return max(0.0, value)
+
+
+@dataclass
+class FakeConfig:
+    latency: LatencyModel = field(default_factory=LatencyModel)
+    error_rate: float = 0.0      # share of calls that raise (like a 5xx / quota error)
+    truncate_rate: float = 0.0   # share of responses cut off at a random point
+    fence_rate: float = 0.0      # share of responses wrapped in ```json fences with prose around them
+    replay: Optional[str] = None  # ResponseCache directory or JSONL of {"stage", "text"} records
+    seed: Optional[int] = None
+    stream_chunks: int = 8
+
+    @classmethod
+    def parse(cls, spec: str) -> "FakeConfig":
+        """'latency=lognormal:0.3,0.5;error_rate=0.05;truncate_rate=0.02;fence_rate=0.3;replay=DIR;seed=1'."""
+        cfg = cls()
+        for part in filter(None, (p.strip() for p in spec.split(";"))):
+            key, _, value = part.partition("=")
+            key = key.strip().replace("-", "_")
+            if key == "latency":
+                cfg.latency = LatencyModel.parse(value)
+            elif key in ("error_rate", "truncate_rate", "fence_rate"):
+                setattr(cfg, key, float(value))
+            elif key in ("seed", "stream_chunks"):
+                setattr(cfg, key, int(value))
+            elif key == "replay":
+                cfg.replay = value
+            else:
+                raise ValueError(f"unknown fake provider option '{key}'")
+        return cfg
+
+
+class FakeProviderError(RuntimeError):
+    status_code = 503  # simulated errors are transient, so retries and circuit breakers apply
+
+
+def load_recordings(source: str) -> Tuple[Dict[str, str], Dict[str, List[str]], List[Tuple[str, str]]]:
+    """Read recorded responses: (by cache key, by stage, distinct (provider, model) pairs)."""
+    by_key: Dict[str, str] = {}
+    by_stage: Dict[str, List[str]] = {}
+    pairs: Dict[Tuple[str, str], None] = {}
+    path = Path(source)
+    entries: List[Dict[str, Any]] = []
+    if path.is_dir():
+        for f in path.glob("*/*.json"):
+            try:
+                entries.append(json.loads(f.read_text(encoding="utf-8")))
+            except (OSError, ValueError):
+                continue
+    else:
+        with open(path, "r", encoding="utf-8") as fh:
+            entries = [json.loads(line) for line in fh if line.strip()]
+    for e in entries:
+        meta = e.get("meta") or {}
+        stage = meta.get("stage") or e.get("stage")
+        text = e.get("text")
+        if not isinstance(text, str) or not stage:
+            continue
+        if e.get("key"):
+            by_key[e["key"]] = text
+        by_stage.setdefault(stage, []).append(text)
+        if meta.get("provider") and meta.get("model"):
+            pairs[(meta["provider"], meta["model"])] = None
+    return by_key, by_stage, list(pairs)
+
+
+# ----- schema-conformant synthesis -----
+
+_WORDS_UK = ["аналіз", "дані", "модель", "навчання", "підхід", "результат", "етап", "рішення", "процес", "мета", "ризик", "план"]
+
+
+def _phrase(rng: random.Random, n: int = 3) -> str:
+    return " ".join(rng.choice(_WORDS_UK) for _ in range(n)).capitalize()
+
+
+def synth_value(node: Node, rng: random.Random, *, title: str = "") -> Any:
+    kind = node[0]
+    if kind == "string":
+        return title or _phrase(rng)
+    if kind == "boolean":
+        return rng.random() < 0.5
+    if kind == "number":
+        return rng.randint(1, 100)
+    if kind == "enum":
+        return sorted(node[1])[0]
+    if kind == "array":
+        return [synth_value(node[1], rng) for _ in range(rng.randint(3, 5))]
+    if kind == "union":
+        return synth_value(node[1][0], rng, title=title)
+    if kind == "record":
+        out: Dict[str, Any] = {}
+        for name, typ, optional in node[1]:
+            if not optional:
+                out[name] = "example.png" if name == "src" else synth_value(typ, rng) if typ[0] != "any" else _phrase(rng, 2)
+        return out
+    if kind == "object":
+        return {}
+    return _phrase(rng, 2)
+
+
+def synth_slide(ctx: DataContext, layout_key: str, title: str, rng: random.Random) -> Dict[str, Any]:
+    layout = compile_templates(ctx.templates).get(layout_key)
+    fields: Dict[str, Any] = {}
+    if layout is not None:
+        for name, (node, optional, _) in layout.fields.items():
+            if optional and not (name == "title" or rng.random() < 0.3):
+                continue
+            fields[name] = synth_value(node, rng, title=title if name == "title" else "")
+    else:
+        fields["title"] = title or _phrase(rng)
+    return {"layout_key": layout_key, "fields": fields}
+
+
+def _json_after(marker: str, text: str) -> Any:
+    i = text.find(marker)
+    if i < 0:
+        return None
+    try:
+        value, _ = json.JSONDecoder().raw_decode(text[i + len(marker):].lstrip())
+        return value
+    except ValueError:
+        return None
+
+
+_MAX_SLIDES = re.compile(r"Max slides: (\d+)")
+_EXACTLY = re.compile(r"array of exactly (\d+) item")
+
+
+def synth_response(stage: str, prompt: str, ctx: DataContext, rng: random.Random) -> str:
+    """Answer a pipeline prompt (plan / draft / draft_slide / review / fused) with schema-conformant JSON."""
+    if stage in ("plan", "outline", "fused"):
+        m = _MAX_SLIDES.search(prompt) or re.search(r"Max (\d+) items", prompt)
+        n = int(m.group(1)) if m else 8
+        keys = list(ctx.allowed_layouts)
+        outline = [{"layout_key": "Title Slide" if "Title Slide" in keys else keys[0], "title": _phrase(rng)}]
+        while len(outline) < n:
+            outline.append({"layout_key": rng.choice(keys), "title": _phrase(rng), "intent": _phrase(rng, 5)})
+        if stage == "fused":
+            slides = [synth_slide(ctx, it["layout_key"], it["title"], rng) for it in outline]
+            return json.dumps({"title": _phrase(rng), "slides": slides}, ensure_ascii=False)
+        return json.dumps({"plan": {"title": _phrase(rng), "outline": outline}}, ensure_ascii=False)
+    if stage == "review":
+        draft = _json_after("Input slides JSON:", prompt)
+        if isinstance(draft, dict) and isinstance(draft.get("slides"), list):
+            return json.dumps({"slides": draft["slides"]}, ensure_ascii=False)
+    items: Optional[List[Any]] = None
+    if stage == "draft_slide":
+        items = _json_after("Slides to write:", prompt)
+    else:
+        plan = _json_after("Plan JSON:", prompt) or {"outline": _json_after("Outline JSON:", prompt)}
+        if isinstance(plan, dict):
+            items = plan.get("outline")
+    if not isinstance(items, list):
+        m = _EXACTLY.search(prompt)
+        items = [{"layout_key": "Title Slide", "title": _phrase(rng)}] * (int(m.group(1)) if m else 1)
+    slides = [synth_slide(ctx, it.get("layout_key"), it.get("title") or "", rng) for it in items if isinstance(it, dict)]
+    return json.dumps({"slides": slides}, ensure_ascii=False)
+
+
+class FakeProvider(Provider):
+    """Provider that never touches the network: replays recorded answers or synthesizes valid ones,
+    with simulated latency, errors, truncation and code fences (see FakeConfig).
+    """
+
+    def __init__(self, name: str, model: str, timeout: Optional[float] = None, *, config: FakeConfig, ctx: DataContext) -> None:
+        super().__init__(model, timeout)
+        self.name = name
+        self.generation_config = _CONFIGS.get(name, {})
+        self.config = config
+        self.ctx = ctx
+        self.rng = random.Random(config.seed)
+        self.calls = 0
+        self.failures = 0
+        self._by_key: Dict[str, str] = {}
+        self._by_stage: Dict[str, List[str]] = {}
+        self._pairs: List[Tuple[str, str]] = []
+        if config.replay:
+            self._by_key, self._by_stage, self._pairs = load_recordings(config.replay)
+
+    def _answer(self, stage: str, system: str, user: str) -> str:
+        for provider, model in self._pairs:
+            key = make_cache_key(provider, model, stage, system, user, _CONFIGS.get(provider, {}))
+            if key in self._by_key:
+                return self._by_key[key]
+        recorded = self._by_stage.get(stage)
+        if recorded:
+            return self.rng.choice(recorded)
+        return synth_response(stage, user, self.ctx, self.rng)
+
+    def _mangle(self, text: str) -> str:
+        if self.rng.random() < self.config.truncate_rate and len(text) > 2:
+            text = text[: self.rng.randint(1, len(text) - 1)]
+        if self.rng.random() < self.config.fence_rate:
+            text = f"Ось результат:\n```json\n{text}\n```\nГотово."
+        return text
+
+    def respond(self, stage: str, system: str, user: str) -> str:
+        """The answer text alone: replayed or synthesized, then cut off/fenced per ``config`` (no latency or errors)."""
+        return self._mangle(self._answer(stage, system, user))
+
+    async def _complete(self, stage: str, system: str, user: str, schema: Optional[Dict[str, Any]] = None) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.config.latency.sample(self.rng))
+        if self.rng.random() < self.config.error_rate:
+            self.failures += 1
+            raise FakeProviderError(f"{self.name}: simulated provider error ({stage})")
+        return self.respond(stage, system, user)
+
+    async def _stream(self, stage: str, system: str, user: str) -> AsyncIterator[str]:
+        self.calls += 1
+        total = self.config.latency.sample(self.rng)
+        chunks = max(1, self.config.stream_chunks)
+        # a third of the latency before the first token, the rest spread over the chunks
+        await asyncio.sleep(total / 3)
+        if self.rng.random() < self.config.error_rate:
+            self.failures += 1
+            raise FakeProviderError(f"{self.name}: simulated provider error ({stage})")
+        text = self.respond(stage, system, user)
+        step = max(1, math.ceil(len(text) / chunks))
+        for i in range(0, len(text), step):
+            await asyncio.sleep(total * 2 / 3 / chunks)
+            yield text[i:i + step]
+
+
+def install_fake_providers(config: FakeConfig, ctx: DataContext, names: Tuple[str, ...] = ("gemini", "groq", "local")) -> None:
+    """Route the given provider names to FakeProvider for every ProviderPool created or used afterwards.
+
+    Pools memoize providers, so install before the first request (or use a fresh ProviderPool).
+    """
+    for name in names:
+        register_provider(
+            name,
+            lambda api_key, model, timeout=None, _name=name: FakeProvider(_name, model, timeout, config=config, ctx=ctx),
+        )
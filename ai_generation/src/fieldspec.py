@@ -0,0 +1,365 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# fieldsSchema grammar (as used in data/templates.json):
+#   spec      := alt ('|' alt)* ['?'] [' (' note ')']
+#   alt       := word | alt '[]' | '[' spec ']' | '{' member (',' member)* '}'
+#   member    := name ['|' alt]* ['?'] [':' spec] [' (' enum ')']
+# Examples: "string?", "string|string[]", "[Image]", "{src, alt?, pos? (left|right)}",
+#           "[{name, role, photo?}]", "[Video] (src, controls, autoplay, loop, muted)".
+# A member written as "text|string[]" means member "text" of type string|string[].
+# Untyped members accept any value; "(a|b)" after a member restricts it to those strings.
+
+# Node: (kind, payload)
+#   ("string"|"boolean"|"number"|"object"|"any", None)
+#   ("array", node) | ("union", [node, ...]) | ("enum", frozenset)
+#   ("record", [(name, node, optional), ...], label)
+Node = Tuple[Any, ...]
+
+NAMED_TYPES: Dict[str, str] = {
+    "Image": "{src, alt?, fit?, w?, h?}",
+    "Video": "{src, controls?: boolean, autoplay?: boolean, loop?: boolean, muted?: boolean}",
+}
+
+_PRIMITIVES = {
+    "string": "string", "str": "string",
+    "boolean": "boolean", "bool": "boolean",
+    "number": "number", "int": "number", "float": "number",
+    "object": "object", "any": "any",
+}
+
+
+def _split_top(s: str, sep: str) -> List[str]:
+    parts: List[str] = []
+    depth = 0
+    cur: List[str] = []
+    for ch in s:
+        if ch in "{[(":
+            depth += 1
+        elif ch in "}])":
+            depth -= 1
+        if ch == sep and depth == 0:
+            parts.append("".join(cur))
+            cur = []
+        else:
+            cur.append(ch)
+    parts.append("".join(cur))
+    return parts
+
+
+def _split_note(s: str) -> Tuple[str, Optional[str]]:
+    """Split a trailing ' (…)' annotation off a spec: 'pos? (left|right)' -> ('pos?', 'left|right')."""
+    s = s.strip()
+    if not s.endswith(")"):
+        return s, None
+    depth = 0
+    for i in range(len(s) - 1, -1, -1):
+        if s[i] == ")":
+            depth += 1
+        elif s[i] == "(":
+            depth -= 1
+            if depth == 0:
+                if i > 0:
+                    return s[:i].strip(), s[i + 1:-1].strip()
+                return s, None
+    return s, None
+
+
+def parse_spec(spec: str) -> Tuple[Node, bool]:
+    """Parse a fieldsSchema value into (node, optional)."""
+    body, note = _split_note(spec)
+    optional = body.endswith("?")
+    if optional:
+        body = body[:-1].strip()
+    node = _parse_union(body)
+    if note and "|" in note and "," not in note:
+        node = ("enum", frozenset(x.strip() for x in note.split("|") if x.strip()))
+    return node, optional
+
+
+def _parse_union(s: str) -> Node:
+    alts = [a.strip() for a in _split_top(s, "|") if a.strip()]
+    if len(alts) == 1:
+        return _parse_alt(alts[0])
+    return ("union", [_parse_alt(a) for a in alts])
+
+
+def _parse_alt(s: str) -> Node:
+    s = s.strip()
+    if s.endswith("?"):
+        s = s[:-1].strip()
+    if s.endswith("[]"):
+        return ("array", _parse_alt(s[:-2]))
+    if s.startswith("[") and s.endswith("]"):
+        return ("array", _parse_union(s[1:-1]))
+    if s.startswith("{") and s.endswith("}"):
+        return _parse_record(s[1:-1], label=s)
+    if s in NAMED_TYPES:
+        node = _parse_alt(NAMED_TYPES[s])
+        return ("record", node[1], s) if node[0] == "record" else node
+    prim = _PRIMITIVES.get(s.lower())
+    if prim:
+        return (prim, None)
+    # unknown capitalized name -> some object; anything else is unchecked
+    return ("object", None) if s[:1].isupper() else ("any", None)
+
+
+def _parse_record(inner: str, *, label: str) -> Node:
+    members: List[Tuple[str, Node, bool]] = []
+    for raw in _split_top(inner, ","):
+        raw, note = _split_note(raw)
+        if not raw:
+            continue
+        typ: Node = ("any", None)
+        if ":" in raw:
+            raw, type_spec = raw.split(":", 1)
+            typ, _ = parse_spec(type_spec)
+        raw = raw.strip()
+        optional = raw.endswith("?")
+        if optional:
+            raw = raw[:-1].strip()
+        if "|" in raw:
+            name, *alts = [p.strip() for p in _split_top(raw, "|")]
+            typ = ("union", [("string", None)] + [_parse_alt(a) for a in alts])
+        else:
+            name = raw
+        if note and "|" in note:
+            typ = ("enum", frozenset(x.strip() for x in note.split("|") if x.strip()))
+        members.append((name, typ, optional))
+    return ("record", members, label)
+
+
+def describe(node: Node) -> str:
+    kind = node[0]
+    if kind == "array":
+        inner = node[1]
+        if inner[0] == "string":
+            return "array of strings"
+        return f"array of {describe(inner)}"
+    if kind == "union":
+        return " or ".join(describe(n) for n in node[1])
+    if kind == "enum":
+        return "one of " + "|".join(sorted(node[1]))
+    if kind == "record":
+        return node[2] if node[2] in NAMED_TYPES else f"object {node[2]}"
+    return kind
+
+
+Predicate = Callable[[Any], bool]
+
+
+def _is_any(v: Any) -> bool:
+    return True
+
+
+def compile_node(node: Node) -> Predicate:
+    kind = node[0]
+    if kind == "string":
+        return lambda v: isinstance(v, str)
+    if kind == "boolean":
+        return lambda v: v is True or v is False
+    if kind == "number":
+        return lambda v: isinstance(v, (int, float)) and not isinstance(v, bool)
+    if kind == "object":
+        return lambda v: isinstance(v, dict)
+    if kind == "any":
+        return _is_any
+    if kind == "enum":
+        allowed = node[1]
+        return lambda v: isinstance(v, str) and v in allowed
+    if kind == "array":
+        inner = node[1]
+        if inner[0] == "string":
+            return lambda v: isinstance(v, list) and all(isinstance(x, str) for x in v)
+        item = compile_node(inner)
+        return lambda v: isinstance(v, list) and all(item(x) for x in v)
+    if kind == "union":
+        preds = [compile_node(n) for n in node[1]]
+        return lambda v: any(p(v) for p in preds)
+    if kind == "record":
+        required = tuple(name for name, _, opt in node[1] if not opt)
+        typed = tuple((name, compile_node(t)) for name, t, _ in node[1] if t[0] != "any")
+
+        def check_record(v: Any) -> bool:
+            if not isinstance(v, dict):
+                return False
+            for name in required:
+                if name not in v:
+                    return False
+            for name, pred in typed:
+                if name in v and not pred(v[name]):
+                    return False
+            return True
+
+        return check_record
+    return _is_any
+
+
+# Structured issue: (kind, field, expected) with kind in {"missing", "type", "extra"}
+Issue = Tuple[str, str, str]
+
+
+@dataclass
+class CompiledLayout:
+    layout_key: str
+    fields: Dict[str, Tuple[Node, bool, Predicate]]
+    required: Tuple[str, ...]
+    is_valid: Callable[[Dict[str, Any]], bool]
+    # names of fields whose type is plain string / plain array of strings (for soft coercion)
+    string_fields: Tuple[str, ...]
+    string_array_fields: Tuple[str, ...]
+
+    def issues(self, fields: Dict[str, Any], *, allow_extra: bool = True) -> List[Issue]:
+        out: List[Issue] = []
+        for name, (node, optional, pred) in self.fields.items():
+            if name not in fields:
+                if not optional:
+                    out.append(("missing", name, describe(node)))
+                continue
+            if not pred(fields[name]):
+                out.append(("type", name, describe(node)))
+        if not allow_extra:
+            for name in fields:
+                if name not in self.fields:
+                    out.append(("extra", name, ""))
+        return out
+
+    def fix(self, fields: Dict[str, Any]) -> Dict[str, Any]:
+        """Soft coercions: [x, ...] -> x for string fields, x -> [x] for array-of-strings fields."""
+        fixed = None
+        for name in self.string_fields:
+            val = fields.get(name)
+            if isinstance(val, list) and val:
+                fixed = fixed or dict(fields)
+                fixed[name] = str(val[0])
+        for name in self.string_array_fields:
+            val = fields.get(name)
+            if isinstance(val, str):
+                fixed = fixed or dict(fields)
+                fixed[name] = [val]
+        return fields if fixed is None else fixed
+
+
+ParsedLayout = Dict[str, Tuple[Node, bool]]
+
+
+def parse_layout(schema: Dict[str, Any]) -> ParsedLayout:
+    """fieldsSchema -> {field: (node, optional)}; plain data, safe to pickle (see src/snapshot.py)."""
+    return {name: parse_spec(spec) for name, spec in schema.items() if isinstance(name, str) and isinstance(spec, str)}
+
+
+def compile_layout(layout_key: str, schema: Dict[str, Any], parsed: Optional[ParsedLayout] = None) -> CompiledLayout:
+    if parsed is None:
+        parsed = parse_layout(schema)
+    fields: Dict[str, Tuple[Node, bool, Predicate]] = {
+        name: (node, optional, compile_node(node)) for name, (node, optional) in parsed.items()
+    }
+    required = tuple(n for n, (_, opt, _) in fields.items() if not opt)
+    checks = tuple((n, opt, pred) for n, (node, opt, pred) in fields.items() if node[0] != "any")
+
+    def is_valid(f: Dict[str, Any]) -> bool:
+        for name in required:
+            if name not in f:
+                return False
+        for name, _, pred in checks:
+            if name in f and not pred(f[name]):
+                return False
+        return True
+
+    return CompiledLayout(
+        layout_key=layout_key,
+        fields=fields,
+        required=required,
+        is_valid=is_valid,
+        string_fields=tuple(n for n, (node, _, _) in fields.items() if node[0] == "string"),
+        string_array_fields=tuple(n for n, (node, _, _) in fields.items() if node == ("array", ("string", None))),
+    )
+
+
+@dataclass
+class CompiledTemplates:
+    layouts: Dict[str, CompiledLayout]
+    digest: str
+
+    def get(self, layout_key: str) -> Optional[CompiledLayout]:
+        return self.layouts.get(layout_key)
+
+    def is_valid_slide(self, slide: Any) -> bool:
+        """Fast path: no message building, no allocation beyond the lookups."""
+        if not isinstance(slide, dict):
+            return False
+        layout = self.layouts.get(slide.get("layout_key"))
+        fields = slide.get("fields")
+        return layout is not None and isinstance(fields, dict) and layout.is_valid(fields)
+
+
+def layouts_from_templates(templates: Any) -> Dict[str, Dict[str, Any]]:
+    out: Dict[str, Dict[str, Any]] = {}
+    if not isinstance(templates, list):
+        return out
+    for t in templates:
+        if not isinstance(t, dict):
+            continue
+        lk = t.get("layout_key")
+        fs = t.get("fieldsSchema")
+        if isinstance(lk, str) and isinstance(fs, dict):
+            out[lk] = fs
+    return out
+
+
+_CACHE_LOCK = threading.Lock()
+_BY_DIGEST: Dict[str, CompiledTemplates] = {}
+_BY_ID: Dict[int, Tuple[Any, CompiledTemplates]] = {}
+
+
+def layouts_digest(layouts: Dict[str, Dict[str, Any]]) -> str:
+    return hashlib.sha1(json.dumps(layouts, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def compile_layouts(
+    layouts: Dict[str, Dict[str, Any]],
+    *,
+    digest: Optional[str] = None,
+    parsed: Optional[Dict[str, ParsedLayout]] = None,
+) -> CompiledTemplates:
+    """Compile {layout_key: fieldsSchema}; memoized by a hash of the schemas.
+
+    ``digest`` and ``parsed`` let a caller that already has them (a context snapshot) skip
+    hashing and parsing.
+    """
+    digest = digest or layouts_digest(layouts)
+    with _CACHE_LOCK:
+        hit = _BY_DIGEST.get(digest)
+    if hit is not None:
+        return hit
+    parsed = parsed or {}
+    compiled = CompiledTemplates(
+        layouts={lk: compile_layout(lk, fs, parsed.get(lk)) for lk, fs in layouts.items()},
+        digest=digest,
+    )
+    with _CACHE_LOCK:
+        _BY_DIGEST[digest] = compiled
+    return compiled
+
+
+def remember_templates(templates: Any, compiled: CompiledTemplates) -> None:
+    """Make compile_templates(templates) return ``compiled`` for this exact object."""
+    with _CACHE_LOCK:
+        if len(_BY_ID) > 32:
+            _BY_ID.clear()
+        _BY_ID[id(templates)] = (templates, compiled)
+
+
+def compile_templates(templates: Any) -> CompiledTemplates:
+    """Compile a templates.json list. Repeated calls with the same object skip even the hashing."""
+    entry = _BY_ID.get(id(templates))
+    if entry is not None and entry[0] is templates:
+        return entry[1]
+    compiled = compile_layouts(layouts_from_templates(templates))
+    remember_templates(templates, compiled)
+    return compiled
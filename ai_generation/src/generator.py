@@ -1,10 +1,31 @@
 from __future__ import annotations
 
+import asyncio
+import contextvars
+import copy
+import functools
 import json
-import re
-from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
-from .schema import validate_deck
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
+from .cache import ResponseCache, make_cache_key
+from .config import PROVIDER_STAGES, Settings
+from .hedging import HedgePolicy, race_with_hedge
+from .journal import Journal
+from .jsonstream import Salvaged, SlideStreamParser, salvage_json
+from .library import DeckLibrary
+from .providers import LOCAL_NO_KEY, LocalProvider, Provider, ProviderPool, default_pool, register_provider, run_sync
+from .ratelimit import collect_waits
+from .reviewrules import MAX_BULLETS, Fixes, deck_rules
+from .schemaexport import deck_json_schema
+from .fieldspec import CompiledTemplates, compile_templates
+from .schema import issue_message, validate_deck
+from .tokens import estimate_tokens
+from .topicindex import TopicIndex
+from .update import match_outline, merge_in_order
+from . import tracing
+
+T = TypeVar("T")
 
 
 SYSTEM_SPEC = (
@@ -13,50 +34,114 @@ SYSTEM_SPEC = (
     "Accepted shapes: {\"plan\": {...}}, {\"outline\": [...]}, or {\"slides\": [...]}. "
 )
 
+def _salvage(text: str) -> Salvaged:
+    """salvage_json(), noting on the current provider.call span when the response was cut off."""
+    found = salvage_json(text)
+    if found.truncated:
+        tracing.annotate(truncated=True)
+    return found
 
-def _strip_code_fences(text: str) -> str:
-    text = text.strip()
-    text = re.sub(r"^```[a-zA-Z]*\n", "", text)
-    text = re.sub(r"\n```$", "", text)
-    return text.strip()
 
+def _complete_items(found: Salvaged, *path: str, error: str) -> List[Any]:
+    """The list at ``path`` (or a top-level array) minus any element the response was cut off in."""
+    items = found.items() if isinstance(found.value, list) else found.items(*path)
+    if found.truncated and not items:
+        raise ValueError(f"{error}: response cut off before the first complete item")
+    if items is None:
+        raise ValueError(error)
+    return items
 
-def _extract_first_json_segment(text: str) -> str:
-    """Extract the first balanced JSON object/array from a text blob."""
-    if not text:
-        return text
-    start_obj = text.find('{')
-    start_arr = text.find('[')
-    starts = [i for i in [start_obj, start_arr] if i != -1]
-    if not starts:
-        return text
-    i = min(starts)
-    opener = text[i]
-    closer = '}' if opener == '{' else ']'
-    depth = 0
-    in_string = False
-    escape = False
-    for j in range(i, len(text)):
-        ch = text[j]
-        if in_string:
-            if escape:
-                escape = False
-            elif ch == '\\':
-                escape = True
-            elif ch == '"':
-                in_string = False
-            continue
-        if ch == '"':
-            in_string = True
-            continue
-        if ch == opener:
-            depth += 1
-        elif ch == closer:
-            depth -= 1
-            if depth == 0:
-                return text[i:j+1]
-    # Fallback if not balanced
-    return text[i:]
+
+# Per-run prompt size accounting: multi_agent_generate_async installs a dict that every stage
+# call made within it (including tasks it spawns) adds to.
+_PROMPT_STATS: contextvars.ContextVar[Optional[Dict[str, Dict[str, int]]]] = contextvars.ContextVar("prompt_stats", default=None)
+
+
+@functools.lru_cache(maxsize=256)
+def prompt_tokens(prompt: str) -> int:
+    """Estimated tokens of SYSTEM_SPEC + prompt (memoized: run stats and trace spans both ask)."""
+    return estimate_tokens(SYSTEM_SPEC) + estimate_tokens(prompt)
+
+
+def note_prompt(stage: str, prompt: str) -> None:
+    stats = _PROMPT_STATS.get()
+    if stats is None:
+        return
+    entry = stats.setdefault(stage, {"calls": 0, "prompt_tokens": 0})
+    entry["calls"] += 1
+    entry["prompt_tokens"] += prompt_tokens(prompt)
+
+
+async def _cached_completion(
+    cache: Optional[ResponseCache],
+    provider: Provider,
+    *,
+    stage: str,
+    prompt: str,
+    parse: Callable[[str], T],
+    schema: Optional[Dict[str, Any]] = None,
+) -> T:
+    """Return parse(response), serving the raw response from cache when possible.
+
+    Only responses that parse successfully are stored, so a malformed answer is never replayed.
+    ``schema`` constrains the response (Provider.complete_json) and is part of the cache key.
+    """
+    note_prompt(stage, prompt)
+    with tracing.span("provider.call", stage=stage, provider=provider.name, model=provider.model) as sp:
+        if tracing.enabled():
+            sp.set(prompt_chars=len(prompt), prompt_tokens=prompt_tokens(prompt))
+        key = None
+        if cache is not None:
+            config = dict(provider.generation_config, response_schema=schema) if schema else provider.generation_config
+            key = make_cache_key(provider.name, provider.model, stage, SYSTEM_SPEC, prompt, config)
+            cached = cache.get(key)
+            if cached is not None:
+                try:
+                    result = _timed_parse(sp, parse, cached)
+                    sp.set(cache="hit")
+                    return result
+                except Exception:
+                    cache.discard(key)
+            sp.set(cache="miss")
+        text = await provider.complete_json(stage, SYSTEM_SPEC, prompt, schema=schema)
+        if tracing.enabled():
+            sp.set(response_chars=len(text), response_tokens=estimate_tokens(text))
+        result = _timed_parse(sp, parse, text)
+        if cache is not None:
+            cache.put(key, text, meta={"provider": provider.name, "model": provider.model, "stage": stage})
+        return result
+
+
+def _timed_parse(sp: Any, parse: Callable[[str], T], text: str) -> T:
+    started = time.perf_counter()
+    try:
+        return parse(text)
+    finally:
+        sp.set(parse_seconds=round(time.perf_counter() - started, 6))
+
+
+# Token budget for the template digest embedded in drafter prompts
+DIGEST_TOKEN_BUDGET = 1200
+DIGEST_LEGEND = "Schemas (layout_key: fields; bare name = string, '?' = optional, name: type otherwise)"
+
+
+def _digest_field(name: str, spec: str, *, required_only: bool) -> Optional[str]:
+    spec = spec.strip()
+    optional = spec.endswith("?")
+    if optional and required_only:
+        return None
+    base = spec[:-1].strip() if optional else spec
+    label = f"{name}?" if optional else name
+    return label if base in ("string", "str") else f"{label}: {base}"
+
+
+def _digest_line(layout_key: str, schema: Dict[str, Any], *, required_only: bool = False) -> str:
+    parts = [
+        _digest_field(name, spec, required_only=required_only)
+        for name, spec in schema.items()
+        if isinstance(name, str) and isinstance(spec, str)
+    ]
+    return f"{layout_key}: " + ", ".join(p for p in parts if p)
 
 
 @dataclass
@@ -64,12 +149,64 @@ class DataContext:
     templates: Any
     themes: Any
     allowed_layouts: List[str]
+    # derived data, built lazily and reused by every prompt of every deck sharing this context
+    _digest_lines: Optional[Dict[str, Tuple[str, str]]] = field(default=None, repr=False, compare=False)
+    _digests: Dict[Tuple[Tuple[str, ...], int], str] = field(default_factory=dict, repr=False, compare=False)
+
+    def digest_lines(self) -> Dict[str, Tuple[str, str]]:
+        """layout_key -> (full line, required-fields-only line) in the compact schema notation."""
+        if self._digest_lines is None:
+            lines: Dict[str, Tuple[str, str]] = {}
+            for t in self.templates if isinstance(self.templates, list) else []:
+                if isinstance(t, dict) and isinstance(t.get("layout_key"), str) and isinstance(t.get("fieldsSchema"), dict):
+                    lk, fs = t["layout_key"], t["fieldsSchema"]
+                    lines[lk] = (_digest_line(lk, fs), _digest_line(lk, fs, required_only=True))
+            self._digest_lines = lines
+        return self._digest_lines
+
+    def template_digest(self, layout_keys: Optional[Iterable[str]] = None, *, budget: int = DIGEST_TOKEN_BUDGET) -> str:
+        """Compact schemas for ``layout_keys`` (default: all layouts), kept under ``budget`` tokens.
+
+        Descriptions are dropped and each layout is one line. Over budget, optional fields are
+        dropped (longest layouts first); layouts that still do not fit are listed by name only,
+        never cut mid-schema. Results are cached per (layout set, budget).
+        """
+        lines = self.digest_lines()
+        keys = tuple(dict.fromkeys(k for k in (layout_keys if layout_keys is not None else lines) if k in lines))
+        cache_key = (keys, budget)
+        cached = self._digests.get(cache_key)
+        if cached is not None:
+            return cached
+        chosen = {k: lines[k][0] for k in keys}
+
+        def render() -> str:
+            return "\n".join([DIGEST_LEGEND + ":"] + [chosen[k] for k in keys if k in chosen])
+
+        text = render()
+        for k in sorted(keys, key=lambda k: -len(lines[k][0])):
+            if estimate_tokens(text) <= budget:
+                break
+            chosen[k] = lines[k][1]
+            text = render()
+        omitted: List[str] = []
+        for k in reversed(keys):
+            if estimate_tokens(text) <= budget:
+                break
+            del chosen[k]
+            omitted.insert(0, k)
+            text = render() + f"\n(schemas omitted for: {', '.join(omitted)})"
+        self._digests[cache_key] = text
+        return text
 
 
 def load_datacontext(templates_path, themes_path) -> DataContext:
     # Read with utf-8-sig to safely strip BOM if present
     templates = json.loads(open(templates_path, "r", encoding="utf-8-sig").read())
     themes = json.loads(open(themes_path, "r", encoding="utf-8-sig").read())
+    return build_datacontext(templates, themes)
+
+
+def build_datacontext(templates: Any, themes: Any) -> DataContext:
     allowed: List[str] = []
     if isinstance(templates, list):
         for t in templates:
@@ -119,35 +256,32 @@ def stub_outline(topic: str, *, max_slides: int, ctx: DataContext) -> List[Dict[
     return outline[: max(1, min(max_slides, len(outline)))]
 
 
-def stub_generate(topic: str, *, max_slides: int, lang: str, ctx: DataContext) -> Dict[str, Any]:
+def _stub_slide(item: Dict[str, Any], *, topic: str, lang: str) -> Dict[str, Any]:
     title = "Автоматично згенерована презентація" if str(lang).startswith("uk") else "Auto-generated Presentation"
+    lk = item.get("layout_key")
+    if lk == "Title Slide":
+        return {"layout_key": lk, "fields": {"title": topic or title, "subtitle": title}}
+    if lk == "Agenda / Outline Slide":
+        return {"layout_key": lk, "fields": {"title": "План", "items": ["Мета", "Підхід", "Етапи"]}}
+    if lk == "Title and Content":
+        return {"layout_key": lk, "fields": {"title": "Вступ", "body": ["Контекст", "Завдання", "Очікування"]}}
+    if lk == "Text + Image Slide":
+        return {"layout_key": lk, "fields": {"title": "Ключові ідеї", "body": ["Проблема", "Рішення", "Вплив"], "image": {"src": "example.png", "alt": "Ілюстрація"}}}
+    if lk == "Comparison Slide":
+        return {"layout_key": lk, "fields": {"title": "Порівняння", "a_title": "A", "a": ["Плюси", "Мінуси"], "b_title": "B", "b": ["Плюси", "Мінуси"]}}
+    if lk == "Quote / Key Message Slide":
+        return {"layout_key": lk, "fields": {"title": "Головна думка", "quote": "Коротко, чітко, по суті."}}
+    if lk == "Summary / Thank You Slide":
+        return {"layout_key": lk, "fields": {"title": "Підсумок", "points": ["Результати", "Кроки далі"], "thanks": "Дякую за увагу!"}}
+    return {"layout_key": lk, "fields": {"title": item.get("title", topic)}}
+
+
+def stub_generate(topic: str, *, max_slides: int, lang: str, ctx: DataContext) -> Dict[str, Any]:
     outline = stub_outline(topic, max_slides=max_slides, ctx=ctx)
-    slides: List[Dict[str, Any]] = []
-    for item in outline:
-        lk = item.get("layout_key")
-        if lk == "Title Slide":
-            slides.append({"layout_key": lk, "fields": {"title": topic or title, "subtitle": title}})
-        elif lk == "Agenda / Outline Slide":
-            slides.append({"layout_key": lk, "fields": {"title": "План", "items": ["Мета", "Підхід", "Етапи"]}})
-        elif lk == "Title and Content":
-            slides.append({"layout_key": lk, "fields": {"title": "Вступ", "body": ["Контекст", "Завдання", "Очікування"]}})
-        elif lk == "Text + Image Slide":
-            slides.append({"layout_key": lk, "fields": {"title": "Ключові ідеї", "body": ["Проблема", "Рішення", "Вплив"], "image": {"src": "example.png", "alt": "Ілюстрація"}}})
-        elif lk == "Comparison Slide":
-            slides.append({"layout_key": lk, "fields": {"title": "Порівняння", "a_title": "A", "a": ["Плюси", "Мінуси"], "b_title": "B", "b": ["Плюси", "Мінуси"]}})
-        elif lk == "Quote / Key Message Slide":
-            slides.append({"layout_key": lk, "fields": {"title": "Головна думка", "quote": "Коротко, чітко, по суті."}})
-        elif lk == "Summary / Thank You Slide":
-            slides.append({"layout_key": lk, "fields": {"title": "Підсумок", "points": ["Результати", "Кроки далі"], "thanks": "Дякую за увагу!"}})
-        else:
-            slides.append({"layout_key": lk, "fields": {"title": item.get("title", topic)}})
-    return {"slides": slides}
+    return {"slides": [_stub_slide(item, topic=topic, lang=lang) for item in outline]}
 
 
 def generate_outline_with_gemini(api_key: str, model_name: str, *, topic: str, max_slides: int, lang: str, ctx: DataContext) -> List[Dict[str, Any]]:
-    import google.generativeai as genai
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel(model_name)
     allowed = ", ".join(ctx.allowed_layouts)
     prompt = (
         f"Language: {lang}. Produce JSON only with key 'outline'. "
@@ -155,55 +289,22 @@ def generate_outline_with_gemini(api_key: str, model_name: str, *, topic: str, m
         f"Use these layout_key values only: {allowed}. "
         f"Topic: {topic}"
     )
-    res = model.generate_content([SYSTEM_SPEC, prompt], generation_config={"response_mime_type": "application/json"})
-    text = getattr(res, "text", None)
-    if not text and getattr(res, "candidates", None):
-        for c in res.candidates:
-            content = getattr(c, "content", None)
-            if content and getattr(content, "parts", None):
-                text = "".join(getattr(p, "text", "") for p in content.parts)
-                if text:
-                    break
-    if not text:
-        raise RuntimeError("Empty response from model (outline)")
-    cleaned = _extract_first_json_segment(_strip_code_fences(text))
-    data = json.loads(cleaned)
-    outline = data.get("outline") if isinstance(data, dict) else None
-    if not isinstance(outline, list):
-        raise ValueError("Model outline missing or not a list")
-    return outline
+    provider = default_pool().get("gemini", api_key, model_name)
+    text = run_sync(provider.complete_json("outline", SYSTEM_SPEC, prompt))
+    return _complete_items(_salvage(text), "outline", error="Model outline missing or not a list")
 
 
 def generate_slides_with_gemini(api_key: str, model_name: str, *, topic: str, outline: List[Dict[str, Any]], lang: str, ctx: DataContext) -> Dict[str, Any]:
-    import google.generativeai as genai
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel(model_name)
     prompt = (
         f"Language: {lang}. Produce JSON only with key 'slides'. "
         f"Respect provided outline order and layout_key strictly. Fields must match layout conventions from templates. "
         f"Keep bullets concise (<= 8 words, 3-6 items). Topic: {topic}. "
-        f"Outline JSON: {json.dumps(outline, ensure_ascii=False)} "
-        f"Templates JSON (sample schemas): {json.dumps(ctx.templates, ensure_ascii=False)[:8000]}"
+        f"Outline JSON: {json.dumps(outline, ensure_ascii=False)}\n"
+        f"{ctx.template_digest(it.get('layout_key') for it in outline if isinstance(it, dict))}"
     )
-    res = model.generate_content([SYSTEM_SPEC, prompt], generation_config={"response_mime_type": "application/json"})
-    text = getattr(res, "text", None)
-    if not text and getattr(res, "candidates", None):
-        for c in res.candidates:
-            content = getattr(c, "content", None)
-            if content and getattr(content, "parts", None):
-                text = "".join(getattr(p, "text", "") for p in content.parts)
-                if text:
-                    break
-    if not text:
-        raise RuntimeError("Empty response from model (slides)")
-    cleaned = _extract_first_json_segment(_strip_code_fences(text))
-    data = json.loads(cleaned)
-    if isinstance(data, list):
-        data = {"slides": data}
-    slides = data.get("slides") if isinstance(data, dict) else None
-    if not isinstance(slides, list):
-        raise ValueError("Model slides missing or not a list")
-    return {"slides": slides}
+    provider = default_pool().get("gemini", api_key, model_name)
+    text = run_sync(provider.complete_json("slides", SYSTEM_SPEC, prompt))
+    return _parse_slides_response(text, error="Model slides missing or not a list")
 
 
 def agent_generate(
@@ -218,275 +319,989 @@ def agent_generate(
     max_calls: int = 3,
     groq_api_key: Optional[str] = None,
     groq_model: str = "llama3-70b-8192",
+    cache: Optional[ResponseCache] = None,
+    draft_mode: str = "single",
+    fanout: int = 4,
+    draft_window: int = 1,
+    draft_retries: int = 1,
+    on_slide: Optional[SlideCallback] = None,
+    hedge: Optional[HedgePolicy] = None,
+    run_stats: Optional[Dict[str, Any]] = None,
+    providers: Optional[ProviderPool] = None,
+    existing: Optional[List[Dict[str, Any]]] = None,
+    existing_intents: Optional[List[Optional[str]]] = None,
+    topics: Optional[TopicIndex] = None,
+    reuse_threshold: float = 0.75,
+    library: Optional[DeckLibrary] = None,
+    examples_per_layout: int = 1,
+    journal: Optional[Journal] = None,
+    llm_review: bool = False,
+    chains: Optional[StageChains] = None,
 ) -> Dict[str, Any]:
-    return multi_agent_generate(
-        topic,
-        max_slides=max_slides,
-        lang=lang,
-        api_key=api_key,
-        model_name=model_name,
-        ctx=ctx,
-        verbose=verbose,
-        max_calls=max_calls,
-        groq_api_key=groq_api_key,
-        groq_model=groq_model,
+    """Blocking entry point; runs multi_agent_generate_async on the shared provider loop."""
+    return run_sync(
+        multi_agent_generate_async(
+            topic,
+            max_slides=max_slides,
+            lang=lang,
+            api_key=api_key,
+            model_name=model_name,
+            ctx=ctx,
+            verbose=verbose,
+            max_calls=max_calls,
+            groq_api_key=groq_api_key,
+            groq_model=groq_model,
+            cache=cache,
+            draft_mode=draft_mode,
+            fanout=fanout,
+            draft_window=draft_window,
+            draft_retries=draft_retries,
+            on_slide=on_slide,
+            hedge=hedge,
+            run_stats=run_stats,
+            providers=providers,
+            existing=existing,
+            existing_intents=existing_intents,
+            topics=topics,
+            reuse_threshold=reuse_threshold,
+            library=library,
+            examples_per_layout=examples_per_layout,
+            journal=journal,
+            llm_review=llm_review,
+            chains=chains,
+        )
     )
 
 
 # ===== Multi-agent pipeline =====
 
-def plan_with_gemini(api_key: str, model_name: str, *, topic: str, max_slides: int, lang: str, ctx: DataContext) -> Dict[str, Any]:
-    """Planner agent: returns { plan: { title, audience?, goals?, outline: [ {layout_key, title, intent?} ] } }"""
-    import google.generativeai as genai
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel(model_name)
+def _plan_prompt(*, topic: str, max_slides: int, lang: str, ctx: DataContext) -> str:
     allowed = ", ".join(ctx.allowed_layouts)
-    prompt = (
+    return (
         f"Language: {lang}. Return valid JSON only. Preferred shape: {{\"plan\": {{ \"title\": string, \"outline\": [{{layout_key, title, intent?}}] }} }}. "
         f"Acceptable alternative: {{\"outline\": [ ... ]}} or a raw array of outline items. "
         f"Use these layout_key values only: {allowed}. Max slides: {max_slides}. "
         f"Each outline item: {{layout_key, title, intent?}} with concise titles (<= 6 words). "
         f"Topic: {topic}."
     )
-    res = model.generate_content([SYSTEM_SPEC, prompt], generation_config={"response_mime_type": "application/json"})
-    text = getattr(res, "text", None)
-    if not text and getattr(res, "candidates", None):
-        for c in res.candidates:
-            content = getattr(c, "content", None)
-            if content and getattr(content, "parts", None):
-                text = "".join(getattr(p, "text", "") for p in content.parts)
-                if text:
-                    break
-    if not text:
-        raise RuntimeError("Empty response from model (plan)")
-    cleaned = _extract_first_json_segment(_strip_code_fences(text))
-    data = json.loads(cleaned)
-    outline = None
+
+
+def _parse_plan_response(text: str, *, topic: str, max_slides: int, ctx: DataContext, error: str) -> Dict[str, Any]:
+    found = _salvage(text)
+    data = found.value
+    path: Tuple[str, ...] = ()
     title = topic
-    if isinstance(data, list):
-        outline = data
-    elif isinstance(data, dict):
+    if isinstance(data, dict):
         if isinstance(data.get("plan"), dict) and isinstance(data["plan"].get("outline"), list):
             title = data["plan"].get("title") or title
-            outline = data["plan"]["outline"]
+            path = ("plan", "outline")
         elif isinstance(data.get("outline"), list):
-            outline = data["outline"]
-        elif isinstance(data.get("slides"), list):
-            outline = [
-                {"layout_key": s.get("layout_key"), "title": (s.get("fields") or {}).get("title", "")}
-                for s in data["slides"] if isinstance(s, dict) and isinstance(s.get("layout_key"), str)
-            ]
-    if not isinstance(outline, list):
-        raise ValueError("Model plan invalid")
+            path = ("outline",)
+        else:
+            path = ("slides",)
+    outline = _complete_items(found, *path, error=error)
+    if path == ("slides",):
+        outline = [
+            {"layout_key": s.get("layout_key"), "title": (s.get("fields") or {}).get("title", "")}
+            for s in outline if isinstance(s, dict) and isinstance(s.get("layout_key"), str)
+        ]
     norm_outline = []
     for it in outline:
         if isinstance(it, dict) and isinstance(it.get("layout_key"), str):
             norm_outline.append({"layout_key": it.get("layout_key"), "title": it.get("title", ""), "intent": it.get("intent")})
     allowed_set = set(ctx.allowed_layouts)
     norm_outline = [it for it in norm_outline if it["layout_key"] in allowed_set][: max_slides]
+    if found.truncated:
+        return {"title": title, "outline": norm_outline, "truncated": True}
     return {"title": title, "outline": norm_outline}
 
 
-def _groq_complete_json(api_key: str, model_name: str, system: str, user: str) -> str:
-    from groq import Groq
-    client = Groq(api_key=api_key)
-    resp = client.chat.completions.create(
-        model=model_name,
-        messages=[
-            {"role": "system", "content": system},
-            {"role": "user", "content": user},
-        ],
-        temperature=0.2,
-    )
-    return resp.choices[0].message.content or ""
+def _parse_slides_response(text: str, *, error: str) -> Dict[str, Any]:
+    """{"slides": [...]} from a response; a cut-off one keeps its complete slides and gets "truncated": True."""
+    found = _salvage(text)
+    slides = _complete_items(found, "slides", error=error)
+    if found.truncated:
+        return {"slides": slides, "truncated": True}
+    return {"slides": slides}
 
 
-def plan_with_groq(api_key: str, model_name: str, *, topic: str, max_slides: int, lang: str, ctx: DataContext) -> Dict[str, Any]:
-    allowed = ", ".join(ctx.allowed_layouts)
-    prompt = (
-        f"Language: {lang}. Return valid JSON only. Preferred shape: {{\"plan\": {{ \"title\": string, \"outline\": [{{layout_key, title, intent?}}] }} }}. "
-        f"Acceptable alternative: {{\"outline\": [ ... ]}} or a raw array of outline items. "
-        f"Use these layout_key values only: {allowed}. Max slides: {max_slides}. "
-        f"Each outline item: {{layout_key, title, intent?}} with concise titles (<= 6 words). "
-        f"Topic: {topic}."
-    )
-    text = _groq_complete_json(api_key, model_name, SYSTEM_SPEC, prompt)
-    cleaned = _extract_first_json_segment(_strip_code_fences(text))
-    data = json.loads(cleaned)
-    outline = None
-    title = topic
-    if isinstance(data, list):
-        outline = data
-    elif isinstance(data, dict):
-        if isinstance(data.get("plan"), dict) and isinstance(data["plan"].get("outline"), list):
-            title = data["plan"].get("title") or title
-            outline = data["plan"]["outline"]
-        elif isinstance(data.get("outline"), list):
-            outline = data["outline"]
-        elif isinstance(data.get("slides"), list):
-            outline = [
-                {"layout_key": s.get("layout_key"), "title": (s.get("fields") or {}).get("title", "")}
-                for s in data["slides"] if isinstance(s, dict) and isinstance(s.get("layout_key"), str)
-            ]
-    if not isinstance(outline, list):
-        raise ValueError("Model plan invalid (groq)")
-    norm_outline = []
-    for it in outline:
-        if isinstance(it, dict) and isinstance(it.get("layout_key"), str):
-            norm_outline.append({"layout_key": it.get("layout_key"), "title": it.get("title", ""), "intent": it.get("intent")})
-    allowed_set = set(ctx.allowed_layouts)
-    norm_outline = [it for it in norm_outline if it["layout_key"] in allowed_set][: max_slides]
-    return {"title": title, "outline": norm_outline}
+def _plan_layout_keys(plan: Dict[str, Any]) -> List[str]:
+    return [it.get("layout_key") for it in plan.get("outline", []) if isinstance(it, dict)]
 
 
-def plan_stub(topic: str, *, max_slides: int, lang: str, ctx: DataContext) -> Dict[str, Any]:
-    outline = stub_outline(topic, max_slides=max_slides, ctx=ctx)
-    return {"title": topic, "outline": outline}
+Examples = Dict[str, List[Dict[str, Any]]]  # layout_key -> few-shot slides (see DeckLibrary.few_shot)
 
 
-def draft_with_gemini(api_key: str, model_name: str, *, topic: str, plan: Dict[str, Any], lang: str, ctx: DataContext) -> Dict[str, Any]:
-    """Drafter agent: expand plan into concrete slides fields using templates as guidance."""
-    import google.generativeai as genai
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel(model_name)
-    prompt = (
-        f"Language: {lang}. Return valid JSON object with key 'slides' (array). "
-        f"Each slide: {{layout_key:string, fields:object}}. Use only layout_key from templates and include all REQUIRED fields (no '?' in fieldsSchema); use correct types: string, array-of-strings, boolean as specified. "
-        f"Keep bullets concise (<= 8 words, 3-6 items). Topic: {topic}. "
-        f"Plan JSON: {json.dumps(plan, ensure_ascii=False)} "
-        f"Templates JSON (schemas): {json.dumps(ctx.templates, ensure_ascii=False)[:8000]}"
-    )
-    res = model.generate_content([SYSTEM_SPEC, prompt], generation_config={"response_mime_type": "application/json"})
-    text = getattr(res, "text", None)
-    if not text and getattr(res, "candidates", None):
-        for c in res.candidates:
-            content = getattr(c, "content", None)
-            if content and getattr(content, "parts", None):
-                text = "".join(getattr(p, "text", "") for p in content.parts)
-                if text:
-                    break
-    if not text:
-        raise RuntimeError("Empty response from model (draft)")
-    cleaned = _extract_first_json_segment(_strip_code_fences(text))
-    data = json.loads(cleaned)
-    if isinstance(data, list):
-        data = {"slides": data}
-    slides = data.get("slides") if isinstance(data, dict) else None
-    if not isinstance(slides, list):
-        raise ValueError("Draft: slides missing or not a list")
-    return {"slides": slides}
+def _examples_block(examples: Optional[Examples], layout_keys: Iterable[str]) -> str:
+    shots = [s for lk in dict.fromkeys(layout_keys) for s in (examples or {}).get(lk, ())]
+    if not shots:
+        return ""
+    return f"\nExample slides from earlier decks (follow their style and density, not their content): {json.dumps(shots, ensure_ascii=False)}"
 
 
-def draft_with_groq(api_key: str, model_name: str, *, topic: str, plan: Dict[str, Any], lang: str, ctx: DataContext) -> Dict[str, Any]:
-    prompt = (
+def _draft_prompt(*, topic: str, plan: Dict[str, Any], lang: str, ctx: DataContext, examples: Optional[Examples] = None) -> str:
+    return (
         f"Language: {lang}. Return valid JSON object with key 'slides' (array). "
         f"Each slide: {{layout_key:string, fields:object}}. Use only layout_key from templates and include all REQUIRED fields (no '?' in fieldsSchema); use correct types: string, array-of-strings, boolean as specified. "
         f"Keep bullets concise (<= 8 words, 3-6 items). Topic: {topic}. "
-        f"Plan JSON: {json.dumps(plan, ensure_ascii=False)} "
-        f"Templates JSON (schemas): {json.dumps(ctx.templates, ensure_ascii=False)[:8000]}"
+        f"Plan JSON: {json.dumps(plan, ensure_ascii=False)}\n"
+        f"{ctx.template_digest(_plan_layout_keys(plan))}"
+        f"{_examples_block(examples, _plan_layout_keys(plan))}"
     )
-    text = _groq_complete_json(api_key, model_name, SYSTEM_SPEC, prompt)
-    data = json.loads(_strip_code_fences(text))
-    if isinstance(data, list):
-        data = {"slides": data}
-    slides = data.get("slides") if isinstance(data, dict) else None
-    if not isinstance(slides, list):
-        raise ValueError("Draft: slides missing or not a list (groq)")
-    return {"slides": slides}
-
-
-def draft_stub(topic: str, *, plan: Dict[str, Any], lang: str, ctx: DataContext) -> Dict[str, Any]:
-    # Convert outline to simple slides, similar to stub_generate
-    outline = plan.get("outline", []) if isinstance(plan, dict) else []
-    return stub_generate(topic, max_slides=len(outline) or 8, lang=lang, ctx=ctx)
 
 
-def review_and_refine_with_gemini(api_key: str, model_name: str, *, topic: str, draft: Dict[str, Any], lang: str, ctx: DataContext) -> Dict[str, Any]:
-    """Reviewer agent: enforce constraints, fix wording length, ensure allowed layouts."""
-    import google.generativeai as genai
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel(model_name)
+def _review_prompt(*, draft: Dict[str, Any], lang: str, ctx: DataContext) -> str:
     allowed = ", ".join(ctx.allowed_layouts)
-    prompt = (
+    return (
         f"Language: {lang}. Return valid JSON object with key 'slides' (array). "
         f"Review and refine: use only allowed layout_key ({allowed}); ensure REQUIRED fields present with correct types per fieldsSchema (string, array-of-strings, boolean); limit bullets (3-6, <= 8 words); keep meaning; ensure UTF-8; do not add keys not in fieldsSchema. "
         f"Input slides JSON: {json.dumps(draft, ensure_ascii=False)}"
     )
-    res = model.generate_content([SYSTEM_SPEC, prompt], generation_config={"response_mime_type": "application/json"})
-    text = getattr(res, "text", None)
-    if not text and getattr(res, "candidates", None):
-        for c in res.candidates:
-            content = getattr(c, "content", None)
-            if content and getattr(content, "parts", None):
-                text = "".join(getattr(p, "text", "") for p in content.parts)
-                if text:
-                    break
-    if not text:
-        raise RuntimeError("Empty response from model (review)")
-    data = json.loads(_strip_code_fences(text))
-    if isinstance(data, list):
-        data = {"slides": data}
-    slides = data.get("slides") if isinstance(data, dict) else None
-    if not isinstance(slides, list):
-        raise ValueError("Review: slides missing or not a list")
-    return {"slides": slides}
 
 
-def review_and_refine_with_groq(api_key: str, model_name: str, *, topic: str, draft: Dict[str, Any], lang: str, ctx: DataContext) -> Dict[str, Any]:
+def _fused_prompt(*, topic: str, max_slides: int, lang: str, ctx: DataContext, examples: Optional[Examples] = None) -> str:
     allowed = ", ".join(ctx.allowed_layouts)
-    prompt = (
-        f"Language: {lang}. Return valid JSON object with key 'slides' (array). "
-        f"Review and refine: use only allowed layout_key ({allowed}); ensure REQUIRED fields present with correct types per fieldsSchema (string, array-of-strings, boolean); limit bullets (3-6, <= 8 words); keep meaning; ensure UTF-8; do not add keys not in fieldsSchema. "
-        f"Input slides JSON: {json.dumps(draft, ensure_ascii=False)}"
+    return (
+        f"Language: {lang}. Return valid JSON object {{\"title\": string, \"slides\": [{{layout_key, fields}}]}}: the whole deck, planned and written in one answer. "
+        f"Max slides: {max_slides}. Start with a title slide and order the rest as the talk goes. Use only layout_key from: {allowed}. "
+        f"Each slide's fields follow its layout's fieldsSchema: all REQUIRED fields (no '?'), correct types (string, array-of-strings, boolean), no other keys. "
+        f"Bullets: 3-6 items, <= 8 words each, plain text (no Markdown or HTML). Topic: {topic}.\n"
+        f"{ctx.template_digest(ctx.allowed_layouts)}"
+        f"{_examples_block(examples, ctx.allowed_layouts)}"
     )
-    text = _groq_complete_json(api_key, model_name, SYSTEM_SPEC, prompt)
-    data = json.loads(_strip_code_fences(text))
-    if isinstance(data, list):
-        data = {"slides": data}
-    slides = data.get("slides") if isinstance(data, dict) else None
-    if not isinstance(slides, list):
-        raise ValueError("Review: slides missing or not a list (groq)")
-    return {"slides": slides}
 
 
-def _heuristic_trim_bullets(slide: Dict[str, Any]) -> None:
-    fields = slide.get("fields")
-    if not isinstance(fields, dict):
-        return
-    # normalize body/items/points arrays
-    for key in ("body", "items", "points"):
-        val = fields.get(key)
-        if isinstance(val, list):
-            # limit to 3-6 items
-            val = [str(x) for x in val if isinstance(x, (str, int, float))]
-            if len(val) > 6:
-                val = val[:6]
-            if len(val) < 3 and len(val) > 0:
-                # pad by splitting long items if possible
-                while len(val) < 3 and any(len(str(x).split()) > 8 for x in val):
-                    for i, x in enumerate(list(val)):
-                        words = str(x).split()
-                        if len(words) > 8:
-                            mid = len(words) // 2
-                            val[i] = " ".join(words[:mid])
-                            val.insert(i + 1, " ".join(words[mid:]))
-                            break
-                    if len(val) >= 3:
-                        break
-            # enforce <= 8 words per bullet
-            val = [" ".join(str(x).split()[:8]) for x in val]
-            fields[key] = val
+def _parse_fused_response(text: str, *, topic: str, max_slides: int, error: str) -> Dict[str, Any]:
+    found = _salvage(text)
+    data = found.value
+    slides = _complete_items(found, "slides", error=error)
+    if not any(isinstance(s, dict) for s in slides):
+        raise ValueError(error)
+    title = data.get("title") if isinstance(data, dict) and isinstance(data.get("title"), str) else topic
+    deck = {"title": title or topic, "slides": [s for s in slides if isinstance(s, dict)][:max_slides]}
+    if found.truncated:
+        deck["truncated"] = True
+    return deck
+
+
+def fused_plan(deck: Dict[str, Any]) -> Dict[str, Any]:
+    """The plan a fused deck implies: its slides' layouts and titles as the outline."""
+    outline = []
+    for s in deck.get("slides", []):
+        fields = s.get("fields") if isinstance(s.get("fields"), dict) else {}
+        title = fields.get("title") if isinstance(fields.get("title"), str) else ""
+        outline.append({"layout_key": s.get("layout_key"), "title": title, "intent": None})
+    return {"title": deck.get("title"), "outline": outline}
+
+
+async def fused_async(
+    provider: Provider,
+    *,
+    topic: str,
+    max_slides: int,
+    lang: str,
+    ctx: DataContext,
+    cache: Optional[ResponseCache] = None,
+    examples: Optional[Examples] = None,
+) -> Dict[str, Any]:
+    """Planner and drafter in one call, constrained to the templates' deck schema (src/schemaexport.py):
+    returns {title, slides}."""
+    prompt = _fused_prompt(topic=topic, max_slides=max_slides, lang=lang, ctx=ctx, examples=examples)
+    schema = deck_json_schema(ctx.templates, layout_keys=ctx.allowed_layouts, max_slides=max_slides, max_bullets=MAX_BULLETS)
+    return await _cached_completion(
+        cache,
+        provider,
+        stage="fused",
+        prompt=prompt,
+        parse=lambda text: _parse_fused_response(text, topic=topic, max_slides=max_slides, error=f"Fused: slides missing or not a list ({provider.name})"),
+        schema=schema,
+    )
+
+
+async def plan_async(provider: Provider, *, topic: str, max_slides: int, lang: str, ctx: DataContext, cache: Optional[ResponseCache] = None) -> Dict[str, Any]:
+    """Planner agent: returns { plan: { title, audience?, goals?, outline: [ {layout_key, title, intent?} ] } }"""
+    prompt = _plan_prompt(topic=topic, max_slides=max_slides, lang=lang, ctx=ctx)
+    return await _cached_completion(
+        cache,
+        provider,
+        stage="plan",
+        prompt=prompt,
+        parse=lambda text: _parse_plan_response(text, topic=topic, max_slides=max_slides, ctx=ctx, error=f"Model plan invalid ({provider.name})"),
+    )
+
+
+async def draft_async(
+    provider: Provider,
+    *,
+    topic: str,
+    plan: Dict[str, Any],
+    lang: str,
+    ctx: DataContext,
+    cache: Optional[ResponseCache] = None,
+    examples: Optional[Examples] = None,
+) -> Dict[str, Any]:
+    """Drafter agent: expand plan into concrete slides fields using templates (and example slides) as guidance."""
+    prompt = _draft_prompt(topic=topic, plan=plan, lang=lang, ctx=ctx, examples=examples)
+    return await _cached_completion(
+        cache,
+        provider,
+        stage="draft",
+        prompt=prompt,
+        parse=lambda text: _parse_slides_response(text, error=f"Draft: slides missing or not a list ({provider.name})"),
+    )
+
+
+def review_gate(
+    draft: Dict[str, Any],
+    *,
+    ctx: DataContext,
+    fixes: Optional[Fixes] = None,
+) -> Tuple[List[Dict[str, Any]], Dict[int, List[str]]]:
+    """Local part of the review: the rule-based reviewer (src/reviewrules.py), then validation.
+
+    Returns (slides, issues by slide index); slides without issues need no model call.
+    ``fixes`` receives what the rules changed, by kind.
+    """
+    compiled = compile_templates(ctx.templates)
+    slides, found = deck_rules(compiled).review(draft.get("slides"), allowed=ctx.allowed_layouts)
+    if fixes is not None:
+        fixes.update(found)
+    issues: Dict[int, List[str]] = {}
+    for i, slide in enumerate(slides):
+        fields = slide.get("fields")
+        if not isinstance(fields, dict):
+            issues[i] = ["fields must be an object"]
+            continue
+        layout = compiled.get(slide["layout_key"])
+        if layout is None:
+            continue
+        problems = layout.issues(fields)
+        if problems:
+            issues[i] = [issue_message(e) for e in problems]
+    return slides, issues
+
+
+def _partial_review_prompt(*, slides: List[Dict[str, Any]], issues: List[List[str]], lang: str, ctx: DataContext) -> str:
+    problems = [{"slide": n + 1, "issues": found} for n, found in enumerate(issues)]
+    return (
+        f"Language: {lang}. Return valid JSON object with key 'slides' (array of exactly {len(slides)} item(s), same order). "
+        f"Fix each slide so its fields match its layout schema: keep layout_key, add missing REQUIRED fields, correct types (string, array-of-strings, boolean); "
+        f"limit bullets (3-6, <= 8 words); keep meaning and all valid content; do not add keys not in the schema. "
+        f"Problems: {json.dumps(problems, ensure_ascii=False)}\n"
+        f"{ctx.template_digest(s.get('layout_key') for s in slides)}\n"
+        f"Input slides JSON: {json.dumps({'slides': slides}, ensure_ascii=False)}"
+    )
+
+
+def _parse_partial_review(text: str, slides: List[Dict[str, Any]], *, error: str) -> List[Dict[str, Any]]:
+    parsed = _parse_slides_response(text, error=error)
+    fixed = parsed["slides"]
+    # a cut-off answer still fixes the slides before the cut; the rest keep their draft
+    if len(fixed) > len(slides) or len(fixed) < len(slides) and not parsed.get("truncated"):
+        raise ValueError(f"{error}: expected {len(slides)} slide(s), got {len(fixed)}")
+    out = []
+    for old, new in zip(slides, fixed):
+        if not isinstance(new, dict) or not isinstance(new.get("fields"), dict):
+            raise ValueError(f"{error}: slide without fields")
+        # the reviewer fixes fields; the layout stays the one the plan chose
+        out.append({"layout_key": old["layout_key"], "fields": new["fields"]})
+    return out
+
+
+async def review_failing_async(
+    provider: Provider,
+    *,
+    slides: List[Dict[str, Any]],
+    issues: Dict[int, List[str]],
+    lang: str,
+    ctx: DataContext,
+    cache: Optional[ResponseCache] = None,
+) -> Dict[str, Any]:
+    """Reviewer call for just the slides review_gate() flagged, spliced back into ``slides`` by index."""
+    order = sorted(issues)
+    failing = [slides[i] for i in order]
+    prompt = _partial_review_prompt(slides=failing, issues=[issues[i] for i in order], lang=lang, ctx=ctx)
+    fixed = await _cached_completion(
+        cache,
+        provider,
+        stage="review",
+        prompt=prompt,
+        parse=lambda text: _parse_partial_review(text, failing, error=f"Review: slides missing or not a list ({provider.name})"),
+    )
+    # the model's fixes go through the same rules as the draft did
+    rules = deck_rules(compile_templates(ctx.templates))
+    out = list(slides)
+    for i, slide in zip(order, fixed):
+        out[i] = rules.review_slide(slide, {}) or slide
+    return {"slides": out}
+
+
+async def review_async(provider: Provider, *, topic: str, draft: Dict[str, Any], lang: str, ctx: DataContext, cache: Optional[ResponseCache] = None) -> Dict[str, Any]:
+    """Reviewer agent: local checks first; only slides that still fail their layout schema are sent to the model."""
+    slides, issues = review_gate(draft, ctx=ctx)
+    if not issues:
+        return {"slides": slides}
+    return await review_failing_async(provider, slides=slides, issues=issues, lang=lang, ctx=ctx, cache=cache)
+
+
+SlideCallback = Callable[[int, Dict[str, Any]], None]
+
+
+async def draft_stream_async(
+    provider: Provider,
+    *,
+    topic: str,
+    plan: Dict[str, Any],
+    lang: str,
+    ctx: DataContext,
+    cache: Optional[ResponseCache] = None,
+    on_slide: Optional[SlideCallback] = None,
+    examples: Optional[Examples] = None,
+) -> Dict[str, Any]:
+    """Drafter agent over a streamed response: on_slide(index, slide) fires as each slide object closes."""
+    prompt = _draft_prompt(topic=topic, plan=plan, lang=lang, ctx=ctx, examples=examples)
+    note_prompt("draft", prompt)
+    parse = lambda text: _parse_slides_response(text, error=f"Draft: slides missing or not a list ({provider.name})")
+    with tracing.span("provider.call", stage="draft", provider=provider.name, model=provider.model, stream=True) as sp:
+        if tracing.enabled():
+            sp.set(prompt_chars=len(prompt), prompt_tokens=prompt_tokens(prompt))
+        key = make_cache_key(provider.name, provider.model, "draft", SYSTEM_SPEC, prompt, provider.generation_config)
+        cached = cache.get(key) if cache is not None else None
+        if cached is not None:
+            try:
+                result = _timed_parse(sp, parse, cached)
+            except Exception:
+                cache.discard(key)
+            else:
+                sp.set(cache="hit")
+                if on_slide is not None:
+                    for i, slide in enumerate(result["slides"]):
+                        on_slide(i, slide)
+                return result
+        if cache is not None:
+            sp.set(cache="miss")
+        parser = SlideStreamParser()
+        parts: List[str] = []
+        started = time.perf_counter()
+        async for chunk in provider.stream_json("draft", SYSTEM_SPEC, prompt):
+            if not parts:
+                sp.set(first_chunk_seconds=round(time.perf_counter() - started, 6))
+            parts.append(chunk)
+            for slide in parser.feed(chunk):
+                if on_slide is not None:
+                    on_slide(parser.count - 1, slide)
+        text = "".join(parts)
+        if tracing.enabled():
+            sp.set(response_chars=len(text), response_tokens=estimate_tokens(text), streamed_slides=parser.count)
+        result = _timed_parse(sp, parse, text)
+        if cache is not None:
+            cache.put(key, text, meta={"provider": provider.name, "model": provider.model, "stage": "draft"})
+        return result
+
+
+# Sync per-provider entry points, kept for callers that drive single stages directly.
+
+def plan_with_gemini(api_key: str, model_name: str, *, topic: str, max_slides: int, lang: str, ctx: DataContext, cache: Optional[ResponseCache] = None) -> Dict[str, Any]:
+    provider = default_pool().get("gemini", api_key, model_name)
+    return run_sync(plan_async(provider, topic=topic, max_slides=max_slides, lang=lang, ctx=ctx, cache=cache))
+
+
+def plan_with_groq(api_key: str, model_name: str, *, topic: str, max_slides: int, lang: str, ctx: DataContext, cache: Optional[ResponseCache] = None) -> Dict[str, Any]:
+    provider = default_pool().get("groq", api_key, model_name)
+    return run_sync(plan_async(provider, topic=topic, max_slides=max_slides, lang=lang, ctx=ctx, cache=cache))
+
+
+def draft_with_gemini(api_key: str, model_name: str, *, topic: str, plan: Dict[str, Any], lang: str, ctx: DataContext, cache: Optional[ResponseCache] = None) -> Dict[str, Any]:
+    provider = default_pool().get("gemini", api_key, model_name)
+    return run_sync(draft_async(provider, topic=topic, plan=plan, lang=lang, ctx=ctx, cache=cache))
+
+
+def draft_with_groq(api_key: str, model_name: str, *, topic: str, plan: Dict[str, Any], lang: str, ctx: DataContext, cache: Optional[ResponseCache] = None) -> Dict[str, Any]:
+    provider = default_pool().get("groq", api_key, model_name)
+    return run_sync(draft_async(provider, topic=topic, plan=plan, lang=lang, ctx=ctx, cache=cache))
+
+
+def review_and_refine_with_gemini(api_key: str, model_name: str, *, topic: str, draft: Dict[str, Any], lang: str, ctx: DataContext, cache: Optional[ResponseCache] = None) -> Dict[str, Any]:
+    provider = default_pool().get("gemini", api_key, model_name)
+    return run_sync(review_async(provider, topic=topic, draft=draft, lang=lang, ctx=ctx, cache=cache))
+
+
+def review_and_refine_with_groq(api_key: str, model_name: str, *, topic: str, draft: Dict[str, Any], lang: str, ctx: DataContext, cache: Optional[ResponseCache] = None) -> Dict[str, Any]:
+    provider = default_pool().get("groq", api_key, model_name)
+    return run_sync(review_async(provider, topic=topic, draft=draft, lang=lang, ctx=ctx, cache=cache))
+
+
+# ----- Per-slide drafting fan-out -----
+
+def _slide_draft_prompt(
+    *,
+    topic: str,
+    plan: Dict[str, Any],
+    start: int,
+    end: int,
+    lang: str,
+    ctx: DataContext,
+    examples: Optional[Examples] = None,
+) -> str:
+    outline = plan.get("outline", [])
+    items = outline[start:end]
+    prev_title = outline[start - 1].get("title", "") if start > 0 else None
+    next_title = outline[end].get("title", "") if end < len(outline) else None
+    specs = [
+        {"layout_key": it.get("layout_key"), "title": it.get("title", ""), "intent": it.get("intent")}
+        for it in items
+    ]
+    return (
+        f"Language: {lang}. Return valid JSON object with key 'slides' (array of exactly {len(items)} item(s), same order). "
+        f"Each slide: {{layout_key:string, fields:object}}. Keep the given layout_key and include all REQUIRED fields (no '?' in fieldsSchema); use correct types: string, array-of-strings, boolean as specified. "
+        f"Keep bullets concise (<= 8 words, 3-6 items). Topic: {topic}. Deck title: {plan.get('title') or topic}. "
+        f"Slides {start + 1}-{end} of {len(outline)}. Previous slide title: {json.dumps(prev_title, ensure_ascii=False)}. Next slide title: {json.dumps(next_title, ensure_ascii=False)}. "
+        f"Slides to write: {json.dumps(specs, ensure_ascii=False)}\n"
+        f"{ctx.template_digest(it.get('layout_key') for it in items)}"
+        f"{_examples_block(examples, (it.get('layout_key') for it in items))}"
+    )
+
+
+def _parse_window_response(text: str, items: List[Dict[str, Any]], compiled: CompiledTemplates) -> List[Dict[str, Any]]:
+    found = _salvage(text)
+    data = found.value
+    if isinstance(data, dict) and "layout_key" in data:
+        if found.truncated:
+            raise ValueError("slide cut off")
+        data = [data]
+    else:
+        data = _complete_items(found, "slides", error="slides missing or not a list")
+    if not isinstance(data, list) or len(data) != len(items):
+        raise ValueError(f"expected {len(items)} slide(s)")
+    slides: List[Dict[str, Any]] = []
+    for s, it in zip(data, items):
+        if not isinstance(s, dict) or not isinstance(s.get("fields"), dict):
+            raise ValueError("slide without fields")
+        lk = s.get("layout_key") or it["layout_key"]
+        if lk != it["layout_key"]:
+            raise ValueError(f"layout_key '{lk}' does not match outline '{it['layout_key']}'")
+        layout = compiled.get(lk)
+        fields = s["fields"]
+        if layout is not None:
+            fields = layout.fix(fields)
+            errs = layout.issues(fields)
+            if errs:
+                raise ValueError("; ".join(issue_message(e) for e in errs))
+        slides.append({"layout_key": lk, "fields": fields})
+    return slides
+
+
+async def draft_per_slide_async(
+    chain: "ProviderChain",
+    pool: ProviderPool,
+    *,
+    topic: str,
+    plan: Dict[str, Any],
+    lang: str,
+    ctx: DataContext,
+    cache: Optional[ResponseCache] = None,
+    fanout: int = 4,
+    window: int = 1,
+    retries: int = 1,
+    verbose: bool = False,
+    on_slide: Optional[SlideCallback] = None,
+    only: Optional[Iterable[int]] = None,
+    examples: Optional[Examples] = None,
+    journal: Optional[Journal] = None,
+) -> Dict[str, Any]:
+    """Drafter agent, fan-out mode: one request per outline window, run concurrently and reassembled in order.
+
+    A window that keeps failing (after ``retries`` extra passes over the provider chain)
+    falls back to stub slides for just those outline items. With ``only``, just those outline
+    indices are drafted (windows never span a gap) and their slides are returned in index order.
+    With a ``journal``, finished windows are saved one by one and found ones are not drafted again.
+    """
+    outline = [it for it in plan.get("outline", []) if isinstance(it, dict) and isinstance(it.get("layout_key"), str)]
+    plan = dict(plan, outline=outline)
+    compiled = compile_templates(ctx.templates)
+    window = max(1, int(window))
+    slots = asyncio.Semaphore(max(1, int(fanout)))
+    wanted = sorted({i for i in only if 0 <= i < len(outline)}) if only is not None else list(range(len(outline)))
+    windows: List[Tuple[int, int]] = []
+    for i in wanted:
+        if windows and windows[-1][1] == i and i - windows[-1][0] < window:
+            windows[-1] = (windows[-1][0], i + 1)
+        else:
+            windows.append((i, i + 1))
+
+    async def draft_window(start: int, end: int) -> List[Dict[str, Any]]:
+        slides = await _draft_window(start, end)
+        if on_slide is not None:
+            for i, slide in enumerate(slides):
+                on_slide(start + i, slide)
+        return slides
+
+    async def _draft_window(start: int, end: int) -> List[Dict[str, Any]]:
+        items = outline[start:end]
+        piece = f"draft_slide-{start}-{end}"
+        saved = journal.load(piece) if journal is not None else None
+        if isinstance(saved, list) and len(saved) == len(items):
+            if verbose:
+                print(f"[drafter] slides {start + 1}-{end}: resumed from journal")
+            return saved
+        prompt = _slide_draft_prompt(topic=topic, plan=plan, start=start, end=end, lang=lang, ctx=ctx, examples=examples)
+        with tracing.span("draft.window", start=start, end=end) as sp:
+            queued = time.perf_counter()
+            async with slots:
+                sp.set(slot_wait_seconds=round(time.perf_counter() - queued, 6))
+                for attempt in range(max(0, int(retries)) + 1):
+                    for name, key, model in chain:
+                        if not key or not pool.available(name):
+                            continue
+                        try:
+                            slides = await _cached_completion(
+                                cache,
+                                pool.get(name, key, model),
+                                stage="draft_slide",
+                                prompt=prompt,
+                                parse=lambda text: _parse_window_response(text, items, compiled),
+                            )
+                            sp.set(provider=name, attempts=attempt + 1)
+                            if journal is not None:
+                                journal.save(piece, slides)
+                            return slides
+                        except Exception as e:
+                            if verbose:
+                                print(f"[drafter] slides {start + 1}-{end} via {name} failed (attempt {attempt + 1}): {e}")
+            if verbose:
+                print(f"[drafter] slides {start + 1}-{end}: using stub")
+            sp.set(provider="fallback")
+            if journal is not None:
+                journal.note_fallback("draft")
+            return [
+                {"layout_key": it["layout_key"], "fields": dict(_stub_slide(it, topic=topic, lang=lang)["fields"], title=it.get("title") or topic)}
+                for it in items
+            ]
+
+    parts = await asyncio.gather(*(draft_window(start, end) for start, end in windows))
+    return {"slides": [s for part in parts for s in part]}
+
+
+def plan_stub(topic: str, *, max_slides: int, lang: str, ctx: DataContext) -> Dict[str, Any]:
+    outline = stub_outline(topic, max_slides=max_slides, ctx=ctx)
+    return {"title": topic, "outline": outline}
+
+
+def draft_stub(topic: str, *, plan: Dict[str, Any], lang: str, ctx: DataContext) -> Dict[str, Any]:
+    # Convert outline to simple slides, similar to stub_generate
+    outline = plan.get("outline", []) if isinstance(plan, dict) else []
+    return stub_generate(topic, max_slides=len(outline) or 8, lang=lang, ctx=ctx)
 
 
 def review_stub(draft: Dict[str, Any], *, ctx: DataContext) -> Dict[str, Any]:
-    allowed = set(ctx.allowed_layouts)
-    slides = [s for s in draft.get("slides", []) if isinstance(s, dict) and s.get("layout_key") in allowed]
-    for s in slides:
-        _heuristic_trim_bullets(s)
+    """Reviewer without a model: the rule-based reviewer alone."""
+    slides, _ = deck_rules(compile_templates(ctx.templates)).review(draft.get("slides"), allowed=ctx.allowed_layouts)
     return {"slides": slides}
 
 
-def multi_agent_generate(
+ProviderChain = List[Tuple[str, Optional[str], str]]  # (provider name, api key, model)
+StageChains = Dict[str, ProviderChain]  # stage (config.PROVIDER_STAGES) or "default" -> chain
+
+# ----- Provider registry -----
+# Settings names the providers and their order per stage; providers.register_provider maps each
+# name to the class that talks to it. A chain entry without a key is skipped by _run_stage.
+
+_CREDENTIALS = {"gemini": "GOOGLE_API_KEY", "groq": "GROQ_API_KEY", "local": "LOCAL_BASE_URL"}
+
+
+def provider_chains(settings: Settings, *, offline: bool = False) -> StageChains:
+    """Each stage's providers in Settings.provider_order, as (name, api key, model) entries.
+
+    The local server has a placeholder key once LOCAL_BASE_URL is set. Offline, every key is None.
+    """
+    credentials = {
+        "gemini": (settings.google_api_key, settings.model),
+        "groq": (settings.groq_api_key, settings.groq_model),
+        "local": ((settings.local_api_key or LOCAL_NO_KEY) if settings.local_base_url else None, settings.local_model),
+    }
+    return {
+        stage: [(name, None if offline else credentials[name][0], credentials[name][1]) for name in settings.providers_for(stage)]
+        for stage in ("default",) + PROVIDER_STAGES
+    }
+
+
+def stage_chain(chains: StageChains, stage: str) -> ProviderChain:
+    return chains.get(stage) or chains["default"]
+
+
+def configure_providers(settings: Settings, pool: Optional[ProviderPool] = None) -> None:
+    """Point the "local" provider at Settings.local_base_url, with its own concurrency cap,
+    deadline and keep-alive connection pool."""
+    if settings.local_base_url:
+        register_provider("local", functools.partial(
+            LocalProvider,
+            base_url=settings.local_base_url,
+            connect_timeout=settings.local_connect_timeout,
+            keepalive=settings.local_keepalive,
+            max_connections=max(1, settings.local_concurrency),
+        ))
+    pool = pool or default_pool()
+    pool.set_concurrency({"local": settings.local_concurrency})
+    pool.set_timeout(settings.local_timeout, name="local")
+
+
+
+async def _run_stage(
+    label: str,
+    chain: ProviderChain,
+    pool: ProviderPool,
+    call: Callable[[Provider], Awaitable[T]],
+    fallback: Callable[[], T],
+    *,
+    stage: str,
+    fallback_note: str,
+    verbose: bool,
+    hedge: Optional[HedgePolicy] = None,
+    run_stats: Optional[Dict[str, Any]] = None,
+) -> T:
+    """Try each provider of the chain in order; on exhaustion return fallback().
+
+    With a hedge policy the first two available providers are raced instead (see race_with_hedge).
+    The provider that produced the result is recorded in run_stats["stages"][label].
+    """
+    with tracing.span("stage", stage=label) as sp, collect_waits() as waits:
+        return await _run_stage_traced(
+            sp, waits, label, chain, pool, call, fallback, stage=stage, fallback_note=fallback_note, verbose=verbose,
+            hedge=hedge, run_stats=run_stats,
+        )
+
+
+async def _run_stage_traced(
+    sp: Any,
+    waits: List[float],
+    label: str,
+    chain: ProviderChain,
+    pool: ProviderPool,
+    call: Callable[[Provider], Awaitable[T]],
+    fallback: Callable[[], T],
+    *,
+    stage: str,
+    fallback_note: str,
+    verbose: bool,
+    hedge: Optional[HedgePolicy],
+    run_stats: Optional[Dict[str, Any]],
+) -> T:
+    started = time.perf_counter()
+    failed: List[str] = []  # providers that were tried and failed, in order (the fallback path)
+
+    def record(provider: str, hedged: bool = False, result: Any = None) -> None:
+        # waits: rate limiter queueing of every call in this stage (see ratelimit.collect_waits)
+        waited = round(sum(waits), 3)
+        # truncated: the response was cut off and only its complete part kept (see salvage_json)
+        truncated = isinstance(result, dict) and bool(result.get("truncated"))
+        sp.set(provider=provider, hedged=hedged, failed=failed, wait_seconds=waited, truncated=truncated)
+        if verbose and truncated:
+            kept = len(result.get("slides") or result.get("outline") or ())
+            print(f"[{label}] {provider} response was cut off; kept {kept} complete item(s)")
+        if run_stats is not None:
+            run_stats.setdefault("stages", {})[label] = {
+                "provider": provider,
+                "hedged": hedged,
+                "elapsed": round(time.perf_counter() - started, 3),
+                "rate_wait": waited,
+                "truncated": truncated,
+            }
+
+    blocked = [name for name, key, _ in chain if key and not pool.available(name)]
+    if blocked:
+        # open circuit breakers: go straight to the healthy providers (or the fallback)
+        chain = [c for c in chain if c[0] not in blocked]
+        sp.set(circuit_open=blocked)
+        if verbose:
+            nxt = f"using {chain[0][0]}" if chain else fallback_note
+            print(f"[{label}] circuit open for {', '.join(blocked)}; {nxt}")
+    live = [c for c in chain if c[1]]
+    if hedge is not None and len(live) >= 2:
+        primary, secondary = pool.get(*live[0]), pool.get(*live[1])
+        try:
+            winner, result, hedged = await race_with_hedge(primary, secondary, call, stage=stage, policy=hedge)
+            if verbose and hedged:
+                print(f"[{label}] hedged to {secondary.name}; {winner.name} answered first")
+            record(winner.name, hedged, result)
+            return result
+        except Exception as e:
+            chain = [c for c in chain if c not in live[:2]]
+            failed.extend((primary.name, secondary.name))
+            if verbose:
+                nxt = f"trying {chain[0][0]}…" if chain else fallback_note
+                print(f"[{label}] {primary.name}/{secondary.name} failed: {e}; {nxt}")
+    for i, (name, key, model) in enumerate(chain):
+        try:
+            if not key:
+                raise RuntimeError(f"missing {_CREDENTIALS.get(name, name.upper() + '_API_KEY')}")
+            result = await call(pool.get(name, key, model))
+            record(name, result=result)
+            return result
+        except Exception as e:
+            failed.append(name)
+            if verbose:
+                nxt = f"trying {chain[i + 1][0]}…" if i + 1 < len(chain) else fallback_note
+                print(f"[{label}] {name} failed: {e}; {nxt}")
+    record("fallback")
+    return fallback()
+
+
+def _journaled(journal: Optional[Journal], name: str, call: Callable[[Provider], Awaitable[T]]) -> Callable[[Provider], Awaitable[T]]:
+    """Stage call that saves its result to the journal as soon as it completes."""
+    if journal is None:
+        return call
+
+    async def run(p: Provider) -> T:
+        result = await call(p)
+        journal.save(name, result)
+        return result
+
+    return run
+
+
+def _journaled_fallback(journal: Optional[Journal], stage: str, fallback: Callable[[], T]) -> Callable[[], T]:
+    """Stage fallback that marks the job unfinished, so --resume retries the stage."""
+    if journal is None:
+        return fallback
+
+    def run() -> T:
+        journal.note_fallback(stage)
+        return fallback()
+
+    return run
+
+
+def _resumed(journal: Optional[Journal], name: str, label: str, *, verbose: bool, run_stats: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Output of stage ``name`` saved by an earlier run of this job, if any."""
+    value = journal.load(name) if journal is not None else None
+    if not isinstance(value, dict):
+        return None
+    tracing.event("stage.resumed", stage=label, job=journal.job)
+    if verbose:
+        print(f"[{label}] resumed from journal {journal.job}")
+    if run_stats is not None:
+        run_stats.setdefault("stages", {})[label] = {"provider": "journal", "hedged": False, "elapsed": 0.0, "rate_wait": 0.0}
+    return value
+
+
+async def _per_slide_stage(
+    chain: ProviderChain,
+    pool: ProviderPool,
+    *,
+    run_stats: Optional[Dict[str, Any]],
+    **kwargs: Any,
+) -> Dict[str, Any]:
+    """draft_per_slide_async as a pipeline stage: traced, with its timing in run_stats["stages"]["drafter"]."""
+    started = time.perf_counter()
+    with tracing.span("stage", stage="drafter", provider="per-slide", fanout=kwargs.get("fanout"), window=kwargs.get("window")) as sp, collect_waits() as waits:
+        draft = await draft_per_slide_async(chain, pool, **kwargs)
+        sp.set(wait_seconds=round(sum(waits), 3))
+    if run_stats is not None:
+        run_stats.setdefault("stages", {})["drafter"] = {
+            "provider": "per-slide",
+            "hedged": False,
+            "elapsed": round(time.perf_counter() - started, 3),
+            "rate_wait": round(sum(waits), 3),
+        }
+    return draft
+
+
+async def _review_stage(
+    draft: Dict[str, Any],
+    *,
+    online: bool,
+    chain: ProviderChain,
+    pool: ProviderPool,
+    lang: str,
+    ctx: DataContext,
+    cache: Optional[ResponseCache],
+    hedge: Optional[HedgePolicy],
+    verbose: bool,
+    run_stats: Optional[Dict[str, Any]],
+    journal: Optional[Journal] = None,
+    llm_review: bool = False,
+) -> Tuple[Dict[str, Any], bool]:
+    """Reviewer stage; returns (refined draft, whether a model call was spent).
+
+    The rule-based reviewer always runs. Only with ``llm_review`` do the slides that still fail
+    their schema (with their layouts' schemas) go to the model and come back spliced in by index;
+    otherwise the final validation drops them. run_stats["review"] records what the rules fixed,
+    how many slides were sent and the call budget freed by not calling.
+    """
+    resumed = _resumed(journal, "review", "reviewer", verbose=verbose, run_stats=run_stats)
+    if resumed is not None:
+        return resumed, False
+    fixes: Fixes = {}
+    slides, issues = review_gate(draft, ctx=ctx, fixes=fixes)
+    called = bool(issues) and online and llm_review
+    freed = 1 if online and not called else 0
+    if run_stats is not None:
+        run_stats["review"] = {
+            "slides": len(slides),
+            "fixes": fixes,
+            "failing": len(issues),
+            "sent": len(issues) if called else 0,
+            "calls_freed": freed,
+        }
+    if not called:
+        tracing.event("review.skipped", slides=len(slides), failing=len(issues), calls_freed=freed, fixes=sum(fixes.values()))
+        if verbose:
+            if not issues:
+                reason = "draft passes local validation"
+            elif online:
+                reason = f"model review off, {len(issues)} failing slide(s) left to validation"
+            else:
+                reason = "budget/offline"
+            print(f"[reviewer] no call ({reason}): rule-based review of {len(slides)} slide(s), {sum(fixes.values())} fix(es)")
+        return {"slides": slides}, False
+    if verbose:
+        print(f"[reviewer] sending {len(issues)} of {len(slides)} slide(s) that fail their schema…")
+    with tracing.span("review.partial", slides=len(slides), sent=len(issues), fixes=sum(fixes.values())):
+        refined = await _run_stage(
+            "reviewer", chain, pool,
+            _journaled(journal, "review", lambda p: review_failing_async(p, slides=slides, issues=issues, lang=lang, ctx=ctx, cache=cache)),
+            _journaled_fallback(journal, "review", lambda: {"slides": slides}),
+            stage="review", fallback_note="keeping the locally fixed slides", verbose=verbose, hedge=hedge, run_stats=run_stats,
+        )
+    return refined, True
+
+
+def _reuse_plan(
+    topics: TopicIndex,
+    topic: str,
+    *,
+    lang: str,
+    max_slides: int,
+    ctx: DataContext,
+    threshold: float,
+    verbose: bool,
+    run_stats: Optional[Dict[str, Any]],
+) -> Optional[Dict[str, Any]]:
+    """Plan of the most similar past topic when it reaches ``threshold``; None means plan afresh.
+
+    A closer-than-nothing match below the threshold is only reported (verbose and run_stats).
+    """
+    with tracing.span("plan.lookup", entries=len(topics)) as sp:
+        match = topics.lookup(topic, lang=lang, max_slides=max_slides, allowed_layouts=ctx.allowed_layouts)
+        if match is None:
+            sp.set(outcome="miss")
+            return None
+        reuse = match.similarity >= threshold
+        sp.set(outcome="reused" if reuse else "offered", similarity=round(match.similarity, 3))
+    if run_stats is not None:
+        run_stats["plan_reuse"] = {"topic": match.topic, "similarity": round(match.similarity, 3), "reused": reuse}
+    if verbose:
+        if reuse:
+            print(f"[planner] reusing the plan of similar topic '{match.topic}' (similarity {match.similarity:.2f})")
+        else:
+            print(f"[planner] similar past topic '{match.topic}' (similarity {match.similarity:.2f} < {threshold:.2f}); planning afresh")
+    return copy.deepcopy(match.plan) if reuse else None
+
+
+def _few_shot(library: DeckLibrary, topic: str, plan: Dict[str, Any], *, k: int, verbose: bool) -> Optional[Examples]:
+    """Example slides from the deck library for the layouts the plan uses (None when there are none)."""
+    if k <= 0:
+        return None
+    layouts = _plan_layout_keys(plan)
+    with tracing.span("examples", layouts=len(layouts)) as sp:
+        examples = library.few_shot(topic, layouts, k=k)
+        sp.set(slides=sum(len(v) for v in examples.values()))
+    if verbose:
+        print(f"[drafter] {sum(len(v) for v in examples.values())} example slide(s) for {len(examples)} of {len(set(layouts))} layout(s) from the deck library")
+    return examples or None
+
+
+async def _update_slides(
+    existing: List[Dict[str, Any]],
+    intents: Optional[List[Optional[str]]],
+    *,
+    plan: Dict[str, Any],
+    topic: str,
+    lang: str,
+    ctx: DataContext,
+    cache: Optional[ResponseCache],
+    chains: StageChains,
+    pool: ProviderPool,
+    calls_left: int,
+    fanout: int,
+    draft_window: int,
+    draft_retries: int,
+    hedge: Optional[HedgePolicy],
+    verbose: bool,
+    emit: SlideCallback,
+    run_stats: Optional[Dict[str, Any]],
+    examples: Optional[Examples] = None,
+    journal: Optional[Journal] = None,
+    llm_review: bool = False,
+) -> List[Dict[str, Any]]:
+    """Drafter + reviewer for --update: reuse slides of ``existing`` that the new plan still contains
+    (src/update.match_outline), draft only the other outline items and review only those.
+
+    ``calls_left`` is the stage budget after planning (0 offline). Calls and estimated tokens
+    saved against a full regeneration are written to run_stats["update"].
+    """
+    outline = plan.get("outline", [])
+    matches = match_outline(outline, existing, intents)
+    todo = [i for i in range(len(outline)) if i not in matches]
+    # kept slides take the matched positions in their original deck order (as merge_in_order does)
+    for i, j in zip(sorted(matches), sorted(matches.values())):
+        emit(i, existing[j])
+    budget = calls_left
+    if verbose:
+        print(f"[update] reusing {len(matches)} of {len(outline)} slide(s); {len(todo)} to draft")
+
+    drafted: Dict[int, Dict[str, Any]] = {}
+    if todo and calls_left > 0:
+        calls_left -= 1
+        draft = await _per_slide_stage(
+            stage_chain(chains, "draft"), pool, topic=topic, plan=plan, lang=lang, ctx=ctx, cache=cache, fanout=fanout, window=draft_window,
+            retries=draft_retries, verbose=verbose, on_slide=emit, run_stats=run_stats, only=todo, examples=examples,
+            journal=journal,
+        )
+        drafted = dict(zip(todo, draft["slides"]))
+    elif todo:
+        stub = draft_stub(topic, plan={"outline": [outline[i] for i in todo]}, lang=lang, ctx=ctx)
+        drafted = dict(zip(todo, stub["slides"]))
+        for i, slide in drafted.items():
+            emit(i, slide)
+
+    reviewed = False
+    if drafted:
+        refined, reviewed = await _review_stage(
+            {"slides": list(drafted.values())}, online=calls_left > 0, chain=stage_chain(chains, "review"), pool=pool, lang=lang, ctx=ctx,
+            cache=cache, hedge=hedge, verbose=verbose, run_stats=run_stats, journal=journal, llm_review=llm_review,
+        )
+        calls_left -= reviewed
+        if len(refined.get("slides") or []) == len(drafted):
+            drafted = dict(zip(drafted, refined["slides"]))
+
+    slides = merge_in_order(len(outline), {i: (j, existing[j]) for i, j in matches.items()}, drafted)
+    if run_stats is not None:
+        # what a full regeneration would have spent after planning: one drafter call (and one reviewer
+        # call with llm_review) over the whole deck, prompts plus the slides coming back
+        full_calls = min(2 if llm_review else 1, budget)
+        full_tokens = 0
+        if budget > 0:
+            deck = {"slides": slides}
+            deck_tokens = estimate_tokens(json.dumps(deck, ensure_ascii=False))
+            full_tokens = prompt_tokens(_draft_prompt(topic=topic, plan=plan, lang=lang, ctx=ctx)) + deck_tokens
+            if full_calls > 1:
+                full_tokens += prompt_tokens(_review_prompt(draft=deck, lang=lang, ctx=ctx)) + deck_tokens
+        stats = _PROMPT_STATS.get() or {}
+        spent = sum(stats.get(stage, {}).get("prompt_tokens", 0) for stage in ("draft_slide", "review"))
+        if budget > 0 and drafted:
+            spent += estimate_tokens(json.dumps(list(drafted.values()), ensure_ascii=False)) * (2 if reviewed else 1)
+        run_stats["update"] = {
+            "outline": len(outline),
+            "reused": len(matches),
+            "drafted": len(drafted),
+            "calls_saved": full_calls - (budget - calls_left),
+            "tokens_saved": max(0, full_tokens - spent),
+        }
+    return slides
+
+
+async def multi_agent_generate_async(
     topic: str,
     *,
     max_slides: int,
@@ -498,82 +1313,244 @@ def multi_agent_generate(
     max_calls: int = 3,
     groq_api_key: Optional[str] = None,
     groq_model: str = "llama3-70b-8192",
+    cache: Optional[ResponseCache] = None,
+    providers: Optional[ProviderPool] = None,
+    draft_mode: str = "single",
+    fanout: int = 4,
+    draft_window: int = 1,
+    draft_retries: int = 1,
+    on_slide: Optional[SlideCallback] = None,
+    hedge: Optional[HedgePolicy] = None,
+    run_stats: Optional[Dict[str, Any]] = None,
+    existing: Optional[List[Dict[str, Any]]] = None,
+    existing_intents: Optional[List[Optional[str]]] = None,
+    topics: Optional[TopicIndex] = None,
+    reuse_threshold: float = 0.75,
+    library: Optional[DeckLibrary] = None,
+    examples_per_layout: int = 1,
+    journal: Optional[Journal] = None,
+    llm_review: bool = False,
+    chains: Optional[StageChains] = None,
+) -> Dict[str, Any]:
+    """Planner → Drafter → Reviewer → validation, each stage falling back along the provider chain.
+
+    ``chains`` (provider_chains()) sets the providers each stage tries, in order; without it every
+    stage tries Gemini, then Groq. ``hedge`` races a stage's first two providers instead of waiting
+    for the first to fail; the winning provider per stage is written to ``run_stats["stages"]``
+    when a dict is passed, and estimated prompt tokens per stage to ``run_stats["prompts"]`` (also
+    printed with ``verbose``).
+
+    With ``existing`` slides (an earlier version of the deck) the new plan is diffed against them:
+    matching slides are kept verbatim and only new or changed outline items are drafted and
+    reviewed; the savings go to ``run_stats["update"]``. The plan itself is kept in ``run_stats["plan"]``.
+
+    With a ``topics`` index, a past topic at least ``reuse_threshold`` similar to this one lends its
+    plan instead of a planner call (``run_stats["plan_reuse"]``); fresh model plans are added to it.
+    With a deck ``library``, the drafter's prompts carry up to ``examples_per_layout`` compact
+    example slides per planned layout, picked by BM25 relevance to the topic.
+    With a ``journal``, each stage's model output is saved as it completes and stages already in it
+    (from an interrupted or partly failed run of the same job) are not run again.
+    """
+    prompt_stats: Dict[str, Dict[str, int]] = {}
+    token = _PROMPT_STATS.set(prompt_stats)
+    try:
+        with tracing.span("generate", topic=topic[:120], max_slides=max_slides, max_calls=max_calls, draft_mode=draft_mode) as sp:
+            result = await _multi_agent_generate(
+                topic, max_slides=max_slides, lang=lang, api_key=api_key, model_name=model_name, ctx=ctx, verbose=verbose,
+                max_calls=max_calls, groq_api_key=groq_api_key, groq_model=groq_model, cache=cache, providers=providers,
+                draft_mode=draft_mode, fanout=fanout, draft_window=draft_window, draft_retries=draft_retries,
+                on_slide=on_slide, hedge=hedge, run_stats=run_stats, existing=existing, existing_intents=existing_intents,
+                topics=topics, reuse_threshold=reuse_threshold, library=library, examples_per_layout=examples_per_layout,
+                journal=journal, llm_review=llm_review, chains=chains,
+            )
+            sp.set(slides=len(result.get("slides") or []), prompts=prompt_stats)
+            return result
+    finally:
+        _PROMPT_STATS.reset(token)
+        if run_stats is not None:
+            run_stats["prompts"] = prompt_stats
+        if verbose and prompt_stats:
+            for stage, entry in prompt_stats.items():
+                print(f"[tokens] {stage}: {entry['prompt_tokens']} prompt tokens over {entry['calls']} call(s)")
+
+
+async def _multi_agent_generate(
+    topic: str,
+    *,
+    max_slides: int,
+    lang: str,
+    api_key: Optional[str],
+    model_name: str,
+    ctx: DataContext,
+    verbose: bool,
+    max_calls: int,
+    groq_api_key: Optional[str],
+    groq_model: str,
+    cache: Optional[ResponseCache],
+    providers: Optional[ProviderPool],
+    draft_mode: str,
+    fanout: int,
+    draft_window: int,
+    draft_retries: int,
+    on_slide: Optional[SlideCallback],
+    hedge: Optional[HedgePolicy],
+    run_stats: Optional[Dict[str, Any]],
+    existing: Optional[List[Dict[str, Any]]] = None,
+    existing_intents: Optional[List[Optional[str]]] = None,
+    topics: Optional[TopicIndex] = None,
+    reuse_threshold: float = 0.75,
+    library: Optional[DeckLibrary] = None,
+    examples_per_layout: int = 1,
+    journal: Optional[Journal] = None,
+    llm_review: bool = False,
+    chains: Optional[StageChains] = None,
 ) -> Dict[str, Any]:
+    pool = providers or default_pool()
+    if chains is None:
+        chains = {"default": [("gemini", api_key, model_name), ("groq", groq_api_key, groq_model)]}
+    plan_chain, draft_chain, fused_chain = (stage_chain(chains, stage) for stage in ("plan", "draft", "fused"))
+    online = any(key for chain in chains.values() for _, key, _ in chain)
     calls_left = max(0, int(max_calls))
 
     def can_call() -> bool:
-        return bool(api_key) and calls_left > 0
+        return online and calls_left > 0
+
+    compiled = compile_templates(ctx.templates)
+    allowed_set = set(ctx.allowed_layouts)
+
+    def emit(index: int, slide: Dict[str, Any]) -> None:
+        # only hand out drafted slides that already satisfy their layout's required fields
+        if on_slide is None or not isinstance(slide, dict):
+            return
+        lk, fields = slide.get("layout_key"), slide.get("fields")
+        if lk not in allowed_set or not isinstance(fields, dict):
+            return
+        layout = compiled.get(lk)
+        if layout is not None:
+            fields = layout.fix(fields)
+            if not layout.is_valid(fields):
+                return
+        on_slide(index, {"layout_key": lk, "fields": fields})
+
+    async def plan_and_index(p: Provider) -> Dict[str, Any]:
+        result = await plan_async(p, topic=topic, max_slides=max_slides, lang=lang, ctx=ctx, cache=cache)
+        if topics is not None and not result.get("truncated"):
+            topics.add(topic, lang=lang, max_slides=max_slides, plan=result)
+        return result
+
+    async def fused_and_index(p: Provider, examples: Optional[Examples]) -> Dict[str, Any]:
+        deck = await fused_async(p, topic=topic, max_slides=max_slides, lang=lang, ctx=ctx, cache=cache, examples=examples)
+        plan = fused_plan(deck)
+        if topics is not None and not deck.get("truncated"):
+            topics.add(topic, lang=lang, max_slides=max_slides, plan=plan)
+        if journal is not None:
+            journal.save("plan", plan)
+            journal.save("draft", {"slides": deck["slides"]})
+        return deck
 
     # 1) Planner (consume 1 call if online and budget allows)
-    if can_call() and calls_left >= 2:
+    resumed = _resumed(journal, "plan", "planner", verbose=verbose, run_stats=run_stats)
+    reused = fused = None
+    if resumed is None and topics is not None:
+        reused = _reuse_plan(topics, topic, lang=lang, max_slides=max_slides, ctx=ctx, threshold=reuse_threshold, verbose=verbose, run_stats=run_stats)
+    if resumed is not None:
+        # Planned by an earlier run of this job (--resume)
+        plan = resumed
+    elif reused is not None:
+        # A near-duplicate topic was planned before: its call goes to the later stages
+        plan = reused
+        if journal is not None:
+            journal.save("plan", plan)
+    elif draft_mode == "fused" and existing is None and can_call():
+        # One schema-constrained call plans and drafts the deck; if it fails, the remaining
+        # budget goes to the drafter over a stub outline
+        calls_left -= 1
+        if verbose:
+            print("[fused] planning and drafting in one call…")
+        every_layout = {"outline": [{"layout_key": lk} for lk in ctx.allowed_layouts]}
+        fused_examples = _few_shot(library, topic, every_layout, k=examples_per_layout, verbose=verbose) if library is not None else None
+        fused = await _run_stage(
+            "fused", fused_chain, pool,
+            lambda p: fused_and_index(p, fused_examples),
+            lambda: None,
+            stage="fused", fallback_note="drafting a stub outline", verbose=verbose, hedge=hedge, run_stats=run_stats,
+        )
+        plan = fused_plan(fused) if fused is not None else plan_stub(topic, max_slides=max_slides, lang=lang, ctx=ctx)
+    elif can_call() and calls_left >= 2:
         # Full pipeline path with enough budget
         calls_left -= 1
-        try:
-            if verbose:
-                print("[planner] planning outline…")
-            plan = plan_with_gemini(api_key, model_name, topic=topic, max_slides=max_slides, lang=lang, ctx=ctx)
-        except Exception as e:
-            if verbose:
-                print(f"[planner] gemini failed: {e}; trying groq…")
-            try:
-                if not groq_api_key:
-                    raise RuntimeError("missing GROQ_API_KEY")
-                plan = plan_with_groq(groq_api_key, groq_model, topic=topic, max_slides=max_slides, lang=lang, ctx=ctx)
-            except Exception as e2:
-                if verbose:
-                    print(f"[planner] groq failed: {e2}; using stub")
-                plan = plan_stub(topic, max_slides=max_slides, lang=lang, ctx=ctx)
+        if verbose:
+            print("[planner] planning outline…")
+        plan = await _run_stage(
+            "planner", plan_chain, pool,
+            _journaled(journal, "plan", plan_and_index),
+            _journaled_fallback(journal, "plan", lambda: plan_stub(topic, max_slides=max_slides, lang=lang, ctx=ctx)),
+            stage="plan", fallback_note="using stub", verbose=verbose, hedge=hedge, run_stats=run_stats,
+        )
     else:
         # No budget for separate planning → use local stub outline
         if verbose:
             print("[planner] skipped (budget/offline): using stub")
         plan = plan_stub(topic, max_slides=max_slides, lang=lang, ctx=ctx)
+    if run_stats is not None:
+        run_stats["plan"] = plan
+    examples = _few_shot(library, topic, plan, k=examples_per_layout, verbose=verbose) if library is not None and can_call() and fused is None else None
 
-    # 2) Drafter
-    if can_call():
-        calls_left -= 1
-        try:
+    if existing is not None:
+        # Update mode: draft and review only what the new plan adds or changes
+        refined = {"slides": await _update_slides(
+            existing, existing_intents, plan=plan, topic=topic, lang=lang, ctx=ctx, cache=cache, chains=chains, pool=pool,
+            calls_left=calls_left if can_call() else 0, fanout=fanout, draft_window=draft_window, draft_retries=draft_retries,
+            hedge=hedge, verbose=verbose, emit=emit, run_stats=run_stats, examples=examples, journal=journal,
+            llm_review=llm_review,
+        )}
+    else:
+        # 2) Drafter
+        if fused is not None:
+            draft = {"slides": fused["slides"]}
+        else:
+            draft = _resumed(journal, "draft", "drafter", verbose=verbose, run_stats=run_stats)
+        if draft is not None:
+            for i, slide in enumerate(draft.get("slides") or []):
+                emit(i, slide)
+        elif can_call():
+            calls_left -= 1
             if verbose:
                 print("[drafter] drafting slides…")
-            draft = draft_with_gemini(api_key, model_name, topic=topic, plan=plan, lang=lang, ctx=ctx)
-        except Exception as e:
+            if draft_mode == "per-slide":
+                draft = await _per_slide_stage(
+                    draft_chain, pool, topic=topic, plan=plan, lang=lang, ctx=ctx, cache=cache,
+                    fanout=fanout, window=draft_window, retries=draft_retries, verbose=verbose,
+                    on_slide=emit, run_stats=run_stats, examples=examples, journal=journal,
+                )
+            elif on_slide is not None:
+                draft = await _run_stage(
+                    "drafter", draft_chain, pool,
+                    _journaled(journal, "draft", lambda p: draft_stream_async(p, topic=topic, plan=plan, lang=lang, ctx=ctx, cache=cache, on_slide=emit, examples=examples)),
+                    _journaled_fallback(journal, "draft", lambda: draft_stub(topic, plan=plan, lang=lang, ctx=ctx)),
+                    # racing two streams would interleave their slides in the partial output
+                    stage="draft", fallback_note="using stub", verbose=verbose, hedge=None, run_stats=run_stats,
+                )
+            else:
+                draft = await _run_stage(
+                    "drafter", draft_chain, pool,
+                    _journaled(journal, "draft", lambda p: draft_async(p, topic=topic, plan=plan, lang=lang, ctx=ctx, cache=cache, examples=examples)),
+                    _journaled_fallback(journal, "draft", lambda: draft_stub(topic, plan=plan, lang=lang, ctx=ctx)),
+                    stage="draft", fallback_note="using stub", verbose=verbose, hedge=hedge, run_stats=run_stats,
+                )
+        else:
             if verbose:
-                print(f"[drafter] gemini failed: {e}; trying groq…")
-            try:
-                if not groq_api_key:
-                    raise RuntimeError("missing GROQ_API_KEY")
-                draft = draft_with_groq(groq_api_key, groq_model, topic=topic, plan=plan, lang=lang, ctx=ctx)
-            except Exception as e2:
-                if verbose:
-                    print(f"[drafter] groq failed: {e2}; using stub")
-                draft = draft_stub(topic, plan=plan, lang=lang, ctx=ctx)
-    else:
-        if verbose:
-            print("[drafter] offline/no budget: using stub")
-        draft = draft_stub(topic, plan=plan, lang=lang, ctx=ctx)
+                print("[drafter] offline/no budget: using stub")
+            draft = draft_stub(topic, plan=plan, lang=lang, ctx=ctx)
+            for i, slide in enumerate(draft["slides"]):
+                emit(i, slide)
 
-    # 3) Reviewer
-    if can_call() and calls_left >= 1:
-        calls_left -= 1
-        try:
-            if verbose:
-                print("[reviewer] refining slides…")
-            refined = review_and_refine_with_gemini(api_key, model_name, topic=topic, draft=draft, lang=lang, ctx=ctx)
-        except Exception as e:
-            if verbose:
-                print(f"[reviewer] gemini failed: {e}; trying groq…")
-            try:
-                if not groq_api_key:
-                    raise RuntimeError("missing GROQ_API_KEY")
-                refined = review_and_refine_with_groq(groq_api_key, groq_model, topic=topic, draft=draft, lang=lang, ctx=ctx)
-            except Exception as e2:
-                if verbose:
-                    print(f"[reviewer] groq failed: {e2}; using heuristic review")
-                refined = review_stub(draft, ctx=ctx)
-    else:
-        if verbose:
-            print("[reviewer] skipped (budget/offline): heuristic review")
-        refined = review_stub(draft, ctx=ctx)
+        # 3) Reviewer (validation-gated: only slides that fail their schema are sent)
+        refined, called = await _review_stage(
+            draft, online=can_call(), chain=stage_chain(chains, "review"), pool=pool, lang=lang, ctx=ctx, cache=cache,
+            hedge=hedge, verbose=verbose, run_stats=run_stats, journal=journal, llm_review=llm_review,
+        )
+        calls_left -= called
 
     # Final validation (Pydantic + templates requirements)
     allowed = set(ctx.allowed_layouts)
@@ -586,5 +1563,77 @@ def multi_agent_generate(
         if len(errs) > 10:
             print(f" - ... and {len(errs)-10} more")
     if not valid:
+        if journal is not None:
+            journal.note_fallback("validate")
         valid = stub_generate(topic, max_slides=max_slides, lang=lang, ctx=ctx)["slides"]
+    if journal is not None:
+        finished = journal.close()
+        if run_stats is not None:
+            run_stats["job"] = {"id": journal.job, "finished": finished, "fallbacks": list(journal.fallbacks)}
     return {"slides": valid}
+
+
+def multi_agent_generate(
+    topic: str,
+    *,
+    max_slides: int,
+    lang: str,
+    api_key: Optional[str],
+    model_name: str,
+    ctx: DataContext,
+    verbose: bool = False,
+    max_calls: int = 3,
+    groq_api_key: Optional[str] = None,
+    groq_model: str = "llama3-70b-8192",
+    cache: Optional[ResponseCache] = None,
+    providers: Optional[ProviderPool] = None,
+    draft_mode: str = "single",
+    fanout: int = 4,
+    draft_window: int = 1,
+    draft_retries: int = 1,
+    on_slide: Optional[SlideCallback] = None,
+    hedge: Optional[HedgePolicy] = None,
+    run_stats: Optional[Dict[str, Any]] = None,
+    existing: Optional[List[Dict[str, Any]]] = None,
+    existing_intents: Optional[List[Optional[str]]] = None,
+    topics: Optional[TopicIndex] = None,
+    reuse_threshold: float = 0.75,
+    library: Optional[DeckLibrary] = None,
+    examples_per_layout: int = 1,
+    journal: Optional[Journal] = None,
+    llm_review: bool = False,
+    chains: Optional[StageChains] = None,
+) -> Dict[str, Any]:
+    """Blocking multi_agent_generate_async(), taking the same options."""
+    return run_sync(
+        multi_agent_generate_async(
+            topic,
+            max_slides=max_slides,
+            lang=lang,
+            api_key=api_key,
+            model_name=model_name,
+            ctx=ctx,
+            verbose=verbose,
+            max_calls=max_calls,
+            groq_api_key=groq_api_key,
+            groq_model=groq_model,
+            cache=cache,
+            providers=providers,
+            draft_mode=draft_mode,
+            fanout=fanout,
+            draft_window=draft_window,
+            draft_retries=draft_retries,
+            on_slide=on_slide,
+            hedge=hedge,
+            run_stats=run_stats,
+            existing=existing,
+            existing_intents=existing_intents,
+            topics=topics,
+            reuse_threshold=reuse_threshold,
+            library=library,
+            examples_per_layout=examples_per_layout,
+            journal=journal,
+            llm_review=llm_review,
+            chains=chains,
+        )
+    )
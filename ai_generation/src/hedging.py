@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Tuple, TypeVar
+
+from .providers import Provider
+
+T = TypeVar("T")
+
+
+@dataclass
+class HedgePolicy:
+    """When to fire a stage at the secondary provider while the primary is still running.
+
+    The delay is the ``percentile`` of the primary's recent latencies for that stage, clamped to
+    [min_delay, max_delay]; until ``min_samples`` calls have been observed ``default_delay`` is used.
+    """
+
+    percentile: float = 0.9
+    min_delay: float = 2.0
+    max_delay: float = 30.0
+    default_delay: float = 10.0
+    min_samples: int = 5
+
+    def delay(self, provider: Provider, stage: str) -> float:
+        samples = provider.latencies.get(stage)
+        if not samples or len(samples) < self.min_samples:
+            return self.default_delay
+        ordered = sorted(samples)
+        idx = min(len(ordered) - 1, max(0, int(round(self.percentile * (len(ordered) - 1)))))
+        return max(self.min_delay, min(self.max_delay, ordered[idx]))
+
+
+async def race_with_hedge(
+    primary: Provider,
+    secondary: Provider,
+    call: Callable[[Provider], Awaitable[T]],
+    *,
+    stage: str,
+    policy: HedgePolicy,
+) -> Tuple[Provider, T, bool]:
+    """Run call(primary); if it is still pending after the hedge delay (or failed), also run call(secondary).
+
+    Returns (winner, result, hedged). The first successful result wins and the other task is
+    cancelled. Raises RuntimeError listing both errors if neither succeeds.
+    """
+    loop = asyncio.get_running_loop()
+    hedge_at = loop.time() + policy.delay(primary, stage)
+    pending: Dict["asyncio.Future[Any]", Provider] = {asyncio.ensure_future(call(primary)): primary}
+    secondary_started = False
+    hedged = False
+    errors: List[str] = []
+    try:
+        while pending:
+            timeout = None if secondary_started else max(0.0, hedge_at - loop.time())
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                provider = pending.pop(task)
+                exc = task.exception()
+                if exc is None:
+                    return provider, task.result(), hedged
+                errors.append(f"{provider.name}: {exc}")
+            if not secondary_started and (not pending or loop.time() >= hedge_at):
+                hedged = bool(pending)
+                pending[asyncio.ensure_future(call(secondary))] = secondary
+                secondary_started = True
+    finally:
+        for task in pending:
+            task.cancel()
+    raise RuntimeError("; ".join(errors))
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import secrets
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Pipeline order: saving a stage discards the saved output of every later one, since it was
+# produced from input that no longer applies. Per-window drafter pieces ("draft_slide-0-2") count as draft.
+STAGES = ("plan", "draft", "review")
+_UNSAFE = re.compile(r"[^\w-]+", re.UNICODE)
+
+
+def _stage_of(name: str) -> str:
+    return "draft" if name.startswith("draft") else name
+
+
+def new_job_id(topic: str) -> str:
+    slug = _UNSAFE.sub("-", topic.casefold()).strip("-")[:40] or "deck"
+    return f"{slug}-{time.strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(3)}"
+
+
+def _write_json(path: Path, value: Any) -> None:
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class Journal:
+    """Completed stage outputs of one generation job, one JSON file each in ``<root>/<job>/``.
+
+    Files are written atomically (temp file + rename), so a killed process leaves either the
+    previous state or the new one. Every job has its own directory, which is what makes the
+    journal safe for concurrent batch workers; a single job is meant to run in one process at a time.
+    Stages that ended in a local fallback are noted; close() keeps the journal of such a job
+    (so ``--resume`` retries just them) and removes the journal of a job that completed.
+    """
+
+    def __init__(self, directory: Path) -> None:
+        self.dir = Path(directory)
+        self.fallbacks: List[str] = []
+        self._lock = threading.Lock()
+
+    @property
+    def job(self) -> str:
+        return self.dir.name
+
+    @classmethod
+    def create(cls, root: Path, *, topic: str, job: Optional[str] = None, **meta: Any) -> "Journal":
+        """New job directory; ``meta`` (lang, max_slides, out, ...) is what a resumed run needs to repeat the call."""
+        directory = Path(root) / (job or new_job_id(topic))
+        directory.mkdir(parents=True, exist_ok=False)
+        journal = cls(directory)
+        _write_json(directory / "meta.json", {"topic": topic, **meta, "created": round(time.time(), 3)})
+        return journal
+
+    @classmethod
+    def open(cls, root: Path, job: str) -> "Journal":
+        journal = cls(Path(root) / job)
+        if not (journal.dir / "meta.json").exists():
+            raise FileNotFoundError(f"no journal for job '{job}' in {root} (finished jobs are removed)")
+        return journal
+
+    @classmethod
+    def latest(cls, root: Path, *, out: str) -> Optional["Journal"]:
+        """The most recent unfinished job that writes ``out`` (batch --resume)."""
+        best: Optional[Journal] = None
+        best_created = -1.0
+        for meta_path in Path(root).glob("*/meta.json"):
+            try:
+                meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            if meta.get("out") == out and float(meta.get("created") or 0) > best_created:
+                best, best_created = cls(meta_path.parent), float(meta.get("created") or 0)
+        return best
+
+    @property
+    def meta(self) -> Dict[str, Any]:
+        return json.loads((self.dir / "meta.json").read_text(encoding="utf-8"))
+
+    def load(self, name: str) -> Optional[Any]:
+        try:
+            return json.loads((self.dir / f"{name}.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def save(self, name: str, value: Any) -> None:
+        later = STAGES[STAGES.index(_stage_of(name)) + 1:]
+        with self._lock:
+            for path in self.dir.glob("*.json"):
+                if _stage_of(path.stem) in later:
+                    path.unlink(missing_ok=True)
+            _write_json(self.dir / f"{name}.json", value)
+
+    def note_fallback(self, stage: str) -> None:
+        with self._lock:
+            if stage not in self.fallbacks:
+                self.fallbacks.append(stage)
+                # pipeline order (anything after review, such as final validation, last)
+                self.fallbacks.sort(key=lambda st: STAGES.index(st) if st in STAGES else len(STAGES))
+
+    def close(self) -> bool:
+        """Remove the journal when every stage completed; returns whether the job is finished."""
+        with self._lock:
+            if self.fallbacks:
+                meta = self.meta
+                meta["fallbacks"] = list(self.fallbacks)
+                _write_json(self.dir / "meta.json", meta)
+                return False
+            shutil.rmtree(self.dir, ignore_errors=True)
+            return True
@@ -0,0 +1,402 @@
+from __future__ import annotations
+
+import json
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+_STRUCTURAL = re.compile(r'["{}\[\],]')
+_STRING_END = re.compile(r'["\\]')
+_TOKEN = re.compile(r'["{}\[\],:]')
+_FENCE = re.compile(r"```[A-Za-z]*[ \t]*\r?\n")
+_VALUE_START = re.compile(r"[{\[]")
+_NON_SPACE = re.compile(r"\S")
+# what may follow the opening bracket of a JSON value, as opposed to one in prose ("Here is [the] deck")
+_OPENS = {"[": "{]", "{": '"}'}
+# a string cut inside an escape: a lone backslash, or \u with fewer than four hex digits
+_PARTIAL_ESCAPE = re.compile(r"(?<!\\)(?:\\\\)*\\(?:u[0-9A-Fa-f]{0,3})?$")
+_LENIENT = json.JSONDecoder(strict=False)
+
+
+class SlideStreamParser:
+    """Incremental parser that yields each element of the slides array as soon as it is complete.
+
+    Accepts either a top-level array (``[{...}, ...]``) or an object whose ``array_key`` member
+    is the array (``{"slides": [{...}, ...]}``). Text outside the JSON value (fences, prose) is
+    ignored: a bracket only opens the value when an object, key or the closing bracket follows it,
+    so brackets and quotes in prose before a fenced block are skipped. The text is scanned once,
+    jumping between structural characters with a regex, and consumed text is dropped, so cost is
+    linear in the response size and memory is bounded by the largest single element.
+    """
+
+    def __init__(self, array_key: str = "slides", loads: Callable[[str], Any] = json.loads) -> None:
+        self.array_key = array_key
+        self._loads = loads
+        self._buf = ""
+        self._pos = 0            # next unscanned index in _buf
+        self._offset = 0         # chars discarded from the front of _buf
+        self._stack: List[str] = []
+        self._in_string = False
+        self._string_start = -1
+        self._last_key: Optional[str] = None
+        self._array_depth: Optional[int] = None  # stack depth inside the target array
+        self._elem_start = -1
+        self._item_from = -1     # start of a possible scalar element, after '[' or ','
+        self.count = 0
+        self.done = False
+
+    def feed(self, chunk: str) -> List[Any]:
+        """Consume a chunk of text; return the object/array elements completed by it, in order."""
+        return [value for _, value, error in self.feed_positions(chunk) if error is None and isinstance(value, (dict, list))]
+
+    @property
+    def started(self) -> bool:
+        """True once the opening bracket of the target array has been seen."""
+        return self._array_depth is not None
+
+    def feed_positions(self, chunk: str) -> List[Tuple[int, Any, Optional[str]]]:
+        """Like feed(), but return (offset, element, error) for every element, including unparsable ones.
+
+        ``offset`` counts characters from the start of all fed text; ``error`` is the JSON error
+        message when the element text is not valid JSON (``element`` is None then).
+        """
+        if self.done or not chunk:
+            return []
+        self._buf += chunk
+        out: List[Tuple[int, Any, Optional[str]]] = []
+        buf = self._buf
+        i = self._pos
+        n = len(buf)
+        while i < n:
+            if self._in_string:
+                m = _STRING_END.search(buf, i)
+                if m is None:
+                    i = n
+                    break
+                j = m.start()
+                if buf[j] == "\\":
+                    if j + 1 >= n:
+                        # escape split across chunks: rescan it with the next chunk
+                        i = j
+                        break
+                    i = j + 2
+                    continue
+                self._in_string = False
+                if len(self._stack) == 1 and self._stack[0] == "{" and self._string_start >= 0:
+                    try:
+                        self._last_key = json.loads(buf[self._string_start:j + 1])
+                    except ValueError:
+                        self._last_key = None
+                i = j + 1
+                continue
+            m = _STRUCTURAL.search(buf, i)
+            if m is None:
+                i = n
+                break
+            i = m.start()
+            ch = buf[i]
+            at_items = self._array_depth is not None and len(self._stack) == self._array_depth
+            if not self._stack:
+                # outside any value: only a bracket that starts the JSON matters
+                if ch in _OPENS:
+                    nxt = _NON_SPACE.search(buf, i + 1)
+                    if nxt is None:
+                        break  # decide once the next chunk shows what follows the bracket
+                    if nxt.group() not in _OPENS[ch]:
+                        i += 1
+                        continue
+                else:
+                    i += 1
+                    continue
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch == ",":
+                if at_items:
+                    self._flush_scalar(buf, i, out)
+                    self._item_from = i + 1
+            elif ch in "{[":
+                if not self._stack and ch == "[":
+                    # top-level array is the slides array itself
+                    self._stack.append(ch)
+                    self._array_depth = 1
+                    self._item_from = i + 1
+                elif ch == "[" and self._array_depth is None and self._stack == ["{"] and self._last_key == self.array_key:
+                    self._stack.append(ch)
+                    self._array_depth = 2
+                    self._item_from = i + 1
+                else:
+                    if at_items:
+                        self._elem_start = i
+                        self._item_from = -1
+                    self._stack.append(ch)
+            else:  # } or ]
+                if at_items:
+                    # the target array closed; nothing more to emit
+                    self._flush_scalar(buf, i, out)
+                    self._stack.pop()
+                    self.done = True
+                    i += 1
+                    break
+                if self._stack:
+                    self._stack.pop()
+                if self._array_depth is not None and len(self._stack) == self._array_depth and self._elem_start >= 0:
+                    self._emit(buf, self._elem_start, i + 1, out)
+                    self._elem_start = -1
+            i += 1
+        # drop consumed text, keeping only the element currently being built
+        keep_from = i
+        for start in (self._elem_start, self._string_start if self._in_string else -1, self._item_from):
+            if 0 <= start < keep_from:
+                keep_from = start
+        if keep_from > 0:
+            self._buf = buf[keep_from:]
+            self._offset += keep_from
+            if self._elem_start >= 0:
+                self._elem_start -= keep_from
+            if self._string_start >= 0:
+                self._string_start -= keep_from
+            if self._item_from >= 0:
+                self._item_from -= keep_from
+            i -= keep_from
+        self._pos = i
+        return out
+
+    def _emit(self, buf: str, start: int, end: int, out: List[Tuple[int, Any, Optional[str]]]) -> None:
+        offset = self._offset + start
+        try:
+            out.append((offset, self._loads(buf[start:end]), None))
+            self.count += 1
+        except ValueError as e:
+            out.append((offset, None, str(e)))
+
+    def _flush_scalar(self, buf: str, end: int, out: List[Tuple[int, Any, Optional[str]]]) -> None:
+        # a non-container element (string, number, literal) between two separators
+        if self._item_from < 0:
+            return
+        segment = buf[self._item_from:end]
+        stripped = segment.lstrip()
+        if stripped.strip():
+            start = self._item_from + len(segment) - len(stripped)
+            self._emit(buf, start, start + len(stripped.rstrip()), out)
+        self._item_from = -1
+
+
+@dataclass
+class Salvaged:
+    """Result of salvage_json(): the value, and where the text was cut off if it was."""
+
+    value: Any
+    truncated: bool = False
+    # keys/indexes from the root to the element the text ended inside (only when truncated)
+    partial: Tuple[Any, ...] = ()
+
+    def items(self, *path: Any) -> Optional[List[Any]]:
+        """The list at ``path`` (keys from the root) without the element the cut went through.
+
+        None when there is no list there. Elements before the cut are complete as the model wrote them.
+        """
+        value = self.value
+        for key in path:
+            value = value.get(key) if isinstance(value, dict) else None
+        if not isinstance(value, list):
+            return None
+        depth = len(path)
+        if self.truncated and len(self.partial) > depth and self.partial[:depth] == tuple(path):
+            return value[: self.partial[depth]]
+        return value
+
+
+def salvage_json(text: str) -> Salvaged:
+    """Parse the first JSON object or array in a model response, repairing what can be repaired.
+
+    Code fences and prose around the value are skipped, trailing commas dropped and raw control
+    characters inside strings accepted. When the text ends before the value does (a response cut
+    at the output token limit), the trailing partial element - a half key, a dangling scalar, an
+    open string key - is dropped, a cut string value is closed, and every open array and object
+    is closed; ``truncated`` is set and ``partial`` says where the cut was (see Salvaged.items).
+
+    One left-to-right scan jumping between structural characters with a regex, so the cost is
+    linear in the response size. Raises ValueError when there is no object or array to salvage.
+    """
+    m = _VALUE_START.search(text)
+    if m is None:
+        raise ValueError("no JSON object or array in response")
+    fence = _FENCE.search(text)
+    inside = _VALUE_START.search(text, fence.end()) if fence is not None else None
+    if inside is not None and inside.start() != m.start():
+        # prose before an opening fence may hold brackets of its own; the first fence may also
+        # be the closing one, with the value before it
+        try:
+            return _salvage_from(text, inside.start())
+        except ValueError:
+            pass
+    return _salvage_from(text, m.start())
+
+
+def _salvage_from(text: str, start: int) -> Salvaged:
+    try:
+        # well-formed value (whatever follows it): the C decoder alone
+        return Salvaged(_LENIENT.raw_decode(text, start)[0])
+    except ValueError:
+        pass
+    n = len(text)
+    # frame: [closer, safe, count, key, want_key, comma]; ``safe`` is where the frame's text can be
+    # cut with only complete members before it, ``count`` its complete members so far
+    stack: List[List[Any]] = []
+    drop: List[int] = []        # trailing commas (",]" / ",}") to leave out
+    scalar_from = -1            # where a number/literal may start (after '[', ',' or ':')
+    open_string = -1
+    end = -1
+    i = start
+    while i < n:
+        m = _TOKEN.search(text, i)
+        if m is None:
+            break
+        j = m.start()
+        ch = text[j]
+        if ch == '"':
+            k = j + 1
+            while True:
+                e = _STRING_END.search(text, k)
+                if e is None or e.start() + 1 >= n and text[e.start()] == "\\":
+                    k = -1
+                    break
+                if text[e.start()] == "\\":
+                    k = e.start() + 2
+                    continue
+                k = e.start()
+                break
+            if k < 0:
+                open_string = j
+                break
+            frame = stack[-1]
+            frame[5] = None
+            if frame[4]:
+                raw = text[j + 1:k]
+                frame[3] = json.loads(text[j:k + 1], strict=False) if "\\" in raw else raw
+                frame[4] = False
+            else:
+                frame[1] = k + 1
+                frame[2] += 1
+            scalar_from = -1
+            i = k + 1
+            continue
+        if ch in "{[":
+            if stack:
+                stack[-1][5] = None
+            stack.append(["}" if ch == "{" else "]", j + 1, 0, None, ch == "{", None])
+            scalar_from = j + 1 if ch == "[" else -1
+        elif ch in "}]":
+            frame = stack.pop()
+            if scalar_from >= 0 and text[scalar_from:j].strip():
+                frame[2] += 1
+            elif frame[5] is not None:
+                drop.append(frame[5])
+            scalar_from = -1
+            if not stack:
+                end = j + 1
+                break
+            stack[-1][1] = j + 1
+            stack[-1][2] += 1
+        elif ch == ",":
+            frame = stack[-1]
+            if scalar_from >= 0 and text[scalar_from:j].strip():
+                frame[1] = j
+                frame[2] += 1
+            frame[5] = j
+            frame[4] = frame[0] == "}"
+            scalar_from = j + 1 if frame[0] == "]" else -1
+        else:  # ':'
+            scalar_from = j + 1
+        i = j + 1
+
+    truncated = end < 0
+    tail = ""
+    partial: Tuple[Any, ...] = ()
+    if truncated:
+        top = stack[-1]
+        if open_string >= 0 and not top[4]:
+            # a string value cut off: keep what arrived of it
+            escape = _PARTIAL_ESCAPE.search(text, open_string + 1)
+            cut = escape.start() if escape is not None else n
+            tail = '"'
+            busy = True
+        else:
+            cut = top[1]
+            # anything but separators after the last complete member is a member cut off
+            busy = bool(text[cut:].strip().lstrip(",").strip())
+        tail += "".join(frame[0] for frame in reversed(stack))
+        path = [frame[2] if frame[0] == "]" else frame[3] for frame in stack]
+        partial = tuple(path if busy else path[:-1])
+        end = cut
+    body = text[start:end]
+    if drop:
+        pieces, at = [], start
+        for pos in drop:
+            if pos < end:
+                pieces.append(text[at:pos])
+                at = pos + 1
+        body = "".join(pieces) + text[at:end]
+    return Salvaged(_LENIENT.decode(body + tail), truncated, partial)
+
+
+def _loads_latin1(text: str) -> Any:
+    # text holds raw UTF-8 bytes decoded one byte per char (see iter_slide_file)
+    return json.loads(text.encode("latin-1"))
+
+
+def iter_slide_file(path, *, chunk_size: int = 1 << 16, array_key: str = "slides") -> Iterator[Tuple[int, int, Any, Optional[str]]]:
+    """Yield (index, byte_offset, slide, error) for each slide of a deck file, reading it in chunks.
+
+    ``.jsonl`` files hold one slide per line; anything else is a JSON deck (a top-level array or
+    ``{"slides": [...]}``) parsed element by element. Memory is bounded by the largest slide, not
+    the deck. ``error`` is set (and ``slide`` is None) for a slide that is not valid JSON; a
+    missing or unterminated slides array is reported as a final item with index -1.
+    """
+    path = Path(path)
+    if path.suffix.lower() == ".jsonl":
+        yield from _iter_jsonl(path)
+        return
+    # Decoding bytes as latin-1 keeps one char per byte, so parser offsets are byte offsets;
+    # JSON structure characters are ASCII and never occur inside UTF-8 multibyte sequences.
+    parser = SlideStreamParser(array_key=array_key, loads=_loads_latin1)
+    index = 0
+    base = 0
+    with open(path, "rb") as f:
+        head = f.read(3)
+        if head != b"\xef\xbb\xbf":
+            f.seek(0)
+        else:
+            base = 3
+        while not parser.done:
+            block = f.read(chunk_size)
+            if not block:
+                break
+            for offset, value, error in parser.feed_positions(block.decode("latin-1")):
+                yield index, base + offset, value, error
+                index += 1
+    if not parser.started:
+        yield -1, base, None, "no slides array found (expected [...] or {\"slides\": [...]})"
+    elif not parser.done:
+        yield -1, base + parser._offset + len(parser._buf), None, "unexpected end of file inside the slides array"
+
+
+def _iter_jsonl(path: Path) -> Iterator[Tuple[int, int, Any, Optional[str]]]:
+    index = 0
+    offset = 0
+    with open(path, "rb") as f:
+        for line in f:
+            start = offset
+            offset += len(line)
+            if index == 0 and start == 0 and line.startswith(b"\xef\xbb\xbf"):
+                line = line[3:]
+                start = 3
+            if not line.strip():
+                continue
+            try:
+                yield index, start, json.loads(line), None
+            except ValueError as e:
+                yield index, start, None, str(e)
+            index += 1
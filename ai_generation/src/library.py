@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import json
+import re
+import sqlite3
+import threading
+import unicodedata
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+STEM = 5  # prefix length; folds most Ukrainian/English inflections ("освіта", "освіті", "освітою")
+
+# BM25 column weights, in the order the columns are declared below
+_WEIGHTS = (0.0, 0.0, 0.0, 2.0, 1.0, 0.5, 0.0)
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS slides USING fts5(
+    path UNINDEXED, idx UNINDEXED, layout_key UNINDEXED, title, body, layout, slide UNINDEXED
+);
+"""
+
+
+def terms(text: str) -> List[str]:
+    """Lower-cased, prefix-stemmed words of any script."""
+    text = unicodedata.normalize("NFKC", text).casefold().replace("ё", "е")
+    return [w[:STEM] for w in _WORD.findall(text) if not w.isdigit()]
+
+
+def _strings(value: Any) -> Iterable[str]:
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, list):
+        for v in value:
+            yield from _strings(v)
+    elif isinstance(value, dict):
+        for v in value.values():
+            yield from _strings(v)
+
+
+def _deck_slides(path: Path) -> List[Dict[str, Any]]:
+    """Slides of a deck file; anything else (templates, themes, broken JSON) yields none."""
+    try:
+        data = json.loads(path.read_text(encoding="utf-8-sig"))
+    except (OSError, ValueError):
+        return []
+    if isinstance(data, dict):
+        data = data.get("slides")
+    if not isinstance(data, list):
+        return []
+    return [s for s in data if isinstance(s, dict) and isinstance(s.get("layout_key"), str) and isinstance(s.get("fields"), dict)]
+
+
+def compact_slide(slide: Dict[str, Any], *, items: int = 3, chars: int = 90) -> Dict[str, Any]:
+    """A few-shot sized copy: at most ``items`` bullets per list, long strings cut, speaker notes dropped."""
+    fields: Dict[str, Any] = {}
+    for key, value in slide["fields"].items():
+        if key == "notes":
+            continue
+        if isinstance(value, str):
+            value = value if len(value) <= chars else value[:chars].rstrip() + "…"
+        elif isinstance(value, list):
+            value = [v if not isinstance(v, str) or len(v) <= chars else v[:chars].rstrip() + "…" for v in value[:items]]
+        fields[key] = value
+    return {"layout_key": slide["layout_key"], "fields": fields}
+
+
+class DeckLibrary:
+    """BM25 index (SQLite FTS5) over every slide of the deck JSON files in ``roots``.
+
+    Each slide is a document with three weighted columns: its title, the rest of its text
+    (bullets, quotes, captions) and its layout_key. refresh() re-reads only files whose size or
+    mtime changed and drops vanished ones, so the index stays current at the cost of a stat()
+    per file. The database may be shared by several processes, like the rate limiter's.
+    """
+
+    def __init__(self, path: Optional[Path], roots: Sequence[Path]) -> None:
+        self.path = Path(path) if path else None
+        self.roots = [Path(r) for r in roots]
+        self._lock = threading.Lock()
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path) if self.path else ":memory:", timeout=30, isolation_level=None, check_same_thread=False)
+        if self.path is not None:
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        self.refresh()
+
+    def _files(self) -> Dict[str, Tuple[int, int]]:
+        found: Dict[str, Tuple[int, int]] = {}
+        for root in self.roots:
+            for f in sorted(root.glob("*.json")):
+                try:
+                    st = f.stat()
+                except OSError:
+                    continue
+                found[str(f.resolve())] = (st.st_mtime_ns, st.st_size)
+        return found
+
+    def refresh(self) -> int:
+        """Bring the index up to date with the files on disk; returns how many files were (re)indexed."""
+        found = self._files()
+        with self._lock:
+            known = {p: (m, s) for p, m, s in self._db.execute("SELECT path, mtime_ns, size FROM files")}
+            changed = [p for p, stamp in found.items() if known.get(p) != stamp]
+            gone = [p for p in known if p not in found]
+            if not changed and not gone:
+                return 0
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for p in gone + changed:
+                    self._db.execute("DELETE FROM slides WHERE path = ?", (p,))
+                    self._db.execute("DELETE FROM files WHERE path = ?", (p,))
+                for p in changed:
+                    for i, slide in enumerate(_deck_slides(Path(p))):
+                        fields = slide["fields"]
+                        title = fields.get("title") if isinstance(fields.get("title"), str) else ""
+                        body = [s for k, v in fields.items() if k not in ("title", "notes") for s in _strings(v)]
+                        self._db.execute(
+                            "INSERT INTO slides (path, idx, layout_key, title, body, layout, slide) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            (p, i, slide["layout_key"], " ".join(terms(title)), " ".join(terms(" ".join(body))),
+                             " ".join(terms(slide["layout_key"])), json.dumps(slide, ensure_ascii=False)),
+                        )
+                    self._db.execute("INSERT INTO files (path, mtime_ns, size) VALUES (?, ?, ?)", (p, *found[p]))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return len(changed) + len(gone)
+
+    def search(
+        self,
+        topic: str,
+        *,
+        layout_key: Optional[str] = None,
+        k: int = 3,
+    ) -> List[Tuple[float, Dict[str, Any]]]:
+        """Top ``k`` (score, slide) pairs for ``topic``, best first; duplicates across decks collapse."""
+        words = sorted(set(terms(topic)))
+        if not words or k <= 0:
+            return []
+        query = " OR ".join(f'"{w}"' for w in words)
+        sql = f"SELECT bm25(slides, {', '.join(map(str, _WEIGHTS))}) AS score, slide FROM slides WHERE slides MATCH ?"
+        args: List[Any] = [query]
+        if layout_key is not None:
+            sql += " AND layout_key = ?"
+            args.append(layout_key)
+        out: List[Tuple[float, Dict[str, Any]]] = []
+        seen = set()
+        with self._lock:
+            rows = self._db.execute(sql + " ORDER BY score LIMIT ?", (*args, k * 4))
+            for score, text in rows:
+                if text in seen:
+                    continue
+                seen.add(text)
+                out.append((-score, json.loads(text)))  # FTS5 bm25() is negated: lower is better
+                if len(out) >= k:
+                    break
+        return out
+
+    def few_shot(
+        self,
+        topic: str,
+        layout_keys: Iterable[str],
+        *,
+        k: int = 1,
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Compact example slides per layout: the ``k`` most relevant to ``topic`` for each layout_key
+        (after picking up changed files)."""
+        self.refresh()
+        shots: Dict[str, List[Dict[str, Any]]] = {}
+        for lk in dict.fromkeys(layout_keys):
+            # the layout's own words match every slide of it, so a layout always gets an example
+            found = [compact_slide(slide) for _, slide in self.search(f"{topic} {lk}", layout_key=lk, k=k)]
+            if found:
+                shots[lk] = found
+        return shots
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
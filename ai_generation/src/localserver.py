@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import json
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+from .fakeprovider import FakeConfig, FakeProvider
+from .generator import DataContext
+
+# prompt text -> pipeline stage, checked in order (see the *_prompt builders in src/generator.py)
+_STAGE_MARKERS = (
+    ("Slides to write:", "draft_slide"),
+    ("Input slides JSON:", "review"),
+    ("planned and written in one answer", "fused"),
+    ("Plan JSON:", "draft"),
+    ("Outline JSON:", "draft"),
+    ("key 'outline'", "outline"),
+)
+
+
+def guess_stage(prompt: str) -> str:
+    """Pipeline stage a prompt was built for (plan when nothing else matches)."""
+    for marker, stage in _STAGE_MARKERS:
+        if marker in prompt:
+            return stage
+    return "plan"
+
+
+class LocalModelServer:
+    """Stand-in for an on-prem OpenAI-compatible server: answers chat completions with FakeProvider's
+    replayed or synthesized JSON, after the latency (and with the errors) its FakeConfig simulates."""
+
+    def __init__(self, ctx: DataContext, config: FakeConfig, *, model: str = "local", verbose: bool = False) -> None:
+        self.model = model
+        self.config = config
+        self.verbose = verbose
+        self._fake = FakeProvider("local", model, config=config, ctx=ctx)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.connections = 0
+
+    def complete(self, messages: List[Dict[str, Any]]) -> str:
+        """Answer text for an OpenAI ``messages`` list; raises RuntimeError for a simulated failure."""
+        system = "\n".join(str(m.get("content") or "") for m in messages if m.get("role") == "system")
+        user = "\n".join(str(m.get("content") or "") for m in messages if m.get("role") == "user")
+        with self._lock:
+            self.requests += 1
+            delay = self.config.latency.sample(self._fake.rng)
+            failed = self._fake.rng.random() < self.config.error_rate
+            self.errors += failed
+            text = None if failed else self._fake.respond(guess_stage(user), system, user)
+        time.sleep(delay)
+        if text is None:
+            raise RuntimeError("simulated server error")
+        return text
+
+    def note_connection(self) -> None:
+        with self._lock:
+            self.connections += 1
+
+    def health(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"status": "ok", "model": self.model, "requests": self.requests, "errors": self.errors, "connections": self.connections}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # HTTP/1.1: connections stay open between requests (what LocalProvider's keep-alive pool reuses)
+    protocol_version = "HTTP/1.1"
+    server_version = "LocalModel/1.0"
+    service: LocalModelServer  # set on the subclass built by make_local_server
+
+    def setup(self) -> None:
+        super().setup()
+        self.service.note_connection()
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if self.service.verbose:
+            sys.stderr.write("[local-model] " + format % args + "\n")
+
+    def _send(self, code: int, body: bytes, content_type: str = "application/json") -> None:
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, code: int, body: Any) -> None:
+        self._send(code, json.dumps(body, ensure_ascii=False).encode("utf-8"))
+
+    def do_GET(self) -> None:
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path in ("/health", "/v1/health"):
+            return self._json(200, self.service.health())
+        if path == "/v1/models":
+            return self._json(200, {"object": "list", "data": [{"id": self.service.model, "object": "model"}]})
+        self._json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length)
+        if self.path.split("?", 1)[0].rstrip("/") != "/v1/chat/completions":
+            return self._json(404, {"error": {"message": "not found"}})
+        try:
+            payload = json.loads(raw.decode("utf-8") or "{}")
+            messages = payload.get("messages")
+            if not isinstance(messages, list):
+                raise ValueError("'messages' must be a list")
+        except (ValueError, AttributeError) as e:
+            return self._json(400, {"error": {"message": str(e)}})
+        try:
+            text = self.service.complete(messages)
+        except RuntimeError as e:
+            return self._json(503, {"error": {"message": str(e)}})
+        reply_id, model = f"chatcmpl-{uuid.uuid4().hex[:12]}", payload.get("model") or self.service.model
+        if payload.get("stream"):
+            # the whole answer in a few SSE chunks, sent with a length so the connection stays reusable
+            step = max(1, len(text) // 8 + 1)
+            events = [
+                {"id": reply_id, "object": "chat.completion.chunk", "model": model,
+                 "choices": [{"index": 0, "delta": {"content": text[i:i + step]}, "finish_reason": None}]}
+                for i in range(0, len(text), step)
+            ]
+            body = "".join(f"data: {json.dumps(e, ensure_ascii=False)}\n\n" for e in events) + "data: [DONE]\n\n"
+            return self._send(200, body.encode("utf-8"), "text/event-stream")
+        self._json(200, {
+            "id": reply_id,
+            "object": "chat.completion",
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        })
+
+
+def make_local_server(service: LocalModelServer, host: str = "127.0.0.1", port: int = 8080) -> ThreadingHTTPServer:
+    """OpenAI-compatible HTTP front end for ``service`` (base URL http://host:port/v1):
+
+    POST /v1/chat/completions ({"stream": true} answers as server-sent events), GET /v1/models,
+    GET /health (requests, simulated errors and TCP connections accepted so far).
+    """
+    handler = type("Handler", (_Handler,), {"service": service})
+    httpd = ThreadingHTTPServer((host, port), handler)
+    httpd.daemon_threads = True
+    return httpd
@@ -0,0 +1,497 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import json
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+
+from . import tracing
+from .ratelimit import RateLimiter, note_wait
+from .resilience import BreakerRegistry, CircuitBreaker, RetryPolicy, is_retryable
+from .schemaexport import to_gemini
+from .tokens import estimate_tokens
+
+T = TypeVar("T")
+
+GEMINI_GENERATION_CONFIG: Dict[str, Any] = {"response_mime_type": "application/json"}
+GROQ_GENERATION_CONFIG: Dict[str, Any] = {"temperature": 0.2}
+LOCAL_GENERATION_CONFIG: Dict[str, Any] = {"temperature": 0.2, "response_format": {"type": "json_object"}}
+# api key of a local server that needs none (the provider chain only calls providers that have a key)
+LOCAL_NO_KEY = "local"
+
+
+class Provider:
+    """Async LLM backend. One instance per (provider, api key, model) is kept alive and shared."""
+
+    name: str = "provider"
+    generation_config: Dict[str, Any] = {}
+
+    def __init__(self, model: str, timeout: Optional[float] = None) -> None:
+        self.model = model
+        self.timeout = timeout
+        self._slots: Optional[asyncio.Semaphore] = None
+        # recent successful call durations per stage; feeds the hedging delay
+        self.latencies: Dict[str, Deque[float]] = {}
+        # set by ProviderPool: backoff for transient errors and the provider's shared circuit breaker
+        self.retry: Optional[RetryPolicy] = None
+        self.breaker: Optional[CircuitBreaker] = None
+        # set by ProviderPool: RPM/TPM budget shared with other threads and processes
+        self.limiter: Optional[RateLimiter] = None
+
+    def set_concurrency(self, limit: Optional[int]) -> None:
+        self._slots = asyncio.Semaphore(int(limit)) if limit else None
+
+    def record_latency(self, stage: str, seconds: float) -> None:
+        self.latencies.setdefault(stage, deque(maxlen=100)).append(seconds)
+
+    async def complete_json(self, stage: str, system: str, user: str, *, schema: Optional[Dict[str, Any]] = None) -> str:
+        """Return the full response text, retrying transient errors per ``retry``.
+
+        ``schema`` (src/schemaexport.py) constrains the response where the provider supports it.
+        Raises CircuitOpenError without calling out while the breaker is open, and
+        asyncio.TimeoutError when an attempt exceeds ``timeout`` seconds.
+        """
+        attempt = 0
+        while True:
+            if self.breaker is not None:
+                self.breaker.before_call()
+            try:
+                await self._throttle(system, user)
+                text = await self._complete_once(stage, system, user, schema)
+            except asyncio.CancelledError:
+                if self.breaker is not None:
+                    self.breaker.release_probe()
+                raise
+            except Exception as e:
+                if not self._note_failure(e) or not await self._backoff(attempt):
+                    raise
+                attempt += 1
+                continue
+            if self.breaker is not None:
+                self.breaker.record_success()
+            await self._charge(estimate_tokens(text))
+            return text
+
+    async def _throttle(self, system: str, user: str) -> None:
+        """Wait until the provider+model RPM/TPM budget covers this request (queue, never fail).
+
+        The limiter's SQLite transaction can block for seconds while another process holds the lock,
+        so it runs in a worker thread instead of stalling every call on the provider loop.
+        """
+        if self.limiter is None:
+            return
+        limit = self.limiter.limit_for(self.name, self.model)
+        if limit is None:
+            return
+        tokens = estimate_tokens(system) + estimate_tokens(user) if limit.tpm else 0
+        wait = await asyncio.to_thread(self.limiter.reserve, self.name, self.model, tokens)
+        if wait > 0:
+            note_wait(wait)
+            tracing.add_to("wait_seconds", wait)
+            await asyncio.sleep(wait)
+
+    async def _charge(self, tokens: int) -> None:
+        if self.limiter is not None:
+            limit = self.limiter.limit_for(self.name, self.model)
+            if limit is not None and limit.tpm:
+                await asyncio.to_thread(self.limiter.charge, self.name, self.model, tokens)
+
+    def _note_failure(self, exc: Exception) -> bool:
+        """Feed the breaker; returns whether the error is retryable."""
+        retryable = is_retryable(exc)
+        if self.breaker is not None:
+            if retryable:
+                self.breaker.record_failure()
+            else:
+                self.breaker.release_probe()
+        return retryable
+
+    async def _backoff(self, attempt: int) -> bool:
+        """Sleep before retry number ``attempt + 1``; False when retries are exhausted or the breaker opened."""
+        if self.retry is None or attempt >= self.retry.retries:
+            return False
+        if self.breaker is not None and not self.breaker.allows():
+            return False
+        delay = self.retry.backoff(attempt)
+        tracing.annotate(retries=attempt + 1)
+        tracing.add_to("retry_wait_seconds", delay)
+        await asyncio.sleep(delay)
+        return True
+
+    async def _complete_once(self, stage: str, system: str, user: str, schema: Optional[Dict[str, Any]] = None) -> str:
+        started = time.perf_counter()
+        try:
+            if self._slots is None:
+                text = await asyncio.wait_for(self._complete(stage, system, user, schema), self.timeout)
+            else:
+                async with self._slots:
+                    text = await asyncio.wait_for(self._complete(stage, system, user, schema), self.timeout)
+        except asyncio.TimeoutError:
+            raise asyncio.TimeoutError(f"{self.name} {stage} call exceeded {self.timeout}s") from None
+        self.record_latency(stage, time.perf_counter() - started)
+        return text
+
+    async def stream_json(self, stage: str, system: str, user: str) -> AsyncIterator[str]:
+        """Yield the response text in chunks as the provider produces them, within one ``timeout`` deadline.
+
+        Transient errors are retried only until the first chunk has been yielded.
+        """
+        attempt = 0
+        while True:
+            if self.breaker is not None:
+                self.breaker.before_call()
+            yielded = False
+            chars = 0
+            try:
+                await self._throttle(system, user)
+                async for chunk in self._stream_once(stage, system, user):
+                    yielded = True
+                    chars += len(chunk)
+                    yield chunk
+            except (asyncio.CancelledError, GeneratorExit):
+                if self.breaker is not None:
+                    self.breaker.release_probe()
+                raise
+            except Exception as e:
+                if not self._note_failure(e) or yielded or not await self._backoff(attempt):
+                    raise
+                attempt += 1
+                continue
+            if self.breaker is not None:
+                self.breaker.record_success()
+            if chars:
+                # chunks are not kept; charge the response at ~3 chars per token
+                await self._charge(chars // 3)
+            return
+
+    async def _stream_once(self, stage: str, system: str, user: str) -> AsyncIterator[str]:
+        if self._slots is None:
+            async for chunk in self._stream_with_deadline(stage, system, user):
+                yield chunk
+            return
+        async with self._slots:
+            async for chunk in self._stream_with_deadline(stage, system, user):
+                yield chunk
+
+    async def _stream_with_deadline(self, stage: str, system: str, user: str) -> AsyncIterator[str]:
+        started = time.perf_counter()
+        it = self._stream(stage, system, user).__aiter__()
+        while True:
+            remaining = None if self.timeout is None else self.timeout - (time.perf_counter() - started)
+            if remaining is not None and remaining <= 0:
+                raise asyncio.TimeoutError(f"{self.name} stream exceeded {self.timeout}s")
+            try:
+                chunk = await asyncio.wait_for(it.__anext__(), remaining)
+            except StopAsyncIteration:
+                break
+            yield chunk
+        self.record_latency(stage, time.perf_counter() - started)
+
+    async def _complete(self, stage: str, system: str, user: str, schema: Optional[Dict[str, Any]] = None) -> str:
+        raise NotImplementedError
+
+    async def _stream(self, stage: str, system: str, user: str) -> AsyncIterator[str]:
+        # providers without native streaming deliver the whole answer as one chunk
+        yield await self._complete(stage, system, user)
+
+    async def aclose(self) -> None:
+        pass
+
+
+@functools.lru_cache(maxsize=32)
+def _gemini_schema(schema_json: str) -> Dict[str, Any]:
+    return to_gemini(json.loads(schema_json))
+
+
+class GeminiProvider(Provider):
+    name = "gemini"
+    generation_config = GEMINI_GENERATION_CONFIG
+
+    def __init__(self, api_key: str, model: str, timeout: Optional[float] = None) -> None:
+        super().__init__(model, timeout)
+        import google.generativeai as genai
+        # genai keeps one process-wide key; configure once per provider instead of per call
+        genai.configure(api_key=api_key)
+        self._model = genai.GenerativeModel(model)
+
+    def _request_options(self) -> Dict[str, Any]:
+        return {"timeout": self.timeout} if self.timeout else {}
+
+    async def _complete(self, stage: str, system: str, user: str, schema: Optional[Dict[str, Any]] = None) -> str:
+        config = self.generation_config
+        if schema:
+            config = dict(config, response_schema=_gemini_schema(json.dumps(schema, sort_keys=True)))
+        res = await self._model.generate_content_async([system, user], generation_config=config, request_options=self._request_options())
+        text = getattr(res, "text", None)
+        if not text and getattr(res, "candidates", None):
+            for c in res.candidates:
+                content = getattr(c, "content", None)
+                if content and getattr(content, "parts", None):
+                    text = "".join(getattr(p, "text", "") for p in content.parts)
+                    if text:
+                        break
+        if not text:
+            raise RuntimeError(f"Empty response from model ({stage})")
+        return text
+
+    async def _stream(self, stage: str, system: str, user: str) -> AsyncIterator[str]:
+        res = await self._model.generate_content_async([system, user], generation_config=self.generation_config, request_options=self._request_options(), stream=True)
+        async for chunk in res:
+            text = getattr(chunk, "text", None)
+            if text:
+                yield text
+
+
+class GroqProvider(Provider):
+    name = "groq"
+    generation_config = GROQ_GENERATION_CONFIG
+
+    def __init__(self, api_key: str, model: str, timeout: Optional[float] = None) -> None:
+        super().__init__(model, timeout)
+        from groq import AsyncGroq
+        # one client == one pooled HTTP connection set, reused by every stage
+        self._client = AsyncGroq(api_key=api_key, timeout=timeout) if timeout else AsyncGroq(api_key=api_key)
+
+    async def _complete(self, stage: str, system: str, user: str, schema: Optional[Dict[str, Any]] = None) -> str:
+        # JSON mode only: schema-constrained output is limited to a few Groq models, and the prompt carries the layouts
+        extra = {"response_format": {"type": "json_object"}} if schema else {}
+        resp = await self._client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system},
+                {"role": "user", "content": user},
+            ],
+            **self.generation_config,
+            **extra,
+        )
+        return resp.choices[0].message.content or ""
+
+    async def _stream(self, stage: str, system: str, user: str) -> AsyncIterator[str]:
+        stream = await self._client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system},
+                {"role": "user", "content": user},
+            ],
+            stream=True,
+            **self.generation_config,
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def aclose(self) -> None:
+        await self._client.close()
+
+
+class LocalProvider(Provider):
+    """OpenAI-compatible chat completions server: llama.cpp's server, vLLM, or src/localserver.py.
+
+    One httpx client per provider keeps idle connections open for ``keepalive`` seconds, so the
+    calls of a deck (and of every deck sharing the pool) reuse them instead of reconnecting.
+    """
+
+    name = "local"
+    generation_config = LOCAL_GENERATION_CONFIG
+
+    def __init__(
+        self,
+        api_key: str,
+        model: str,
+        timeout: Optional[float] = None,
+        *,
+        base_url: str = "http://127.0.0.1:8080/v1",
+        connect_timeout: float = 5.0,
+        keepalive: float = 60.0,
+        max_connections: int = 8,
+    ) -> None:
+        super().__init__(model, timeout)
+        import httpx
+
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key and api_key != LOCAL_NO_KEY else {}
+        self._client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/") + "/",
+            headers=headers,
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections, keepalive_expiry=keepalive),
+        )
+
+    def _body(self, system: str, user: str, schema: Optional[Dict[str, Any]], **extra: Any) -> Dict[str, Any]:
+        body: Dict[str, Any] = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system},
+                {"role": "user", "content": user},
+            ],
+            **self.generation_config,
+            **extra,
+        }
+        if schema:
+            # llama.cpp and vLLM both turn a JSON Schema into a decoding grammar, unions included
+            body["response_format"] = {"type": "json_schema", "json_schema": {"name": "deck", "schema": schema}}
+        return body
+
+    async def _complete(self, stage: str, system: str, user: str, schema: Optional[Dict[str, Any]] = None) -> str:
+        resp = await self._client.post("chat/completions", json=self._body(system, user, schema))
+        resp.raise_for_status()
+        choices = resp.json().get("choices") or []
+        text = (choices[0].get("message") or {}).get("content") if choices else None
+        if not text:
+            raise RuntimeError(f"Empty response from model ({stage})")
+        return text
+
+    async def _stream(self, stage: str, system: str, user: str) -> AsyncIterator[str]:
+        async with self._client.stream("POST", "chat/completions", json=self._body(system, user, None, stream=True)) as resp:
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or []
+                text = (choices[0].get("delta") or {}).get("content") if choices else None
+                if text:
+                    yield text
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+# name -> factory(api_key, model, timeout=None) -> Provider
+_PROVIDER_CLASSES: Dict[str, Callable[..., Provider]] = {"gemini": GeminiProvider, "groq": GroqProvider, "local": LocalProvider}
+
+
+def register_provider(name: str, factory: Callable[..., Provider]) -> None:
+    """Make ProviderPool.get(name, ...) build providers with ``factory(api_key, model, timeout=...)``."""
+    _PROVIDER_CLASSES[name] = factory
+
+
+class ProviderPool:
+    """Long-lived provider instances keyed by (provider, api key, model), plus per-provider concurrency caps."""
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, int]] = None,
+        timeout: Optional[float] = None,
+        *,
+        retry: Optional[RetryPolicy] = None,
+        breakers: Optional[BreakerRegistry] = None,
+        limiter: Optional[RateLimiter] = None,
+    ) -> None:
+        self._lock = threading.Lock()
+        self._providers: Dict[Tuple[str, str, str], Provider] = {}
+        self._limits: Dict[str, int] = dict(limits or {})
+        self.timeout = timeout
+        self._timeouts: Dict[str, Optional[float]] = {}  # per-provider overrides of ``timeout``
+        self.retry = retry if retry is not None else RetryPolicy()
+        # one breaker per provider name, whatever the key/model, shared by every job using the pool
+        self.breakers = breakers if breakers is not None else BreakerRegistry()
+        self.limiter = limiter
+
+    def get(self, name: str, api_key: str, model: str) -> Provider:
+        key = (name, api_key, model)
+        with self._lock:
+            provider = self._providers.get(key)
+            if provider is None:
+                provider = _PROVIDER_CLASSES[name](api_key, model, timeout=self._timeouts.get(name, self.timeout))
+                provider.set_concurrency(self._limits.get(name))
+                provider.retry = self.retry
+                provider.breaker = self.breakers.get(name)
+                provider.limiter = self.limiter
+                self._providers[key] = provider
+            return provider
+
+    def available(self, name: str) -> bool:
+        """False while ``name``'s circuit breaker is open: stages skip straight to the next provider."""
+        return self.breakers.allows(name)
+
+    def set_rate_limiter(self, limiter: Optional[RateLimiter]) -> None:
+        """Throttle every provider of the pool through ``limiter`` (None removes throttling)."""
+        with self._lock:
+            self.limiter = limiter
+            for provider in self._providers.values():
+                provider.limiter = limiter
+
+    def set_resilience(self, retry: Optional[RetryPolicy] = None, breakers: Optional[BreakerRegistry] = None) -> None:
+        """Replace the retry policy and/or breaker registry (e.g. one persisted between runs)."""
+        with self._lock:
+            if retry is not None:
+                self.retry = retry
+            if breakers is not None:
+                self.breakers = breakers
+            for (name, _, _), provider in self._providers.items():
+                provider.retry = self.retry
+                provider.breaker = self.breakers.get(name)
+
+    def set_concurrency(self, limits: Dict[str, int]) -> None:
+        """Limit concurrent requests per provider, e.g. {"gemini": 2, "groq": 4}; 0/None removes the cap."""
+        with self._lock:
+            self._limits.update(limits)
+            for (name, _, _), provider in self._providers.items():
+                if name in limits:
+                    provider.set_concurrency(limits[name])
+
+    def set_timeout(self, seconds: Optional[float], *, name: Optional[str] = None) -> None:
+        """Per-call deadline for every provider in the pool (Settings.timeout), or for provider
+        ``name`` only, overriding the pool-wide one (Settings.local_timeout)."""
+        with self._lock:
+            if name is None:
+                self.timeout = seconds
+            else:
+                self._timeouts[name] = seconds
+            for (pname, _, _), provider in self._providers.items():
+                if name == pname or name is None and pname not in self._timeouts:
+                    provider.timeout = seconds
+
+    async def aclose(self) -> None:
+        with self._lock:
+            providers = list(self._providers.values())
+            self._providers.clear()
+        for p in providers:
+            await p.aclose()
+
+
+_DEFAULT_POOL: Optional[ProviderPool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def default_pool() -> ProviderPool:
+    global _DEFAULT_POOL
+    with _POOL_LOCK:
+        if _DEFAULT_POOL is None:
+            _DEFAULT_POOL = ProviderPool()
+        return _DEFAULT_POOL
+
+
+def set_provider_concurrency(limits: Dict[str, int]) -> None:
+    default_pool().set_concurrency(limits)
+
+
+# ===== Sync bridge =====
+# Async clients are bound to the loop they were first used on, so every sync caller
+# (CLI, batch worker threads) submits to the same long-lived background loop.
+
+_LOOP: Optional[asyncio.AbstractEventLoop] = None
+_LOOP_LOCK = threading.Lock()
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    global _LOOP
+    with _LOOP_LOCK:
+        if _LOOP is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="provider-loop", daemon=True).start()
+            _LOOP = loop
+        return _LOOP
+
+
+def run_sync(coro: Awaitable[T]) -> T:
+    """Run a coroutine on the shared provider loop and block until it finishes."""
+    loop = _background_loop()
+    if threading.current_thread().name == "provider-loop":
+        raise RuntimeError("run_sync() called from the provider loop; await the coroutine instead")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import contextvars
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Waits of every throttled call made within collect_waits() (including tasks it spawns).
+_WAITS: contextvars.ContextVar[Optional[List[float]]] = contextvars.ContextVar("rate_limit_waits", default=None)
+
+
+@contextmanager
+def collect_waits() -> Iterator[List[float]]:
+    waits: List[float] = []
+    token = _WAITS.set(waits)
+    try:
+        yield waits
+    finally:
+        _WAITS.reset(token)
+
+
+def note_wait(seconds: float) -> None:
+    waits = _WAITS.get()
+    if waits is not None:
+        waits.append(seconds)
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """Per-minute budgets for one provider+model; 0 means unlimited."""
+
+    rpm: int = 0
+    tpm: int = 0
+
+    @property
+    def active(self) -> bool:
+        return self.rpm > 0 or self.tpm > 0
+
+    @classmethod
+    def parse(cls, spec: str) -> "RateLimit":
+        """'15/1000000' (RPM/TPM), '15' (RPM only) or '/60000' (TPM only)."""
+        rpm, _, tpm = spec.partition("/")
+        return cls(int(rpm or 0), int(tpm or 0))
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    key TEXT PRIMARY KEY,
+    requests REAL NOT NULL,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+)
+"""
+
+
+class RateLimiter:
+    """Token buckets keyed by "provider:model", shared through a SQLite file by every thread and
+    every process on the host that points at the same ``path`` (in memory, i.e. per process, without one).
+
+    Each bucket holds up to one minute of budget and refills continuously. reserve() always
+    reserves, letting the balance go negative, and returns how long the caller must wait for
+    its reservation to be covered, so concurrent callers queue in arrival order without polling.
+    """
+
+    def __init__(self, path: Optional[Path] = None, limits: Optional[Dict[str, RateLimit]] = None) -> None:
+        self.path = Path(path) if path else None
+        self.limits: Dict[str, RateLimit] = dict(limits or {})
+        self._lock = threading.Lock()
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        # autocommit mode: transactions are opened explicitly with BEGIN IMMEDIATE
+        self._db = sqlite3.connect(str(self.path) if self.path else ":memory:", timeout=30, isolation_level=None, check_same_thread=False)
+        if self.path is not None:
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(_SCHEMA)
+
+    def limit_for(self, provider: str, model: str) -> Optional[RateLimit]:
+        """The most specific configured limit: "provider:model", then "provider"."""
+        limit = self.limits.get(f"{provider}:{model}") or self.limits.get(provider)
+        return limit if limit is not None and limit.active else None
+
+    def reserve(self, provider: str, model: str, tokens: int) -> float:
+        """Take one request and ``tokens`` tokens from the bucket; returns the seconds to wait first."""
+        limit = self.limit_for(provider, model)
+        if limit is None:
+            return 0.0
+        key = f"{provider}:{model}"
+        # a single call larger than the whole per-minute budget can never fit; let it wait one full refill
+        tokens = min(max(0, int(tokens)), limit.tpm) if limit.tpm else 0
+        with self._lock:
+            now = time.time()
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                requests, toks = self._refilled(key, limit, now)
+                if limit.rpm:
+                    requests -= 1
+                toks -= tokens
+                self._db.execute(
+                    "INSERT OR REPLACE INTO buckets (key, requests, tokens, updated) VALUES (?, ?, ?, ?)",
+                    (key, requests, toks, now),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        wait = 0.0
+        if limit.rpm and requests < 0:
+            wait = max(wait, -requests * 60.0 / limit.rpm)
+        if limit.tpm and toks < 0:
+            wait = max(wait, -toks * 60.0 / limit.tpm)
+        return wait
+
+    def charge(self, provider: str, model: str, tokens: int) -> None:
+        """Debit tokens known only after the call (the response); never waits, later callers do."""
+        limit = self.limit_for(provider, model)
+        if limit is None or not limit.tpm or tokens <= 0:
+            return
+        key = f"{provider}:{model}"
+        with self._lock:
+            now = time.time()
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                requests, toks = self._refilled(key, limit, now)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO buckets (key, requests, tokens, updated) VALUES (?, ?, ?, ?)",
+                    (key, requests, toks - tokens, now),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _refilled(self, key: str, limit: RateLimit, now: float) -> Tuple[float, float]:
+        row = self._db.execute("SELECT requests, tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return float(limit.rpm), float(limit.tpm)
+        requests, toks, updated = row
+        elapsed = max(0.0, now - updated) / 60.0
+        return min(float(limit.rpm), requests + elapsed * limit.rpm), min(float(limit.tpm), toks + elapsed * limit.tpm)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
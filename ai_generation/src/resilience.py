@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits and server-side failures
+RETRYABLE_STATUS = frozenset({408, 409, 425, 429, 500, 502, 503, 504})
+_RETRYABLE_TEXT = re.compile(
+    r"\b(408|429|500|502|503|504)\b|rate.?limit|quota|resource.?exhausted|unavailable|overloaded|deadline|timed? ?out|temporar|connection",
+    re.IGNORECASE,
+)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a provider whose circuit breaker is open."""
+
+
+def _status_of(exc: BaseException) -> Optional[int]:
+    for attr in ("status_code", "code", "status"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(exc, "response", None)
+    value = getattr(response, "status_code", None)
+    return value if isinstance(value, int) else None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Transient provider trouble (timeouts, dropped connections, 429/5xx) as opposed to a bad request
+    or an unusable answer, which would fail the same way again."""
+    if isinstance(exc, CircuitOpenError):
+        return False
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    status = _status_of(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    if isinstance(exc, (ValueError, TypeError, KeyError)):
+        return False
+    return bool(_RETRYABLE_TEXT.search(f"{type(exc).__name__} {exc}"))
+
+
+@dataclass
+class RetryPolicy:
+    """Exponential backoff with full jitter: attempt n sleeps uniform(0, min(max_delay, base_delay * 2**n))."""
+
+    retries: int = 2
+    base_delay: float = 0.5
+    max_delay: float = 8.0
+
+    def backoff(self, attempt: int, rng: Optional[random.Random] = None) -> float:
+        cap = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return (rng or random).uniform(0.0, cap)
+
+
+class CircuitBreaker:
+    """closed -> open after ``threshold`` consecutive retryable failures; open -> half-open after
+    ``cooldown`` seconds, when a single probe call is let through; its outcome closes or re-opens.
+    """
+
+    def __init__(self, name: str, registry: "BreakerRegistry", *, threshold: int, cooldown: float) -> None:
+        self.name = name
+        self.registry = registry
+        self.threshold = max(1, int(threshold))
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0  # wall clock, so it survives a restart
+        self._probing = False
+
+    def _refresh(self) -> None:
+        if self.state == "open" and time.time() - self.opened_at >= self.cooldown:
+            self.state = "half_open"
+            self._probing = False
+
+    def allows(self) -> bool:
+        """Whether a call would currently be let through (does not reserve the half-open probe)."""
+        with self.registry.lock:
+            self._refresh()
+            return self.state == "closed" or (self.state == "half_open" and not self._probing)
+
+    def before_call(self) -> None:
+        with self.registry.lock:
+            self._refresh()
+            if self.state == "closed":
+                return
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return
+            retry_in = max(0.0, self.cooldown - (time.time() - self.opened_at))
+        raise CircuitOpenError(f"{self.name} circuit open (retry in {retry_in:.0f}s)")
+
+    def record_success(self) -> None:
+        with self.registry.lock:
+            changed = self.state != "closed"
+            self.state, self.failures, self._probing = "closed", 0, False
+        if changed:
+            self.registry.save()
+
+    def record_failure(self) -> None:
+        with self.registry.lock:
+            self.failures += 1
+            opened = self.state == "half_open" or (self.state == "closed" and self.failures >= self.threshold)
+            if opened:
+                self.state, self.opened_at, self._probing = "open", time.time(), False
+        if opened:
+            self.registry.save()
+
+    def release_probe(self) -> None:
+        """The half-open probe ended without a verdict (e.g. a non-retryable error); let another through."""
+        with self.registry.lock:
+            self._probing = False
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"state": self.state, "failures": self.failures, "opened_at": self.opened_at}
+
+
+class BreakerRegistry:
+    """One CircuitBreaker per provider name, shared by every job of the process.
+
+    With ``path`` the states are loaded at start and written (atomically) on every open/close
+    transition, so a provider that was down when the last run ended is not hammered again.
+    """
+
+    def __init__(self, path: Optional[Path] = None, *, threshold: int = 5, cooldown: float = 60.0) -> None:
+        self.path = Path(path) if path else None
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.lock = threading.RLock()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._saved: Dict[str, Dict[str, Any]] = {}
+        if self.path is not None:
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8"))
+                if isinstance(data, dict):
+                    self._saved = {k: v for k, v in data.items() if isinstance(v, dict)}
+            except (OSError, ValueError):
+                pass
+
+    def get(self, name: str) -> CircuitBreaker:
+        with self.lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = self._breakers[name] = CircuitBreaker(name, self, threshold=self.threshold, cooldown=self.cooldown)
+                saved = self._saved.get(name)
+                if saved and saved.get("state") in ("open", "half_open"):
+                    # a probe that was in flight when the last run ended counts as open
+                    breaker.state, breaker.opened_at = "open", float(saved.get("opened_at") or 0.0)
+                    breaker.failures = int(saved.get("failures") or 0)
+            return breaker
+
+    def allows(self, name: str) -> bool:
+        return self.get(name).allows()
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self.lock:
+            out = dict(self._saved)
+            out.update({name: b.as_dict() for name, b in self._breakers.items()})
+            return out
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        data = self.snapshot()
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=".tmp-", suffix=".json")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass  # persistence is best effort; the in-process state still applies
@@ -0,0 +1,404 @@
+from __future__ import annotations
+
+import html
+import re
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .fieldspec import NAMED_TYPES, CompiledLayout, CompiledTemplates, Node, Predicate, compile_node
+
+# The rules the reviewer prompt states, enforced locally on every array-of-strings field
+MIN_BULLETS = 3
+MAX_BULLETS = 6
+MAX_WORDS = 8
+
+# Members holding paths or URLs: never cleaned of markup
+VERBATIM = frozenset({"src", "img", "photo", "href", "url"})
+
+_WORD = re.compile(r"\w", re.UNICODE)  # a whitespace-separated token is a word when it has a letter or digit
+_WORD_TOKEN = re.compile(r"\S*\w\S*", re.UNICODE)
+_TAG = re.compile(r"<[^<>]{1,200}>")
+_IMAGE = re.compile(r"!\[([^\]]*)\]\([^)]*\)")
+_LINK = re.compile(r"\[([^\]]+)\]\([^)]*\)")
+_EMPHASIS = re.compile(r"(\*\*|__|\*|`|~~)(?=\S)(.+?)(?<=\S)\1")
+_LEADER = re.compile(r"^(?:#{1,6}\s+|>\s*|[-*+•●▪–—]\s+|\d{1,2}[.)]\s+)+")
+_MARKUP = frozenset("<[*_`~&")
+_LEADERS = frozenset("#>-*+•●▪–—0123456789")
+_CLAUSE_END = (",", ";", ":", ".", "!", "?", "—", "–")
+_TRUE = frozenset({"true", "yes", "1", "так", "on"})
+_FALSE = frozenset({"false", "no", "0", "ні", "off"})
+
+# what the rules changed, by kind; returned per review so callers can report it
+Fixes = Dict[str, int]
+Fixer = Callable[[Any, Fixes], Any]
+
+
+def _count(fixes: Fixes, kind: str, n: int = 1) -> None:
+    fixes[kind] = fixes.get(kind, 0) + n
+
+
+def clean_text(text: str) -> str:
+    """Plain text: HTML tags and entities, Markdown emphasis, links, headings and list markers
+    removed, whitespace (any Unicode space) collapsed."""
+    if not _MARKUP.isdisjoint(text):
+        if "<" in text:
+            text = _TAG.sub(" ", text)
+        if "[" in text:
+            text = _LINK.sub(r"\1", _IMAGE.sub(r"\1", text))
+        text = _EMPHASIS.sub(r"\2", text)
+        if "&" in text:
+            text = html.unescape(text)
+    if "\n" in text:
+        return " ".join(filter(None, (_plain_line(line) for line in text.splitlines())))
+    return _plain_line(text)
+
+
+def _plain_line(text: str) -> str:
+    text = " ".join(text.split())
+    return _LEADER.sub("", text, count=1) if text[:1] in _LEADERS else text
+
+
+def word_count(text: str) -> int:
+    return len(_WORD_TOKEN.findall(text))
+
+
+def _chunks(tokens: List[str], parts: int, max_words: int) -> List[str]:
+    """Split ``tokens`` into at most ``parts`` bullets of at most ``max_words`` words each, in one pass.
+
+    A bullet ends at the last clause punctuation inside its word window when that keeps at least
+    half the window, else after ``max_words`` words; whatever does not fit in ``parts`` is dropped.
+    """
+    out: List[str] = []
+    start, n = 0, len(tokens)
+    while start < n and len(out) < parts:
+        words, cut, end = 0, -1, start
+        while end < n:
+            if _WORD.search(tokens[end]):
+                if words == max_words:
+                    break
+                words += 1
+                if words * 2 >= max_words and tokens[end].endswith(_CLAUSE_END):
+                    cut = end + 1
+            end += 1
+        if end < n and cut > start:
+            end = cut
+        piece = " ".join(tokens[start:end]).rstrip(",;:–— ")
+        if piece:
+            out.append(piece)
+        start = end
+    return out
+
+
+def _as_text(value: Any) -> Optional[str]:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    if isinstance(value, dict):
+        # {"text": "..."} and similar wrappers around a single bullet
+        for v in value.values():
+            if isinstance(v, str):
+                return v
+    return None
+
+
+def bullets(
+    value: Any,
+    fixes: Fixes,
+    *,
+    min_items: int = MIN_BULLETS,
+    max_items: int = MAX_BULLETS,
+    max_words: int = MAX_WORDS,
+) -> List[str]:
+    """An array-of-strings field as ``min_items``..``max_items`` bullets of at most ``max_words`` words.
+
+    Items are coerced to strings and cleaned; a string becomes one bullet per line. Long bullets
+    are split into several while there is room (a later item always keeps its own slot), and cut
+    once there is not; lists beyond ``max_items`` are cut. Too few short bullets stay as they are.
+    """
+    if isinstance(value, str):
+        raw: Iterable[Any] = value.splitlines() if "\n" in value else (value,)
+        _count(fixes, "coerced")
+    else:
+        raw = [x for item in value for x in (item if isinstance(item, list) else (item,))]
+    items: List[str] = []
+    for item in raw:
+        text = _as_text(item)
+        if text is None:
+            _count(fixes, "dropped")
+            continue
+        cleaned = clean_text(text)
+        if cleaned != text:
+            _count(fixes, "cleaned")
+        if cleaned:
+            items.append(cleaned)
+    out: List[str] = []
+    for i, text in enumerate(items):
+        if len(out) >= max_items:
+            _count(fixes, "trimmed", len(items) - i)
+            break
+        tokens = text.split()
+        words = word_count(text) if len(tokens) > max_words else 0
+        if words <= max_words:
+            out.append(text)
+            continue
+        later = len(items) - i - 1
+        # split as the maximum still allows
+        want = -(-words // max_words)
+        parts = max(1, min(want, max_items - len(out) - min(later, max_items)))
+        pieces = _chunks(tokens, parts, max_words)
+        _count(fixes, "split" if len(pieces) > 1 else "trimmed")
+        out.extend(pieces)
+    return out
+
+
+def _media(node: Node) -> bool:
+    return node[0] == "record" and node[2] in NAMED_TYPES
+
+
+def compile_fixer(node: Node, *, verbatim: bool = False) -> Fixer:
+    """Coercing, cleaning counterpart of fieldspec.compile_node(): returns the value made to fit
+    ``node`` where a deterministic fix exists, else the value unchanged (for issues() to report)."""
+    kind = node[0]
+    if kind == "string" or kind == "any":
+        strict = kind == "string"
+
+        def fix_string(v: Any, fixes: Fixes) -> Any:
+            if isinstance(v, str):
+                if verbatim:
+                    return v.strip()
+                cleaned = clean_text(v)
+                if cleaned != v:
+                    _count(fixes, "cleaned")
+                return cleaned
+            if not strict:
+                return v
+            if isinstance(v, list) and v:
+                parts = [t for t in map(_as_text, v) if t]
+                if parts:
+                    _count(fixes, "coerced")
+                    return fix_string(" ".join(parts), fixes)
+            if isinstance(v, (int, float)) and not isinstance(v, bool):
+                _count(fixes, "coerced")
+                return str(v)
+            return v
+
+        return fix_string
+    if kind == "boolean":
+        def fix_boolean(v: Any, fixes: Fixes) -> Any:
+            if v is True or v is False:
+                return v
+            key = str(v).strip().casefold() if isinstance(v, (str, int)) else None
+            if key in _TRUE or key in _FALSE:
+                _count(fixes, "coerced")
+                return key in _TRUE
+            return v
+
+        return fix_boolean
+    if kind == "number":
+        def fix_number(v: Any, fixes: Fixes) -> Any:
+            if isinstance(v, str):
+                try:
+                    num = float(v.strip().replace(",", "."))
+                except ValueError:
+                    return v
+                _count(fixes, "coerced")
+                return int(num) if num.is_integer() else num
+            return v
+
+        return fix_number
+    if kind == "enum":
+        by_fold = {s.casefold(): s for s in node[1]}
+
+        def fix_enum(v: Any, fixes: Fixes) -> Any:
+            if isinstance(v, str) and v not in node[1]:
+                hit = by_fold.get(clean_text(v).casefold())
+                if hit is not None:
+                    _count(fixes, "coerced")
+                    return hit
+            return v
+
+        return fix_enum
+    if kind == "array":
+        inner = node[1]
+        if inner[0] == "string":
+            def fix_bullets(v: Any, fixes: Fixes) -> Any:
+                return bullets(v, fixes) if isinstance(v, (list, str)) else v
+
+            return fix_bullets
+        item_fix, item_ok = compile_fixer(inner), compile_node(inner)
+        limit = None if _media(inner) else MAX_BULLETS
+
+        def fix_array(v: Any, fixes: Fixes) -> Any:
+            if isinstance(v, (dict, str)):
+                # one item where a list belongs ({"src": ...} or a bare "clip.mp4")
+                _count(fixes, "coerced")
+                v = [v]
+            if not isinstance(v, list):
+                return v
+            out = []
+            for x in v:
+                x = item_fix(x, fixes)
+                if item_ok(x):
+                    out.append(x)
+                else:
+                    _count(fixes, "dropped")
+            if limit is not None and len(out) > limit:
+                _count(fixes, "trimmed", len(out) - limit)
+                out = out[:limit]
+            return out
+
+        return fix_array
+    if kind == "union":
+        alts = [(compile_fixer(n, verbatim=verbatim), compile_node(n)) for n in node[1]]
+        as_list = next((fix for (fix, _), n in zip(alts, node[1]) if n == ("array", ("string", None))), None)
+
+        def fix_union(v: Any, fixes: Fixes) -> Any:
+            if as_list is not None and isinstance(v, str) and "\n" in v.strip():
+                # a multi-line string where bullets are allowed is a bullet list
+                return as_list(v, fixes)
+            # the first alternative the value already has the shape of, else the first one a fix satisfies
+            for fix, ok in alts:
+                if ok(v):
+                    return fix(v, fixes)
+            for fix, ok in alts:
+                scratch: Fixes = {}
+                fixed = fix(v, scratch)
+                if ok(fixed):
+                    for k, n in scratch.items():
+                        _count(fixes, k, n)
+                    return fixed
+            return v
+
+        return fix_union
+    if kind == "record":
+        return _compile_record(node[1])
+    return lambda v, fixes: v
+
+
+def _compile_record(members: List[Tuple[str, Node, bool]]) -> Fixer:
+    fields = {
+        name: (compile_fixer(typ, verbatim=name in VERBATIM), optional, compile_node(typ))
+        for name, typ, optional in members
+    }
+    # {"image": "pic.png"} means {"image": {"src": "pic.png"}}
+    wrap = next((name for name, _, _ in members if name == "src"), None)
+
+    def fix_record(v: Any, fixes: Fixes) -> Any:
+        if isinstance(v, str) and wrap is not None:
+            _count(fixes, "coerced")
+            v = {wrap: v}
+        if not isinstance(v, dict):
+            return v
+        out: Dict[str, Any] = {}
+        for key, val in v.items():
+            entry = fields.get(key)
+            if entry is None:
+                _count(fixes, "stripped")
+                continue
+            fix, optional, ok = entry
+            val = fix(val, fixes)
+            if optional and (val is None or not ok(val)):
+                _count(fixes, "dropped")
+                continue
+            out[key] = val
+        return out
+
+    return fix_record
+
+
+class LayoutRules:
+    """Compiled review rules for one layout's fieldsSchema."""
+
+    def __init__(self, layout: CompiledLayout) -> None:
+        self.layout = layout
+        self.fields: Dict[str, Tuple[Fixer, bool, Predicate]] = {
+            name: (compile_fixer(node, verbatim=name in VERBATIM), optional, pred)
+            for name, (node, optional, pred) in layout.fields.items()
+        }
+
+    def apply(self, fields: Dict[str, Any], fixes: Fixes) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        extra: List[str] = []
+        for key, val in fields.items():
+            entry = self.fields.get(key)
+            if entry is None:
+                extra.append(key)
+                continue
+            fix, optional, ok = entry
+            val = fix(val, fixes)
+            if optional and (val is None or not ok(val)):
+                _count(fixes, "dropped")
+                continue
+            out[key] = val
+        for key in extra:
+            # a misnamed list ("bullets" for "body"): an unknown key whose list fits a missing required field
+            for name in self.layout.required if isinstance(fields[key], list) else ():
+                if name in out:
+                    continue
+                fix, _, ok = self.fields[name]
+                scratch: Fixes = {}
+                val = fix(fields[key], scratch)
+                if ok(val):
+                    out[name] = val
+                    _count(fixes, "renamed")
+                    break
+            else:
+                _count(fixes, "stripped")
+        return out
+
+
+class DeckRules:
+    """Deterministic reviewer: every rule of the reviewer prompt, driven by the templates' fieldsSchema.
+
+    Per slide: layouts outside ``allowed`` are dropped; keys not in the schema are stripped (or
+    moved to a missing required field they fit); values are coerced to their schema types
+    (string, array of strings, boolean, number, enum, nested objects); Markdown and HTML are
+    removed from text; array-of-strings fields become 3-6 bullets of at most 8 words, counted
+    as whitespace-separated tokens with a letter or digit, so Ukrainian text counts like English.
+    Everything is one pass over the slide, linear in its text.
+    """
+
+    def __init__(self, compiled: CompiledTemplates) -> None:
+        self.layouts = {lk: LayoutRules(layout) for lk, layout in compiled.layouts.items()}
+
+    def review_slide(self, slide: Any, fixes: Fixes) -> Optional[Dict[str, Any]]:
+        """The reviewed copy of ``slide`` (unchanged for a layout without a schema); None for a non-slide."""
+        if not isinstance(slide, dict) or not isinstance(slide.get("layout_key"), str):
+            return None
+        lk, fields = slide["layout_key"], slide.get("fields")
+        rules = self.layouts.get(lk)
+        if rules is None or not isinstance(fields, dict):
+            return {"layout_key": lk, "fields": fields}
+        return {"layout_key": lk, "fields": rules.apply(fields, fixes)}
+
+    def review(self, slides: Any, *, allowed: Optional[Iterable[str]] = None) -> Tuple[List[Dict[str, Any]], Fixes]:
+        """(reviewed slides, fixes by kind); slides of layouts not in ``allowed`` are dropped."""
+        keep = frozenset(allowed) if allowed is not None else None
+        fixes: Fixes = {}
+        out: List[Dict[str, Any]] = []
+        for slide in slides if isinstance(slides, list) else ():
+            if keep is not None and (not isinstance(slide, dict) or slide.get("layout_key") not in keep):
+                _count(fixes, "layout")
+                continue
+            reviewed = self.review_slide(slide, fixes)
+            if reviewed is None:
+                _count(fixes, "layout")
+                continue
+            out.append(reviewed)
+        return out, fixes
+
+
+_LOCK = threading.Lock()
+_BY_DIGEST: Dict[str, DeckRules] = {}
+
+
+def deck_rules(compiled: CompiledTemplates) -> DeckRules:
+    """DeckRules for compiled templates, memoized by their digest like the templates themselves."""
+    with _LOCK:
+        hit = _BY_DIGEST.get(compiled.digest)
+    if hit is None:
+        hit = DeckRules(compiled)
+        with _LOCK:
+            _BY_DIGEST[compiled.digest] = hit
+    return hit
@@ -1,133 +1,111 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Tuple
-from pydantic import BaseModel, Field, ValidationError
-
-
-class Slide(BaseModel):
-    layout_key: str
-    fields: Dict[str, Any]
-
-
-class Deck(BaseModel):
-    slides: List[Slide]
-
-
-def _simplify_type(spec: str) -> str:
-    s = (spec or "").strip().lower()
-    if s.endswith("?"):
-        s = s[:-1].strip()
-    if s in {"string", "str"}:
-        return "string"
-    if s in {"boolean", "bool"}:
-        return "boolean"
-    if s.endswith("[]") or s.startswith("["):
-        # treat any [T] as array
-        return "array"
-    if s.startswith("{") and s.endswith("}"):
-        return "object"
-    # unknown/complex -> any
-    return "any"
-
-
-def build_layout_requirements(templates: Any) -> Dict[str, Dict[str, str]]:
-    """Return mapping: layout_key -> { field_name -> simplified_type } for required fields only."""
-    out: Dict[str, Dict[str, str]] = {}
-    if not isinstance(templates, list):
-        return out
-    for t in templates:
-        if not isinstance(t, dict):
-            continue
-        lk = t.get("layout_key")
-        fs = t.get("fieldsSchema")
-        if not isinstance(lk, str) or not isinstance(fs, dict):
-            continue
-        req: Dict[str, str] = {}
-        for name, spec in fs.items():
-            if not isinstance(name, str) or not isinstance(spec, str):
-                continue
-            if spec.strip().endswith("?"):
-                # optional
-                continue
-            req[name] = _simplify_type(spec)
-        out[lk] = req
-    return out
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
+from .fieldspec import CompiledTemplates, compile_templates
+from .jsonstream import iter_slide_file
+from .tracing import span
 
-def _is_string(x: Any) -> bool:
-    return isinstance(x, str)
 
+def _pydantic_models() -> Dict[str, Any]:
+    from pydantic import BaseModel
 
-def _is_array_of_strings(x: Any) -> bool:
-    return isinstance(x, list) and all(isinstance(i, str) for i in x)
+    class Slide(BaseModel):
+        layout_key: str
+        fields: Dict[str, Any]
 
+    class Deck(BaseModel):
+        slides: List[Slide]
 
-def validate_fields_against_requirements(layout_key: str, fields: Dict[str, Any], reqs: Dict[str, Dict[str, str]]) -> List[str]:
-    errors: List[str] = []
-    expected = reqs.get(layout_key, {})
-    for name, typ in expected.items():
-        if name not in fields:
-            errors.append(f"missing field '{name}'")
-            continue
-        val = fields[name]
-        if typ == "string" and not _is_string(val):
-            errors.append(f"field '{name}' must be string")
-        elif typ == "array" and not _is_array_of_strings(val):
-            # allow single string that can be coerced to [string]
-            if _is_string(val):
-                pass
-            else:
-                errors.append(f"field '{name}' must be array of strings")
-        elif typ == "boolean" and not isinstance(val, bool):
-            errors.append(f"field '{name}' must be boolean")
-        # object/any -> skip deep validation
-    return errors
-
-
-def try_fix_fields(layout_key: str, fields: Dict[str, Any], reqs: Dict[str, Dict[str, str]]) -> Dict[str, Any]:
-    fixed = dict(fields)
-    expected = reqs.get(layout_key, {})
-    for name, typ in expected.items():
-        if name not in fixed:
-            continue
-        val = fixed[name]
-        if typ == "string" and isinstance(val, list) and val:
-            fixed[name] = str(val[0])
-        elif typ == "array" and isinstance(val, str):
-            fixed[name] = [val]
-    return fixed
+    return {"Slide": Slide, "Deck": Deck}
+
+
+_MODELS: Dict[str, Any] = {}
+
+
+def __getattr__(name: str) -> Any:
+    # Slide/Deck pydantic models are built on first access so importing this module stays cheap;
+    # validate_deck does not need them.
+    if name in ("Slide", "Deck"):
+        if not _MODELS:
+            _MODELS.update(_pydantic_models())
+        return _MODELS[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def check_slide(slide: Any, compiled: CompiledTemplates) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Validate one slide. Returns (slide to keep or None, error text without the slide[idx] prefix or None)."""
+    if not isinstance(slide, dict):
+        return None, "not an object"
+    lk = slide.get("layout_key")
+    fields = slide.get("fields")
+    if not isinstance(lk, str) or not isinstance(fields, dict):
+        return None, "invalid layout_key/fields"
+    layout = compiled.get(lk)
+    if layout is None:
+        # unknown layouts are not ours to reject here; callers filter by allowed_layouts
+        return {"layout_key": lk, "fields": fields}, None
+    # attempt soft fix
+    fixed_fields = layout.fix(fields)
+    issues = layout.issues(fixed_fields)
+    if not issues:
+        return {"layout_key": lk, "fields": fixed_fields}, None
+    error = "; ".join(issue_message(i) for i in issues)
+    # keep slides with type problems, drop slides with missing required fields
+    if any(kind == "missing" for kind, _, _ in issues):
+        return None, error
+    return {"layout_key": lk, "fields": fixed_fields}, error
 
 
 def validate_deck(slides: List[Dict[str, Any]], templates: Any) -> Tuple[List[Dict[str, Any]], List[str]]:
-    """Validate slides with Pydantic and templates. Returns (valid_slides, errors)."""
-    errors: List[str] = []
-    # Base schema validation
-    try:
-        _ = Deck(slides=slides)
-    except ValidationError as e:
-        errors.append(f"pydantic: {e}")
-
-    # Templates-based checks
-    reqs = build_layout_requirements(templates)
-    valid: List[Dict[str, Any]] = []
-    for idx, s in enumerate(slides):
-        if not isinstance(s, dict):
-            errors.append(f"slide[{idx}] not an object")
+    """Validate slides against the compiled templates. Returns (valid_slides, errors).
+
+    Uses src/fieldspec.py (full fieldsSchema grammar, compiled once per templates hash); a deck
+    whose slides all pass the fast check is returned without building any messages.
+    """
+    with span("validate", slides=len(slides) if isinstance(slides, list) else 0) as sp:
+        compiled = compile_templates(templates)
+        if isinstance(slides, list) and all(compiled.is_valid_slide(s) for s in slides):
+            sp.set(errors=0, fast_path=True)
+            return [{"layout_key": s["layout_key"], "fields": s["fields"]} for s in slides], []
+
+        errors: List[str] = []
+        valid: List[Dict[str, Any]] = []
+        for idx, s in enumerate(slides if isinstance(slides, list) else []):
+            kept, error = check_slide(s, compiled)
+            if error:
+                errors.append(f"slide[{idx}]: {error}")
+            if kept is not None:
+                valid.append(kept)
+        if not isinstance(slides, list):
+            errors.append("slides must be a list")
+        sp.set(errors=len(errors), dropped=(len(slides) - len(valid)) if isinstance(slides, list) else 0, fast_path=False)
+        return valid, errors
+
+
+def validate_deck_file(path: Any, templates: Any) -> Iterator[Tuple[int, int, str]]:
+    """Stream-validate a deck file (.json array / {"slides": [...]} or .jsonl), yielding (index, byte_offset, error).
+
+    Slides are parsed and checked one at a time (src/jsonstream.iter_slide_file), so memory does
+    not grow with deck size and errors are available as soon as the offending slide is read.
+    An index of -1 marks a file-level problem (no slides array, truncated file).
+    """
+    compiled = compile_templates(templates)
+    for idx, offset, slide, parse_error in iter_slide_file(path):
+        if parse_error is not None:
+            yield idx, offset, parse_error if idx < 0 else f"invalid JSON: {parse_error}"
             continue
-        lk = s.get("layout_key")
-        fields = s.get("fields")
-        if not isinstance(lk, str) or not isinstance(fields, dict):
-            errors.append(f"slide[{idx}] invalid layout_key/fields")
+        if compiled.is_valid_slide(slide):
             continue
-        # attempt soft fix
-        fixed_fields = try_fix_fields(lk, fields, reqs)
-        field_errors = validate_fields_against_requirements(lk, fixed_fields, reqs)
-        if field_errors:
-            errors.append(f"slide[{idx}]: " + "; ".join(field_errors))
-            # keep, but only if basic shape is fine; otherwise drop
-            # drop slides with missing required fields
-            if any(msg.startswith("missing field") for msg in field_errors):
-                continue
-        valid.append({"layout_key": lk, "fields": fixed_fields})
-    return valid, errors
-
+        _, error = check_slide(slide, compiled)
+        if error:
+            yield idx, offset, error
+
+
+def issue_message(issue: Tuple[str, str, str]) -> str:
+    kind, name, expected = issue
+    if kind == "missing":
+        return f"missing field '{name}'"
+    if kind == "extra":
+        return f"unexpected field '{name}'"
+    return f"field '{name}' must be {expected}"
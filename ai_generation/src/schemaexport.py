@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Optional
+
+from .fieldspec import NAMED_TYPES, Node, ParsedLayout, layouts_from_templates, parse_layout
+
+JSON_SCHEMA_DRAFT = "https://json-schema.org/draft/2020-12/schema"
+
+
+def node_schema(node: Node, *, max_bullets: Optional[int] = None) -> Dict[str, Any]:
+    """JSON Schema of a fieldspec node; ``max_bullets`` caps arrays of strings (maxItems)."""
+    kind = node[0]
+    if kind in ("string", "boolean", "number", "object"):
+        return {"type": kind}
+    if kind == "enum":
+        return {"type": "string", "enum": sorted(node[1])}
+    if kind == "array":
+        out: Dict[str, Any] = {"type": "array", "items": node_schema(node[1], max_bullets=max_bullets)}
+        if max_bullets is not None and node[1][0] == "string":
+            out["maxItems"] = max_bullets
+        return out
+    if kind == "union":
+        return {"anyOf": [node_schema(n, max_bullets=max_bullets) for n in node[1]]}
+    if kind == "record":
+        return _object_schema(((name, typ, opt) for name, typ, opt in node[1]), max_bullets=max_bullets, title=node[2] if node[2] in NAMED_TYPES else None)
+    return {}
+
+
+def _object_schema(members: Iterable[Any], *, max_bullets: Optional[int], title: Optional[str] = None) -> Dict[str, Any]:
+    properties: Dict[str, Any] = {}
+    required: List[str] = []
+    for name, node, optional in members:
+        properties[name] = node_schema(node, max_bullets=max_bullets)
+        if not optional:
+            required.append(name)
+    out: Dict[str, Any] = {"type": "object"}
+    if title:
+        out["title"] = title
+    out["properties"] = properties
+    if required:
+        out["required"] = required
+    out["additionalProperties"] = False
+    return out
+
+
+def layout_schema(layout_key: str, parsed: ParsedLayout, *, max_bullets: Optional[int] = None) -> Dict[str, Any]:
+    """One branch of the deck union: {layout_key: <const>, fields: <the layout's fieldsSchema>}."""
+    fields = _object_schema(((name, node, opt) for name, (node, opt) in parsed.items()), max_bullets=max_bullets)
+    return {
+        "title": layout_key,
+        "type": "object",
+        "properties": {"layout_key": {"const": layout_key}, "fields": fields},
+        "required": ["layout_key", "fields"],
+        "additionalProperties": False,
+    }
+
+
+def _layouts(templates: Any, layout_keys: Optional[Iterable[str]]) -> Dict[str, ParsedLayout]:
+    layouts = layouts_from_templates(templates)
+    keys = list(dict.fromkeys(layout_keys)) if layout_keys is not None else list(layouts)
+    return {lk: parse_layout(layouts[lk]) for lk in keys if lk in layouts}
+
+
+def deck_json_schema(
+    templates: Any,
+    *,
+    layout_keys: Optional[Iterable[str]] = None,
+    max_slides: Optional[int] = None,
+    max_bullets: Optional[int] = None,
+) -> Dict[str, Any]:
+    """JSON Schema (draft 2020-12) of a deck {"slides": [...]}: each slide is a union of the
+    layouts' schemas discriminated by ``layout_key``.
+
+    Without the optional caps it accepts exactly the slides schema.validate_deck() does, minus
+    keys not in a layout's fieldsSchema (which the reviewer strips anyway).
+    """
+    branches = [layout_schema(lk, parsed, max_bullets=max_bullets) for lk, parsed in _layouts(templates, layout_keys).items()]
+    slides: Dict[str, Any] = {"type": "array", "items": {"oneOf": branches, "discriminator": {"propertyName": "layout_key"}}}
+    if max_slides is not None:
+        slides["maxItems"] = max_slides
+    return {
+        "$schema": JSON_SCHEMA_DRAFT,
+        "title": "Slides deck",
+        "type": "object",
+        "properties": {"title": {"type": "string"}, "slides": slides},
+        "required": ["slides"],
+        "additionalProperties": False,
+    }
+
+
+# ----- Gemini response_schema -----
+# The google-generativeai Schema message has no anyOf/oneOf, const or additionalProperties, so
+# to_gemini() flattens the union: layout_key becomes an enum and fields one object holding every
+# layout's fields (all optional, one type per name, arrays preferred). Which fields belong to which
+# layout goes into each property's description (and the prompt); the rule-based reviewer strips the rest.
+
+
+def to_gemini(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Gemini ``response_schema`` equivalent of a schema from deck_json_schema()."""
+    if "oneOf" in schema:
+        return _flatten(schema["oneOf"], (schema.get("discriminator") or {}).get("propertyName"))
+    if "anyOf" in schema:
+        # string|string[] -> the list (bullets); otherwise the first alternative
+        arrays = [s for s in schema["anyOf"] if s.get("type") == "array"]
+        return to_gemini(arrays[0] if arrays else schema["anyOf"][0])
+    if "const" in schema:
+        return {"type": "string", "enum": [schema["const"]]}
+    typ = schema.get("type")
+    if typ is None or (typ == "object" and not schema.get("properties")):
+        # untyped members (names, roles, photo paths) are strings in every deck
+        return {"type": "string"}
+    out: Dict[str, Any] = {"type": typ}
+    if "enum" in schema:
+        out["enum"] = list(schema["enum"])
+    if "description" in schema:
+        out["description"] = schema["description"]
+    if typ == "array":
+        out["items"] = to_gemini(schema.get("items") or {})
+        if "maxItems" in schema:
+            out["max_items"] = schema["maxItems"]
+    if typ == "object":
+        out["properties"] = {name: to_gemini(sub) for name, sub in schema["properties"].items()}
+        if schema.get("required"):
+            out["required"] = list(schema["required"])
+    return out
+
+
+def _flatten(branches: List[Dict[str, Any]], disc: Optional[str]) -> Dict[str, Any]:
+    labels = [b["properties"][disc]["const"] if disc else b.get("title", str(i)) for i, b in enumerate(branches)]
+    merged: Dict[str, List[Any]] = {}
+    for label, branch in zip(labels, branches):
+        for name, sub in branch.get("properties", {}).items():
+            if name != disc:
+                merged.setdefault(name, []).append((label, sub, name in branch.get("required", ())))
+    properties: Dict[str, Any] = {disc: {"type": "string", "enum": labels}} if disc else {}
+    for name, subs in merged.items():
+        if len(subs) > 1 and all(sub.get("type") == "object" and sub.get("properties") for _, sub, _ in subs):
+            properties[name] = _merge_objects([(label, sub) for label, sub, _ in subs])
+        else:
+            properties[name] = to_gemini(_preferred([sub for _, sub, _ in subs]))
+    required = ([disc] if disc else []) + [n for n, subs in merged.items() if len(subs) == len(branches) and all(r for _, _, r in subs)]
+    return {"type": "object", "properties": properties, "required": required}
+
+
+def _merge_objects(subs: List[Any]) -> Dict[str, Any]:
+    """One object with the properties of all ``subs`` (one per layout), described by the layouts using them."""
+    members: Dict[str, List[Dict[str, Any]]] = {}
+    used_by: Dict[str, List[str]] = {}
+    for label, sub in subs:
+        required = set(sub.get("required", ()))
+        for name, prop in sub["properties"].items():
+            members.setdefault(name, []).append(prop)
+            used_by.setdefault(name, []).append(label + (" (required)" if name in required else ""))
+    properties = {}
+    for name, props in members.items():
+        properties[name] = dict(to_gemini(_preferred(props)), description="Layouts: " + "; ".join(used_by[name]))
+    return {"type": "object", "properties": properties}
+
+
+def _preferred(schemas: List[Dict[str, Any]]) -> Dict[str, Any]:
+    for sub in schemas:
+        if sub.get("type") == "array" or any(a.get("type") == "array" for a in sub.get("anyOf", ())):
+            return sub
+    return schemas[0]
+
+
+def gemini_response_schema(templates: Any, **caps: Any) -> Dict[str, Any]:
+    """to_gemini(deck_json_schema(templates, **caps))."""
+    return to_gemini(deck_json_schema(templates, **caps))
+
+
+def check(schema: Dict[str, Any], value: Any, path: str = "$") -> List[str]:
+    """Errors of ``value`` against the subset of JSON Schema deck_json_schema() emits.
+
+    Dependency-free, so decks can be checked where the ``jsonschema`` package is not installed.
+    """
+    errors: List[str] = []
+    if "const" in schema and value != schema["const"]:
+        errors.append(f"{path}: expected {schema['const']!r}")
+    if "enum" in schema and value not in schema["enum"]:
+        errors.append(f"{path}: not one of {schema['enum']}")
+    typ = schema.get("type")
+    if typ is not None and not _TYPES[typ](value):
+        return errors + [f"{path}: expected {typ}"]
+    if "anyOf" in schema and not any(not check(s, value, path) for s in schema["anyOf"]):
+        errors.append(f"{path}: matches no alternative")
+    if "oneOf" in schema:
+        disc = (schema.get("discriminator") or {}).get("propertyName")
+        branches = schema["oneOf"]
+        if disc and isinstance(value, dict):
+            branches = [s for s in branches if s["properties"][disc].get("const") == value.get(disc)]
+            if not branches:
+                return errors + [f"{path}.{disc}: unknown {value.get(disc)!r}"]
+        found = [check(s, value, path) for s in branches]
+        if sum(1 for e in found if not e) != 1:
+            errors.extend(min(found, key=len) if found else [f"{path}: matches no branch"])
+    if isinstance(value, dict):
+        props = schema.get("properties", {})
+        for name in schema.get("required", ()):
+            if name not in value:
+                errors.append(f"{path}: missing '{name}'")
+        for name, item in value.items():
+            if name in props:
+                errors.extend(check(props[name], item, f"{path}.{name}"))
+            elif schema.get("additionalProperties") is False:
+                errors.append(f"{path}: unexpected '{name}'")
+    if isinstance(value, list):
+        if "maxItems" in schema and len(value) > schema["maxItems"]:
+            errors.append(f"{path}: more than {schema['maxItems']} items")
+        if "items" in schema:
+            for i, item in enumerate(value):
+                errors.extend(check(schema["items"], item, f"{path}[{i}]"))
+    return errors
+
+
+_TYPES = {
+    "string": lambda v: isinstance(v, str),
+    "boolean": lambda v: isinstance(v, bool),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+}
@@ -0,0 +1,328 @@
+from __future__ import annotations
+
+import itertools
+import json
+import queue
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from .batch import BatchItem, generate_with_fallback
+from .cache import ResponseCache
+from .config import Settings
+from .generator import DataContext
+from .providers import default_pool
+
+# job lifecycle: queued -> running -> done | failed; queued jobs can be cancelled
+TERMINAL = ("done", "failed", "cancelled")
+
+
+@dataclass
+class Job:
+    id: str
+    item: BatchItem
+    priority: int = 0
+    status: str = "queued"
+    created: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    result: Optional[List[Dict[str, Any]]] = None
+    outcome: Optional[str] = None  # ok | stub (see batch.generate_with_fallback)
+    error: Optional[str] = None
+    stages: Optional[Dict[str, Any]] = None
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "topic": self.item.topic,
+            "lang": self.item.lang,
+            "max_slides": self.item.max_slides,
+            "priority": self.priority,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "queue_time": round((self.started or time.time()) - self.created, 3) if self.status != "cancelled" else None,
+            "run_time": round(self.finished - self.started, 3) if self.started and self.finished else None,
+            "outcome": self.outcome,
+            "slides": len(self.result) if self.result is not None else None,
+            "error": self.error,
+            "stages": self.stages,
+        }
+
+
+class QueueFull(Exception):
+    pass
+
+
+class GenerationServer:
+    """Warm generation service: one DataContext, one provider pool and cache, a bounded priority queue
+    and a pool of worker threads. Lower ``priority`` values run first; ties run in submission order.
+    """
+
+    def __init__(
+        self,
+        *,
+        ctx: DataContext,
+        settings: Settings,
+        workers: int = 2,
+        queue_size: int = 100,
+        max_calls: int = 3,
+        offline: bool = False,
+        cache: Optional[ResponseCache] = None,
+        options: Optional[Dict[str, Any]] = None,
+        keep_jobs: int = 1000,
+        verbose: bool = False,
+    ) -> None:
+        self.ctx = ctx
+        self.settings = settings
+        self.max_calls = max_calls
+        self.offline = offline
+        self.cache = cache
+        self.options = dict(options or {})
+        self.keep_jobs = keep_jobs
+        self.verbose = verbose
+        self.started = time.time()
+        # unbounded: capacity counts live queued jobs, so cancelled entries still waiting to be popped hold no slot
+        self.queue_size = max(1, queue_size)
+        self._queue: "queue.PriorityQueue[Tuple[int, int, str]]" = queue.PriorityQueue()
+        self._queued = 0
+        self._seq = itertools.count()
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._workers = [
+            threading.Thread(target=self._work, name=f"deck-worker-{i}", daemon=True) for i in range(max(1, workers))
+        ]
+        self.completed = 0
+        self.failed = 0
+
+    # ----- lifecycle -----
+
+    def start(self) -> None:
+        for t in self._workers:
+            t.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        for _ in self._workers:
+            self._queue.put_nowait((-(1 << 30), next(self._seq), ""))  # wake-up sentinel
+        for t in self._workers:
+            t.join(timeout)
+
+    # ----- jobs -----
+
+    def submit(self, item: BatchItem, *, priority: int = 0) -> Job:
+        job = Job(id=uuid.uuid4().hex[:12], item=item, priority=priority)
+        with self._lock:
+            if self._queued >= self.queue_size:
+                raise QueueFull(f"queue is full ({self.queue_size} jobs)")
+            self._queued += 1
+            self._jobs[job.id] = job
+            self._trim()
+            self._queue.put_nowait((priority, next(self._seq), job.id))
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.status == "queued":
+                job.status = "cancelled"
+                job.finished = time.time()
+                self._queued -= 1
+            return job
+
+    def jobs(self) -> List[Job]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def health(self) -> Dict[str, Any]:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        info = {
+            "status": "ok",
+            "uptime": round(time.time() - self.started, 1),
+            "workers": len(self._workers),
+            "queue_size": self.queue_size,
+            "queued": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+            "jobs": counts,
+            "completed": self.completed,
+            "failed": self.failed,
+            "offline": self.offline,
+            "layouts": len(self.ctx.allowed_layouts),
+        }
+        if self.cache is not None:
+            info["cache"] = self.cache.stats.as_dict()
+        info["breakers"] = default_pool().breakers.snapshot()
+        return info
+
+    def _trim(self) -> None:
+        # forget the oldest finished jobs beyond keep_jobs
+        excess = len(self._jobs) - self.keep_jobs
+        if excess <= 0:
+            return
+        for job_id in [j.id for j in self._jobs.values() if j.status in TERMINAL][:excess]:
+            del self._jobs[job_id]
+
+    def _work(self) -> None:
+        while not self._stop.is_set():
+            _, _, job_id = self._queue.get()
+            if not job_id:
+                continue
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None or job.status != "queued":
+                    continue
+                self._queued -= 1
+                job.status = "running"
+                job.started = time.time()
+            run_stats: Dict[str, Any] = {}
+            try:
+                slides, outcome, error = generate_with_fallback(
+                    job.item, ctx=self.ctx, settings=self.settings, max_calls=self.max_calls, offline=self.offline,
+                    cache=self.cache, options=self.options, verbose=self.verbose, run_stats=run_stats,
+                )
+                with self._lock:
+                    job.result, job.outcome, job.error, job.status = slides, outcome, error, "done"
+                    self.completed += 1
+            except Exception as e:
+                with self._lock:
+                    job.error, job.status = str(e), "failed"
+                    self.failed += 1
+            finally:
+                with self._lock:
+                    job.finished = time.time()
+                    job.stages = run_stats.get("stages")
+            if self.verbose:
+                print(f"[server] {job.id} {job.status} in {job.finished - job.started:.2f}s: {job.item.topic[:60]}")
+
+
+def _item_from_payload(payload: Dict[str, Any]) -> Tuple[BatchItem, int]:
+    topic = str(payload.get("topic") or "").strip()
+    if not topic:
+        raise ValueError("'topic' is required")
+    item = BatchItem(topic=topic)
+    if payload.get("lang"):
+        item.lang = str(payload["lang"])
+    if payload.get("max_slides") is not None:
+        item.max_slides = max(1, int(payload["max_slides"]))
+    if payload.get("max_calls") is not None:
+        item.max_calls = int(payload["max_calls"])
+    return item, int(payload.get("priority") or 0)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "SlidesGenerator/1.0"
+    service: GenerationServer  # set on the subclass built by make_http_server
+    allow_origins: FrozenSet[str] = frozenset()  # origins that may call the API from a browser ("*" = any)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if self.service.verbose:
+            sys.stderr.write("[http] " + format % args + "\n")
+
+    def _send(self, code: int, body: Any) -> None:
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self._cors()
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _parts(self) -> List[str]:
+        return [p for p in self.path.split("?", 1)[0].split("/") if p]
+
+    def _cors(self) -> bool:
+        # no CORS headers unless the page's origin is allowed: any other site the user has open
+        # could otherwise submit jobs that spend the provider quota and read the decks back
+        origin = self.headers.get("Origin")
+        if not origin or not (origin in self.allow_origins or "*" in self.allow_origins):
+            return False
+        self.send_header("Access-Control-Allow-Origin", origin)
+        self.send_header("Vary", "Origin")
+        return True
+
+    def do_OPTIONS(self) -> None:
+        self.send_response(204)
+        if self._cors():
+            self.send_header("Access-Control-Allow-Methods", "GET, POST, DELETE, OPTIONS")
+            self.send_header("Access-Control-Allow-Headers", "Content-Type")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self) -> None:
+        parts = self._parts()
+        if parts == ["health"]:
+            return self._send(200, self.service.health())
+        if parts == ["jobs"]:
+            return self._send(200, [j.summary() for j in self.service.jobs()])
+        if len(parts) in (2, 3) and parts[0] == "jobs":
+            job = self.service.get(parts[1])
+            if job is None:
+                return self._send(404, {"error": "unknown job"})
+            if len(parts) == 2:
+                return self._send(200, job.summary())
+            if parts[2] == "result":
+                if job.status == "done":
+                    # the same array the SPA loads from data/slides_*.json
+                    return self._send(200, job.result)
+                if job.status in TERMINAL:
+                    return self._send(410 if job.status == "cancelled" else 500, job.summary())
+                return self._send(202, job.summary())
+        self._send(404, {"error": "not found"})
+
+    def do_POST(self) -> None:
+        if self._parts() != ["jobs"]:
+            return self._send(404, {"error": "not found"})
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            payload = json.loads(self.rfile.read(length).decode("utf-8") or "{}")
+            if not isinstance(payload, dict):
+                raise ValueError("expected a JSON object")
+            item, priority = _item_from_payload(payload)
+        except (ValueError, TypeError) as e:
+            return self._send(400, {"error": str(e)})
+        try:
+            job = self.service.submit(item, priority=priority)
+        except QueueFull as e:
+            return self._send(503, {"error": str(e)})
+        self._send(202, job.summary())
+
+    def do_DELETE(self) -> None:
+        parts = self._parts()
+        if len(parts) != 2 or parts[0] != "jobs":
+            return self._send(404, {"error": "not found"})
+        job = self.service.cancel(parts[1])
+        if job is None:
+            return self._send(404, {"error": "unknown job"})
+        self._send(200 if job.status == "cancelled" else 409, job.summary())
+
+
+def make_http_server(
+    service: GenerationServer, host: str = "127.0.0.1", port: int = 8765, *, allow_origins: Iterable[str] = ()
+) -> ThreadingHTTPServer:
+    """HTTP front end for ``service``:
+
+    POST /jobs {topic, lang?, max_slides?, max_calls?, priority?} -> 202 job (503 when the queue is full)
+    GET /jobs, GET /jobs/<id>, GET /jobs/<id>/result (202 while pending, slides array when done)
+    DELETE /jobs/<id> cancels a queued job; GET /health reports queue depth and counters.
+
+    Browsers may call it only from ``allow_origins`` (e.g. http://localhost:8000 serving the SPA; none by default).
+    """
+    origins = frozenset(o.rstrip("/") for o in allow_origins if o)
+    handler = type("Handler", (_Handler,), {"service": service, "allow_origins": origins})
+    httpd = ThreadingHTTPServer((host, port), handler)
+    httpd.daemon_threads = True
+    return httpd
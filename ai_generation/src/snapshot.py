@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from .generator import DataContext, build_datacontext
+
+SNAPSHOT_VERSION = 1
+
+
+def _stat(path: Path) -> Tuple[int, int]:
+    st = path.stat()
+    return st.st_size, st.st_mtime_ns
+
+
+def _sha256(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def _source_info(path: Path) -> Dict[str, Any]:
+    size, mtime_ns = _stat(path)
+    return {"path": str(path), "size": size, "mtime_ns": mtime_ns, "sha256": _sha256(path)}
+
+
+def snapshot_path(cache_dir: Path, templates_path: Path, themes_path: Path) -> Path:
+    key = hashlib.sha1(f"{templates_path.resolve()}|{themes_path.resolve()}".encode("utf-8")).hexdigest()[:16]
+    return cache_dir / f"context-{key}.pickle"
+
+
+def _fresh(sources: Dict[str, Dict[str, Any]], paths: Dict[str, Path]) -> Optional[bool]:
+    """True = unchanged by stat, False = stat differs but content hash matches, None = stale."""
+    same_stat = True
+    for name, path in paths.items():
+        info = sources.get(name) or {}
+        if (info.get("size"), info.get("mtime_ns")) == _stat(path):
+            continue
+        same_stat = False
+        if info.get("sha256") != _sha256(path):
+            return None
+    return same_stat
+
+
+def _restore(data: Dict[str, Any]) -> DataContext:
+    from .fieldspec import compile_layouts, remember_templates
+
+    ctx = DataContext(templates=data["templates"], themes=data["themes"], allowed_layouts=data["allowed_layouts"])
+    ctx._digest_lines = data["digest_lines"]
+    compiled = compile_layouts(data["layouts"], digest=data["layouts_digest"], parsed=data["parsed_layouts"])
+    remember_templates(ctx.templates, compiled)
+    return ctx
+
+
+def _build(paths: Dict[str, Path]) -> Tuple[DataContext, Dict[str, Any]]:
+    from .fieldspec import layouts_digest, layouts_from_templates, parse_layout
+
+    sources = {name: _source_info(path) for name, path in paths.items()}
+    templates = json.loads(paths["templates"].read_text(encoding="utf-8-sig"))
+    themes = json.loads(paths["themes"].read_text(encoding="utf-8-sig"))
+    ctx = build_datacontext(templates, themes)
+    layouts = layouts_from_templates(templates)
+    data = {
+        "version": SNAPSHOT_VERSION,
+        "sources": sources,
+        "templates": templates,
+        "themes": themes,
+        "allowed_layouts": ctx.allowed_layouts,
+        "digest_lines": ctx.digest_lines(),
+        "layouts": layouts,
+        "layouts_digest": layouts_digest(layouts),
+        "parsed_layouts": {lk: parse_layout(fs) for lk, fs in layouts.items()},
+    }
+    return _restore(data), data
+
+
+def _write(path: Path, data: Dict[str, Any]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-", suffix=".pickle")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def load_datacontext_snapshot(templates_path, themes_path, cache_dir, *, verbose: bool = False) -> DataContext:
+    """load_datacontext() backed by an on-disk snapshot of the parsed and derived context.
+
+    The snapshot keeps the parsed templates/themes, allowed layouts, prompt digest lines and the
+    parsed fieldsSchema nodes. It is reused while both source files keep their size and mtime; if
+    those changed but the sha256 still matches, the snapshot is re-stamped instead of rebuilt.
+    Any problem reading or writing the snapshot falls back to a normal load.
+    """
+    paths = {"templates": Path(templates_path), "themes": Path(themes_path)}
+    snap = snapshot_path(Path(cache_dir), paths["templates"], paths["themes"])
+    try:
+        with open(snap, "rb") as f:
+            data = pickle.load(f)
+        if data.get("version") == SNAPSHOT_VERSION:
+            state = _fresh(data["sources"], paths)
+            if state is not None:
+                if state is False:
+                    for name, path in paths.items():
+                        data["sources"][name]["size"], data["sources"][name]["mtime_ns"] = _stat(path)
+                    _write(snap, data)
+                if verbose:
+                    print(f"[context] snapshot {snap.name} reused")
+                return _restore(data)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        if verbose:
+            print(f"[context] snapshot unreadable ({e}); rebuilding")
+    ctx, data = _build(paths)
+    try:
+        _write(snap, data)
+    except OSError as e:
+        if verbose:
+            print(f"[context] cannot write snapshot ({e})")
+    return ctx
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import math
+import re
+from typing import Callable, Optional
+
+# Word-ish pieces the way BPE tokenizers split text: runs of letters/digits, or single symbols.
+_PIECES = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+_ENCODER: Optional[Callable[[str], int]] = None
+_ENCODER_LOADED = False
+
+
+def _load_encoder() -> Optional[Callable[[str], int]]:
+    global _ENCODER, _ENCODER_LOADED
+    if not _ENCODER_LOADED:
+        _ENCODER_LOADED = True
+        try:
+            import tiktoken  # optional; the heuristic below is used without it
+            enc = tiktoken.get_encoding("cl100k_base")
+            _ENCODER = lambda text: len(enc.encode(text))
+        except Exception:
+            _ENCODER = None
+    return _ENCODER
+
+
+def heuristic_tokens(text: str) -> int:
+    """Tokenizer-free estimate: ~4 chars per token for ASCII words, ~2.5 for Cyrillic and other scripts."""
+    total = 0
+    for piece in _PIECES.findall(text):
+        if piece.isascii():
+            total += max(1, math.ceil(len(piece) / 4))
+        else:
+            total += max(1, math.ceil(len(piece) / 2.5))
+    return total
+
+
+def estimate_tokens(text: str) -> int:
+    """Prompt size in tokens: exact cl100k count when tiktoken is installed, otherwise heuristic_tokens()."""
+    if not text:
+        return 0
+    encoder = _load_encoder()
+    return encoder(text) if encoder is not None else heuristic_tokens(text)
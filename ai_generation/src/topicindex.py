@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import functools
+import hashlib
+import json
+import operator
+import os
+import random
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from .update import normalize_title
+
+NGRAM = 3
+PERMUTATIONS = 64
+# LSH: 10 bands of 6 rows collide for ~95% of pairs at Jaccard 0.8, ~86% at 0.75 and ~15% at 0.5,
+# which keeps candidate lists short even among tens of thousands of similar-sounding topics
+BANDS = 10
+_ROWS = 6
+_RESCORE = 8  # candidates (best signature agreement first) scored by exact Jaccard per lookup
+_PRIME = (1 << 61) - 1
+_rng = random.Random(0x5EED)  # fixed, so signatures written by one process are valid in every other
+_PERMS: Tuple[Tuple[int, int], ...] = tuple((_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(PERMUTATIONS))
+
+
+def shingles(topic: str, n: int = NGRAM) -> FrozenSet[str]:
+    """Character n-grams of the normalized topic (word boundaries padded with a space).
+
+    Works on any script: normalize_title() folds case, NFKC forms, "ё" and punctuation, so
+    "Штучний інтелект у освіті" and "штучний інтелект в освіті!" share most of their grams.
+    """
+    text = f" {normalize_title(topic)} "
+    if len(text) <= n:
+        return frozenset({text})
+    return frozenset(text[i:i + n] for i in range(len(text) - n + 1))
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def _gram_hashes(gram: str) -> Tuple[int, ...]:
+    # the trigram vocabulary of real topics is small, so nearly every gram is a cache hit
+    x = int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=8).digest(), "little")
+    return tuple((a * x + b) % _PRIME for a, b in _PERMS)
+
+
+def minhash(grams: Iterable[str]) -> Tuple[int, ...]:
+    rows = [_gram_hashes(g) for g in grams]
+    if not rows:
+        return (0,) * PERMUTATIONS
+    return tuple(map(min, zip(*rows)))
+
+
+def _band_keys(signature: Tuple[int, ...]) -> List[int]:
+    return [hash(signature[i * _ROWS:(i + 1) * _ROWS]) for i in range(BANDS)]
+
+
+def _layouts(plan: Dict[str, Any]) -> FrozenSet[str]:
+    outline = plan.get("outline")
+    items = outline if isinstance(outline, list) else []
+    return frozenset(sys.intern(str(it.get("layout_key"))) for it in items if isinstance(it, dict))
+
+
+@dataclass(frozen=True)
+class TopicEntry:
+    topic: str
+    lang: str
+    max_slides: int
+    signature: Tuple[int, ...]
+    layouts: FrozenSet[str]
+    plan: Optional[Dict[str, Any]] = None  # kept in memory only without a file; else read at ``offset``
+    offset: int = -1
+
+
+@dataclass(frozen=True)
+class TopicMatch:
+    topic: str
+    similarity: float  # exact Jaccard of the n-gram sets
+    plan: Dict[str, Any]
+
+
+class TopicIndex:
+    """Plans of past decks looked up by near-duplicate topic (MinHash + LSH over character n-grams).
+
+    Entries live in an append-only JSON-lines file (in memory only without ``path``) that several
+    processes may share: each appends whole lines and picks up the others' on its next lookup.
+    Only topics, signatures and layout keys stay in memory; the plan is read back for the match.
+    A lookup hashes the query once and scores only the entries sharing an LSH band with it,
+    so its cost barely grows with the number of entries (see bench/topics.py).
+    """
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        self.path = Path(path) if path else None
+        self._lock = threading.Lock()
+        self._entries: List[TopicEntry] = []
+        self._bands: List[Dict[int, List[int]]] = [{} for _ in range(BANDS)]
+        self._latest: Dict[Tuple[str, str, int], int] = {}
+        self._offset = 0
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._refresh()
+
+    def __len__(self) -> int:
+        return len(self._latest)
+
+    def _insert(self, entry: TopicEntry) -> None:
+        idx = len(self._entries)
+        self._entries.append(entry)
+        for band, key in zip(self._bands, _band_keys(entry.signature)):
+            band.setdefault(key, []).append(idx)
+        # a newer plan for the same topic supersedes the older one
+        self._latest[(normalize_title(entry.topic), entry.lang, entry.max_slides)] = idx
+
+    def _refresh(self) -> None:
+        """Load lines appended to the file (by this or another process) since the last read."""
+        if self.path is None:
+            return
+        try:
+            if self.path.stat().st_size <= self._offset:
+                return
+            with self.path.open("rb") as f:
+                f.seek(self._offset)
+                data = f.read()
+        except OSError:
+            return
+        end = data.rfind(b"\n") + 1  # a line still being written is picked up next time
+        pos = 0
+        while pos < end:
+            nl = data.index(b"\n", pos)
+            offset, line, pos = self._offset + pos, data[pos:nl], nl + 1
+            try:
+                raw = json.loads(line)
+                entry = TopicEntry(
+                    topic=str(raw["topic"]),
+                    lang=str(raw["lang"]),
+                    max_slides=int(raw["max_slides"]),
+                    signature=tuple(int(v) for v in raw["signature"]),
+                    layouts=_layouts(raw["plan"]),
+                    offset=offset,
+                )
+            except (ValueError, KeyError, TypeError, AttributeError):
+                continue
+            if len(entry.signature) == PERMUTATIONS:
+                self._insert(entry)
+        self._offset += end
+
+    def _plan(self, entry: TopicEntry) -> Optional[Dict[str, Any]]:
+        if entry.plan is not None or self.path is None:
+            return entry.plan
+        try:
+            with self.path.open("rb") as f:
+                f.seek(entry.offset)
+                plan = json.loads(f.readline())["plan"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        return plan if isinstance(plan, dict) else None
+
+    def add(self, topic: str, *, lang: str, max_slides: int, plan: Dict[str, Any]) -> None:
+        signature = minhash(shingles(topic))
+        with self._lock:
+            if self.path is None:
+                self._insert(TopicEntry(topic, lang, int(max_slides), signature, _layouts(plan), plan=plan))
+                return
+            line = json.dumps(
+                {"topic": topic, "lang": lang, "max_slides": int(max_slides), "plan": plan,
+                 "created": round(time.time(), 3), "signature": list(signature)},
+                ensure_ascii=False,
+            ) + "\n"
+            # one O_APPEND write per entry, so concurrent writers never interleave lines
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line.encode("utf-8"))
+            finally:
+                os.close(fd)
+            self._refresh()
+
+    def lookup(
+        self,
+        topic: str,
+        *,
+        lang: str,
+        max_slides: int,
+        allowed_layouts: Optional[Iterable[str]] = None,
+    ) -> Optional[TopicMatch]:
+        """Most similar stored topic with the same lang and max_slides whose plan only uses
+        ``allowed_layouts``; None when no entry shares an LSH band with the query."""
+        grams = shingles(topic)
+        signature = minhash(grams)
+        keys = _band_keys(signature)
+        allowed = frozenset(allowed_layouts) if allowed_layouts is not None else None
+        with self._lock:
+            self._refresh()
+            candidates = {idx for band, key in zip(self._bands, keys) for idx in band.get(key, ())}
+            # rank by signature agreement (an estimate of Jaccard), then score only the top few exactly
+            ranked: List[Tuple[int, int]] = []
+            for idx in candidates:
+                entry = self._entries[idx]
+                if entry.lang != lang or entry.max_slides != max_slides:
+                    continue
+                if allowed is not None and not entry.layouts <= allowed:
+                    continue  # templates changed since this plan was made
+                ranked.append((sum(map(operator.eq, signature, entry.signature)), idx))
+            ranked.sort(reverse=True)
+            best: Optional[Tuple[float, TopicEntry]] = None
+            for _, idx in ranked[:_RESCORE]:
+                entry = self._entries[idx]
+                if self._latest.get((normalize_title(entry.topic), lang, entry.max_slides)) != idx:
+                    continue
+                score = jaccard(grams, shingles(entry.topic))
+                if best is None or score > best[0]:
+                    best = (score, entry)
+            if best is None:
+                return None
+            plan = self._plan(best[1])
+        return TopicMatch(best[1].topic, best[0], plan) if plan is not None else None
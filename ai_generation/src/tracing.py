@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+import contextvars
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Spans nest through a context variable, so children created in asyncio tasks spawned by a stage
+# attach to it. The sink (Tracer) is process-wide: the pipeline runs on the shared provider loop
+# thread, which does not inherit the caller's context.
+_CURRENT: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+_TRACER: Optional["Tracer"] = None
+
+# histogram buckets (seconds) for stage / call durations
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start", "duration", "attrs", "error")
+
+    def __init__(self, name: str, parent: Optional["Span"], attrs: Dict[str, Any]) -> None:
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex[:16]
+        self.span_id = uuid.uuid4().hex[:8]
+        self.parent_id = parent.span_id if parent is not None else None
+        self.start = time.time()
+        self.duration = 0.0
+        self.attrs = attrs
+        self.error: Optional[str] = None
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def as_dict(self) -> Dict[str, Any]:
+        out = {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": round(self.start, 6),
+            "duration": round(self.duration, 6),
+            "attrs": self.attrs,
+        }
+        if self.error is not None:
+            out["error"] = self.error
+        return out
+
+
+class _NoopSpan:
+    def set(self, **attrs: Any) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Metrics:
+    """Counters and histograms derived from finished spans, rendered in Prometheus text format."""
+
+    def __init__(self) -> None:
+        self.counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self.histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], List[float]] = {}  # bucket counts + [sum, count]
+        self.help: Dict[str, Tuple[str, str]] = {}
+
+    def inc(self, name: str, value: float = 1.0, help: str = "", **labels: Any) -> None:
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        self.counters[key] = self.counters.get(key, 0.0) + value
+        self.help.setdefault(name, ("counter", help))
+
+    def observe(self, name: str, value: float, help: str = "", **labels: Any) -> None:
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        h = self.histograms.get(key)
+        if h is None:
+            h = self.histograms[key] = [0.0] * (len(BUCKETS) + 2)
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                h[i] += 1
+        h[-2] += value
+        h[-1] += 1
+        self.help.setdefault(name, ("histogram", help))
+
+    @staticmethod
+    def _labels(labels: Tuple[Tuple[str, str], ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+        pairs = labels + extra
+        if not pairs:
+            return ""
+        body = ",".join(f'{k}="{v.replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in pairs)
+        return "{" + body + "}"
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for name in sorted(self.help):
+            kind, help = self.help[name]
+            lines.append(f"# HELP {name} {help or name}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "counter":
+                for (n, labels), value in sorted(self.counters.items()):
+                    if n == name:
+                        lines.append(f"{name}{self._labels(labels)} {value:g}")
+            else:
+                for (n, labels), h in sorted(self.histograms.items()):
+                    if n != name:
+                        continue
+                    for i, bound in enumerate(BUCKETS):
+                        lines.append(f"{name}_bucket{self._labels(labels, (('le', f'{bound:g}'),))} {h[i]:g}")
+                    lines.append(f"{name}_bucket{self._labels(labels, (('le', '+Inf'),))} {h[-1]:g}")
+                    lines.append(f"{name}_sum{self._labels(labels)} {h[-2]:.6f}")
+                    lines.append(f"{name}_count{self._labels(labels)} {h[-1]:g}")
+        return "\n".join(lines) + "\n"
+
+
+class Tracer:
+    """Collects spans: appends them to a JSON-lines file and folds them into Prometheus metrics.
+
+    The metrics file is rewritten (atomically) whenever a root span, i.e. one deck, finishes.
+    """
+
+    def __init__(self, trace_path: Optional[str] = None, metrics_path: Optional[str] = None) -> None:
+        self.trace_path = Path(trace_path) if trace_path else None
+        self.metrics_path = Path(metrics_path) if metrics_path else None
+        self.metrics = Metrics()
+        self._lock = threading.Lock()
+        self._file = None
+        if self.trace_path is not None:
+            self.trace_path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.trace_path, "a", encoding="utf-8")
+
+    def record(self, span: Span) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.write(json.dumps(span.as_dict(), ensure_ascii=False, default=str) + "\n")
+                self._file.flush()
+            self._fold(span)
+            if span.parent_id is None:
+                self.write_metrics()
+
+    def _fold(self, span: Span) -> None:
+        m, a = self.metrics, span.attrs
+        if span.name == "provider.call":
+            labels = {"provider": a.get("provider", ""), "stage": a.get("stage", "")}
+            outcome = "cache_hit" if a.get("cache") == "hit" else ("error" if span.error else "ok")
+            m.inc("slides_provider_calls_total", help="Provider calls by outcome (cache_hit, ok, error)", outcome=outcome, **labels)
+            if a.get("cache") != "hit":
+                m.observe("slides_provider_call_seconds", span.duration, help="Provider call latency", **labels)
+            m.inc("slides_prompt_tokens_total", a.get("prompt_tokens", 0), help="Estimated prompt tokens sent", **labels)
+            m.inc("slides_response_tokens_total", a.get("response_tokens", 0), help="Estimated response tokens received", **labels)
+            if "parse_seconds" in a:
+                m.observe("slides_json_extract_seconds", a["parse_seconds"], help="Time spent extracting/parsing JSON from responses", stage=labels["stage"])
+            if a.get("truncated"):
+                m.inc("slides_truncated_responses_total", help="Responses cut off before their JSON closed (complete part salvaged)", **labels)
+            if a.get("retries"):
+                m.inc("slides_provider_retries_total", a["retries"], help="Retries of transient provider errors", **labels)
+            if "wait_seconds" in a:
+                m.inc("slides_rate_limit_wait_seconds_total", a["wait_seconds"], help="Time spent waiting for rate limit budget", **labels)
+        elif span.name == "stage":
+            stage, provider = a.get("stage", ""), a.get("provider", "")
+            m.observe("slides_stage_seconds", span.duration, help="Pipeline stage wall time", stage=stage, provider=provider)
+            if provider == "fallback":
+                m.inc("slides_stage_fallbacks_total", help="Stages that ended in the local fallback", stage=stage)
+            if a.get("wait_seconds"):
+                m.inc("slides_stage_rate_limit_wait_seconds_total", a["wait_seconds"], help="Time a stage's calls queued for rate limit budget", stage=stage)
+            for name in a.get("circuit_open") or ():
+                m.inc("slides_circuit_open_skips_total", help="Stages that skipped a provider because its circuit breaker was open", stage=stage, provider=name)
+            if a.get("hedged"):
+                m.inc("slides_stage_hedged_total", help="Stages where a hedge request was fired", stage=stage)
+        elif span.name == "review.partial":
+            m.inc("slides_review_slides_sent_total", a.get("sent", 0), help="Slides sent to the reviewer model (only those failing validation)")
+            m.inc("slides_review_slides_checked_total", a.get("slides", 0), help="Slides checked by the validation-gated reviewer")
+            m.inc("slides_review_rule_fixes_total", a.get("fixes", 0), help="Changes made by the rule-based reviewer (coercions, cleanups, bullet splits and cuts)")
+        elif span.name == "review.skipped":
+            m.inc("slides_review_slides_checked_total", a.get("slides", 0), help="Slides checked by the validation-gated reviewer")
+            m.inc("slides_review_calls_freed_total", a.get("calls_freed", 0), help="Reviewer calls not spent (draft passed local validation, or model review off)")
+            m.inc("slides_review_rule_fixes_total", a.get("fixes", 0), help="Changes made by the rule-based reviewer (coercions, cleanups, bullet splits and cuts)")
+        elif span.name == "plan.lookup":
+            m.inc("slides_plan_lookups_total", help="Topic index lookups before planning", outcome=a.get("outcome", "miss"))
+            m.observe("slides_plan_lookup_seconds", span.duration, help="Topic index lookup time")
+        elif span.name == "validate":
+            m.inc("slides_validation_errors_total", a.get("errors", 0), help="Validation issues reported by validate_deck")
+            m.observe("slides_validate_seconds", span.duration, help="validate_deck time")
+        elif span.name == "generate":
+            m.inc("slides_decks_total", help="Decks generated", status="error" if span.error else "ok")
+            m.observe("slides_deck_seconds", span.duration, help="End-to-end deck generation time")
+
+    def write_metrics(self) -> None:
+        if self.metrics_path is None:
+            return
+        self.metrics_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.metrics_path.parent, prefix=".tmp-", suffix=".prom")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(self.metrics.render())
+        os.replace(tmp, self.metrics_path)
+
+    def close(self) -> None:
+        with self._lock:
+            self.write_metrics()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def set_tracer(tracer: Optional[Tracer]) -> None:
+    global _TRACER
+    _TRACER = tracer
+
+
+def get_tracer() -> Optional[Tracer]:
+    return _TRACER
+
+
+def enabled() -> bool:
+    """True when spans are being recorded (callers skip computing costly attributes otherwise)."""
+    return _TRACER is not None
+
+
+def annotate(**attrs: Any) -> None:
+    """Add attributes to the current span, if any (lets lower layers report retries or waits)."""
+    if _TRACER is None:
+        return
+    current = _CURRENT.get()
+    if current is not None:
+        current.set(**attrs)
+
+
+def add_to(name: str, value: float) -> None:
+    """Accumulate a numeric attribute on the current span."""
+    if _TRACER is None:
+        return
+    current = _CURRENT.get()
+    if current is not None:
+        current.attrs[name] = round(current.attrs.get(name, 0) + value, 6)
+
+
+def event(name: str, **attrs: Any) -> None:
+    """Record a zero-duration span (something that happened, or was skipped, at this point)."""
+    with span(name, **attrs):
+        pass
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Any]:
+    """Time a block as a child of the current span; a no-op object is yielded when tracing is off."""
+    tracer = _TRACER
+    if tracer is None:
+        yield _NOOP
+        return
+    s = Span(name, _CURRENT.get(), attrs)
+    token = _CURRENT.set(s)
+    started = time.perf_counter()
+    try:
+        yield s
+    except BaseException as e:
+        s.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        s.duration = time.perf_counter() - started
+        _CURRENT.reset(token)
+        tracer.record(s)
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import unicodedata
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+_NON_WORD = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def normalize_title(text: Any) -> str:
+    """Case-, punctuation- and whitespace-insensitive form of a title or intent (Latin and Cyrillic alike)."""
+    if not isinstance(text, str):
+        return ""
+    text = unicodedata.normalize("NFKC", text).casefold().replace("ё", "е").replace("ʼ", "'")
+    return _NON_WORD.sub(" ", text).strip()
+
+
+def load_deck(path: Path) -> List[Dict[str, Any]]:
+    """Slides of an existing deck file: a JSON array or {"slides": [...]}."""
+    data = json.loads(Path(path).read_text(encoding="utf-8-sig"))
+    if isinstance(data, dict):
+        data = data.get("slides")
+    if not isinstance(data, list):
+        raise ValueError(f"{path}: expected a slides array")
+    return [s for s in data if isinstance(s, dict)]
+
+
+def _slide_key(slide: Dict[str, Any]) -> Tuple[str, str]:
+    fields = slide.get("fields") if isinstance(slide.get("fields"), dict) else {}
+    return str(slide.get("layout_key") or ""), normalize_title(fields.get("title"))
+
+
+# ----- plan sidecar: the outline a deck was generated from, for the intents the deck file lacks -----
+
+def plan_path(plans_dir: Path, deck_path: Path) -> Path:
+    digest = hashlib.sha1(str(Path(deck_path).resolve()).encode("utf-8")).hexdigest()[:16]
+    return Path(plans_dir) / f"plan-{digest}.json"
+
+
+def save_plan(plans_dir: Path, deck_path: Path, plan: Dict[str, Any]) -> None:
+    path = plan_path(plans_dir, deck_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = {"deck": str(Path(deck_path).resolve()), "title": plan.get("title"), "outline": plan.get("outline") or []}
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-", suffix=".json")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def load_plan(plans_dir: Path, deck_path: Path) -> Optional[List[Dict[str, Any]]]:
+    try:
+        data = json.loads(plan_path(plans_dir, deck_path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    outline = data.get("outline") if isinstance(data, dict) else None
+    return [it for it in outline if isinstance(it, dict)] if isinstance(outline, list) else None
+
+
+def slide_intents(slides: Sequence[Dict[str, Any]], outline: Optional[Sequence[Dict[str, Any]]]) -> List[Optional[str]]:
+    """Intent per deck slide, taken from the outline item with the same layout_key and title (if any).
+
+    Matching by key rather than position keeps this right when validation dropped a slide or
+    the deck was edited by hand after generation.
+    """
+    pool: Dict[Tuple[str, str], List[Optional[str]]] = {}
+    for it in outline or ():
+        key = (str(it.get("layout_key") or ""), normalize_title(it.get("title")))
+        pool.setdefault(key, []).append(it.get("intent"))
+    out: List[Optional[str]] = []
+    for slide in slides:
+        intents = pool.get(_slide_key(slide))
+        out.append(intents.pop(0) if intents else None)
+    return out
+
+
+# ----- diff -----
+
+def match_outline(
+    outline: Sequence[Dict[str, Any]],
+    slides: Sequence[Dict[str, Any]],
+    intents: Optional[Sequence[Optional[str]]] = None,
+) -> Dict[int, int]:
+    """Map outline index -> index of an existing slide that can be reused verbatim.
+
+    An item matches a slide with the same layout_key and normalized title, when the intents agree
+    as well (an intent known on both sides that differs marks the item as changed). Each slide is
+    reused at most once; duplicates match in deck order.
+    """
+    free: Dict[Tuple[str, str], List[int]] = {}
+    for idx, slide in enumerate(slides):
+        free.setdefault(_slide_key(slide), []).append(idx)
+    matches: Dict[int, int] = {}
+    for i, item in enumerate(outline):
+        candidates = free.get((str(item.get("layout_key") or ""), normalize_title(item.get("title"))))
+        if not candidates:
+            continue
+        want = normalize_title(item.get("intent"))
+        for pos, idx in enumerate(candidates):
+            have = normalize_title(intents[idx]) if intents is not None and idx < len(intents) else ""
+            if not want or not have or want == have:
+                matches[i] = candidates.pop(pos)
+                break
+    return matches
+
+
+def merge_in_order(
+    count: int,
+    reused: Dict[int, Tuple[int, Dict[str, Any]]],
+    drafted: Dict[int, Dict[str, Any]],
+) -> List[Dict[str, Any]]:
+    """Assemble ``count`` outline positions. New slides sit where the plan puts them; reused slides fill
+    the remaining positions in their original deck order, so an update never reshuffles kept slides.
+    """
+    positions = sorted(reused)
+    kept = [slide for _, slide in sorted(reused.values(), key=lambda pair: pair[0])]
+    by_pos = dict(zip(positions, kept))
+    by_pos.update(drafted)
+    return [by_pos[i] for i in range(count) if i in by_pos]
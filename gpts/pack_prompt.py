@@ -5,17 +5,40 @@
 # Usage examples:
 #   python pack_prompt.py --templates templates.json --topic "AI in Education" --audience "Викладачі" --goal "Ознайомлення" --slides 12
 #   python pack_prompt.py --templates templates.json --example slides_example.json --topic "..." --audience "..." --goal "..." --slides 15 --video https://youtube.com/...
+#   python pack_prompt.py --templates ../data/templates.json --auto-examples 3 --topic "..." --audience "..." --goal "..."
 #
 import json, argparse, sys, os
 
+AI_GENERATION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ai_generation")
+
 def read_json_file(path):
     with open(path, "r", encoding="utf-8-sig") as f:
         return json.load(f)
 
+def auto_examples(library_dirs, topic, count):
+    # Pick `count` slides with distinct layouts most relevant to the topic from the deck library
+    # (BM25 index shared with ai_generation, updated for changed files on every run)
+    sys.path.insert(0, AI_GENERATION_DIR)
+    from src.library import DeckLibrary, compact_slide
+
+    library = DeckLibrary(os.path.join(AI_GENERATION_DIR, ".cache", "library.sqlite3"), library_dirs)
+    picked, layouts = [], set()
+    for _, slide in library.search(topic, k=count * 5):
+        if slide["layout_key"] in layouts:
+            continue
+        layouts.add(slide["layout_key"])
+        picked.append(compact_slide(slide))
+        if len(picked) >= count:
+            break
+    library.close()
+    return picked
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--templates", required=True, help="Path to templates.json")
     ap.add_argument("--example", help="Optional path to an example slides JSON (1–2 slides)")
+    ap.add_argument("--auto-examples", type=int, default=0, help="Instead of --example, pick N example slides relevant to --topic from the deck library")
+    ap.add_argument("--library", action="append", default=None, help="Directory of deck JSON files for --auto-examples (repeatable; defaults to the templates.json directory)")
     ap.add_argument("--topic", required=True)
     ap.add_argument("--audience", required=True)
     ap.add_argument("--goal", required=True)
@@ -44,6 +67,11 @@ def main():
             example = read_json_file(args.example)
         except Exception as e:
             print(f"WARNING: cannot read example JSON: {e}", file=sys.stderr)
+    elif args.auto_examples > 0:
+        try:
+            example = auto_examples(args.library or [os.path.dirname(os.path.abspath(args.templates))], args.topic, args.auto_examples) or None
+        except Exception as e:
+            print(f"WARNING: cannot pick examples from the deck library: {e}", file=sys.stderr)
 
     # Build TASK object
     task = {
@@ -3,36 +3,33 @@
 # validate_presentation_json.py
 # Usage:
 #   python validate_presentation_json.py --templates templates.json --candidate slides.json
+#   python validate_presentation_json.py --templates templates.json --candidate out/ "data/slides_*.json" \
+#       --workers 8 --report-json report.json --junit report.xml
+#   python validate_presentation_json.py --templates templates.json --candidate lectures.jsonl
+#
+# slides.jsonl holds one slide object per line. .jsonl files, files over 16 MB and --stream are
+# validated slide by slide in constant memory; errors are printed as found, with byte offsets.
+#
+# Several candidates (files, directories, globs) are validated across a process pool. Results are
+# cached in --cache keyed by the candidate's content hash and the templates hash, so re-checking an
+# unchanged library only stats the files.
 #
 # The templates file must contain a list of layouts where each layout has:
 #   - layout_key: string
 #   - fieldsSchema: object like {"title": "string", "items": "string[]", "footer": "string?"}
 #
-import json, argparse, sys
-
-def parse_field_spec(spec: str):
-    is_optional = spec.endswith("?")
-    if is_optional:
-        spec = spec[:-1]
-    is_array = spec.endswith("[]")
-    base = spec[:-2] if is_array else spec
-    return base, is_array, is_optional
-
-def type_check(value, base, is_array):
-    if is_array:
-        if not isinstance(value, list):
-            return False
-        if base == "string":
-            return all(isinstance(x, str) for x in value)
-        if base == "object":
-            return all(isinstance(x, dict) for x in value)
-        return True
-    else:
-        if base == "string":
-            return isinstance(value, str)
-        if base == "object":
-            return isinstance(value, dict)
-        return True
+# Field specs are checked with the compiled validator in ai_generation/src/fieldspec.py
+# (full grammar: unions, [T], {a, b?}, named Image/Video, enums); compiled layouts are cached
+# by a hash of the templates.
+#
+import json, argparse, glob, hashlib, os, sys, time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from xml.sax.saxutils import escape, quoteattr
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ai_generation"))
+from src.fieldspec import compile_layouts  # noqa: E402
+from src.jsonstream import iter_slide_file  # noqa: E402
 
 def load_templates(path: str):
     with open(path, "r", encoding="utf-8-sig") as f:
@@ -55,51 +52,252 @@ def load_templates(path: str):
         raise ValueError("No layouts with 'layout_key' and 'fieldsSchema' found.")
     return layouts
 
+def validate_slide(ctx, slide, layouts, compiled):
+    # fast path: a slide that matches its layout exactly needs no messages
+    if compiled.is_valid_slide(slide) and slide["fields"].keys() <= layouts[slide["layout_key"]].keys():
+        return []
+    if not isinstance(slide, dict):
+        return [f"{ctx}: must be an object."]
+    lk = slide.get("layout_key")
+    fields = slide.get("fields")
+    if not isinstance(lk, str):
+        return [f"{ctx}: layout_key must be a string."]
+    if lk not in layouts:
+        return [f"{ctx}: layout_key '{lk}' is not in templates."]
+    if not isinstance(fields, dict):
+        return [f"{ctx}: fields must be an object."]
+    schema = layouts[lk]
+    errors = []
+    for kind, fname, _ in compiled.get(lk).issues(fields, allow_extra=False):
+        if kind == "missing":
+            errors.append(f"{ctx}: missing required field '{fname}' for layout '{lk}'.")
+        elif kind == "type":
+            errors.append(f"{ctx}: field '{fname}' has wrong type; expected '{schema[fname]}'.")
+        else:
+            errors.append(f"{ctx}: extra field '{fname}' not defined in schema for layout '{lk}'.")
+    return errors
+
 def validate_candidate(candidate, layouts):
     if not isinstance(candidate, list):
         return ["Root must be a JSON array of slides."]
+    compiled = compile_layouts(layouts)
     errors = []
     for idx, slide in enumerate(candidate):
-        ctx = f"Slide[{idx}]"
-        if not isinstance(slide, dict):
-            errors.append(f"{ctx}: must be an object.")
-            continue
-        lk = slide.get("layout_key")
-        fields = slide.get("fields")
-        if not isinstance(lk, str):
-            errors.append(f"{ctx}: layout_key must be a string.")
-            continue
-        if lk not in layouts:
-            errors.append(f"{ctx}: layout_key '{lk}' is not in templates.")
-            continue
-        if not isinstance(fields, dict):
-            errors.append(f"{ctx}: fields must be an object.")
+        errors.extend(validate_slide(f"Slide[{idx}]", slide, layouts, compiled))
+    return errors
+
+def iter_stream_errors(path, layouts):
+    """Validate a deck without loading it: slides are parsed one at a time and errors yielded as found.
+
+    Works on a JSON array / {"slides": [...]} file or a line-delimited slides.jsonl file; each
+    message carries the slide index and the byte offset where the slide starts.
+    """
+    compiled = compile_layouts(layouts)
+    for idx, offset, slide, parse_error in iter_slide_file(path):
+        if idx < 0:
+            yield f"File (byte {offset}): {parse_error}."
+        elif parse_error is not None:
+            yield f"Slide[{idx}] (byte {offset}): invalid JSON: {parse_error}."
+        else:
+            yield from validate_slide(f"Slide[{idx}] (byte {offset})", slide, layouts, compiled)
+
+# ===== Bulk mode =====
+
+CACHE_VERSION = 1
+# candidates at least this large (and every .jsonl) are validated with the streaming parser
+STREAM_MIN_BYTES = 16 * 1024 * 1024
+
+def looks_like_deck(path):
+    """Whether a *.json found in a directory is a deck: a slides array or {"slides": [...]} whose
+    objects carry layout_key. Theme lists and other data files sit next to decks in data/ and are
+    skipped; unreadable files and files too large to load here are kept so validation reports them.
+    """
+    try:
+        if os.path.getsize(path) >= STREAM_MIN_BYTES:
+            return True
+        with open(path, "r", encoding="utf-8-sig") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return True
+    if isinstance(data, dict):
+        data = data.get("slides")
+    if not isinstance(data, list):
+        return False
+    objects = [s for s in data if isinstance(s, dict)]
+    return not objects or any("layout_key" in s for s in objects)
+
+def expand_candidates(patterns, skip=()):
+    """Files, directories (their decks among *.json, and *.jsonl; non-recursive) and glob patterns -> sorted unique paths.
+
+    Files in ``skip`` (the templates file) are left out of directory scans.
+    """
+    skip = {os.path.realpath(s) for s in skip}
+    paths = []
+    for pat in patterns:
+        if os.path.isdir(pat):
+            decks = [m for m in glob.glob(os.path.join(pat, "*.json")) if os.path.realpath(m) not in skip and looks_like_deck(m)]
+            matches = decks + glob.glob(os.path.join(pat, "*.jsonl"))
+        elif glob.has_magic(pat):
+            matches = [m for m in glob.glob(pat, recursive=True) if os.path.isfile(m)]
+        else:
+            matches = [pat]
+        paths.extend(os.path.normpath(m) for m in matches)
+    return sorted(set(paths))
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def load_results_cache(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") == CACHE_VERSION and isinstance(data.get("files"), dict):
+            return data["files"]
+    except (OSError, ValueError, AttributeError):
+        pass
+    return {}
+
+def save_results_cache(path, files):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": CACHE_VERSION, "files": files}, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+_WORKER_LAYOUTS = None
+
+def _init_worker(templates_path):
+    global _WORKER_LAYOUTS
+    _WORKER_LAYOUTS = load_templates(templates_path)
+
+def use_stream(path, force=False):
+    return force or path.lower().endswith(".jsonl") or os.path.getsize(path) >= STREAM_MIN_BYTES
+
+def validate_file(path, layouts=None, stream=False):
+    """Validate one candidate file; returns {"status": passed|failed|error, "errors": [...], "time": s}."""
+    layouts = layouts if layouts is not None else _WORKER_LAYOUTS
+    started = time.perf_counter()
+    try:
+        if use_stream(path, stream):
+            errors = list(iter_stream_errors(path, layouts))
+        else:
+            with open(path, "r", encoding="utf-8-sig") as f:
+                candidate = json.load(f)
+            errors = validate_candidate(candidate, layouts)
+    except Exception as e:
+        return {"status": "error", "errors": [f"cannot load candidate JSON: {e}"], "time": time.perf_counter() - started}
+    return {"status": "failed" if errors else "passed", "errors": errors, "time": time.perf_counter() - started}
+
+def validate_many(paths, templates_path, *, workers=None, cache_path=None, stream=False):
+    """Validate many files, reusing cached results; returns {path: result} with "cached" flags."""
+    templates_hash = file_sha256(templates_path)
+    cache = load_results_cache(cache_path) if cache_path else {}
+    results, todo, hashes = {}, [], {}
+    for path in paths:
+        started = time.perf_counter()
+        try:
+            st = os.stat(path)
+        except OSError as e:
+            results[path] = {"status": "error", "errors": [f"cannot read candidate: {e}"], "time": 0.0, "cached": False}
             continue
-        schema = layouts[lk]
-        for fname, spec in schema.items():
-            base, is_array, is_optional = parse_field_spec(spec)
-            if not is_optional and fname not in fields:
-                errors.append(f"{ctx}: missing required field '{fname}' for layout '{lk}'.")
+        entry = cache.get(path)
+        # unchanged size+mtime -> trust the stored content hash instead of re-reading the file
+        if entry and entry.get("size") == st.st_size and entry.get("mtime_ns") == st.st_mtime_ns:
+            digest = entry.get("sha256")
+        else:
+            digest = file_sha256(path)
+        hashes[path] = (digest, st.st_size, st.st_mtime_ns)
+        if entry and entry.get("sha256") == digest and entry.get("templates") == templates_hash and entry.get("stream") == stream:
+            results[path] = dict(entry["result"], time=time.perf_counter() - started, cached=True)
+        else:
+            todo.append(path)
+
+    if todo:
+        workers = workers or os.cpu_count() or 1
+        if workers <= 1 or len(todo) == 1:
+            layouts = load_templates(templates_path)
+            fresh = [validate_file(p, layouts, stream) for p in todo]
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(todo)), initializer=_init_worker, initargs=(templates_path,)) as pool:
+                fresh = list(pool.map(partial(validate_file, stream=stream), todo, chunksize=max(1, len(todo) // (workers * 4))))
+        for path, res in zip(todo, fresh):
+            results[path] = dict(res, cached=False)
+
+    if cache_path:
+        for path, (digest, size, mtime_ns) in hashes.items():
+            res = results[path]
+            if res["status"] == "error":
+                cache.pop(path, None)
                 continue
-            if fname in fields and not type_check(fields[fname], base, is_array):
-                errors.append(f"{ctx}: field '{fname}' has wrong type; expected '{spec}'.")
-        for fname in fields.keys():
-            if fname not in schema:
-                errors.append(f"{ctx}: extra field '{fname}' not defined in schema for layout '{lk}'.")
-    return errors
+            cache[path] = {
+                "sha256": digest,
+                "size": size,
+                "mtime_ns": mtime_ns,
+                "templates": templates_hash,
+                "stream": stream,
+                "result": {"status": res["status"], "errors": res["errors"]},
+            }
+        save_results_cache(cache_path, cache)
+    return {p: results[p] for p in paths}
+
+def write_json_report(path, results, wall_time):
+    report = {
+        "total": len(results),
+        "passed": sum(1 for r in results.values() if r["status"] == "passed"),
+        "failed": sum(1 for r in results.values() if r["status"] == "failed"),
+        "error": sum(1 for r in results.values() if r["status"] == "error"),
+        "cached": sum(1 for r in results.values() if r.get("cached")),
+        "wall_time": round(wall_time, 6),
+        "files": [dict(r, file=p, time=round(r["time"], 6)) for p, r in results.items()],
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+def write_junit_report(path, results, wall_time):
+    failed = sum(1 for r in results.values() if r["status"] == "failed")
+    errored = sum(1 for r in results.values() if r["status"] == "error")
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        f'<testsuite name="validate_presentation_json" tests="{len(results)}" failures="{failed}" errors="{errored}" time="{wall_time:.6f}">',
+    ]
+    for p, r in results.items():
+        lines.append(f'  <testcase classname="presentation" name={quoteattr(p)} time="{r["time"]:.6f}">')
+        if r["status"] != "passed":
+            tag = "failure" if r["status"] == "failed" else "error"
+            message = quoteattr(f"{len(r['errors'])} issue(s)")
+            body = escape("\n".join(r["errors"]))
+            lines.append(f'    <{tag} message={message}>{body}</{tag}>')
+        lines.append("  </testcase>")
+    lines.append("</testsuite>")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--templates", required=True)
-    parser.add_argument("--candidate", required=True)
+    parser.add_argument("--candidate", required=True, nargs="+", help="Files, directories or glob patterns")
+    parser.add_argument("--workers", type=int, default=None, help="Processes for bulk validation (default: CPU count)")
+    parser.add_argument("--cache", default=".validate_cache.json", help="Results cache for bulk validation")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--report-json", default=None, help="Write a JSON report with per-file timings")
+    parser.add_argument("--junit", default=None, help="Write a JUnit XML report")
+    parser.add_argument("--stream", action="store_true", help="Parse slides one at a time (constant memory); errors carry byte offsets")
     args = parser.parse_args()
+    bulk = len(args.candidate) > 1 or any(os.path.isdir(c) or glob.has_magic(c) for c in args.candidate) or args.report_json or args.junit
+    if bulk:
+        sys.exit(bulk_main(args))
     try:
         layouts = load_templates(args.templates)
     except Exception as e:
         print(f"ERROR: cannot load templates: {e}", file=sys.stderr)
         sys.exit(2)
+    if use_stream(args.candidate[0], args.stream):
+        sys.exit(stream_main(args.candidate[0], layouts))
     try:
-        with open(args.candidate, "r", encoding="utf-8") as f:
+        with open(args.candidate[0], "r", encoding="utf-8-sig") as f:
             candidate = json.load(f)
     except Exception as e:
         print(f"ERROR: cannot load candidate JSON: {e}", file=sys.stderr)
@@ -114,5 +312,49 @@ def main():
         print("✅ Validation passed.")
         sys.exit(0)
 
+def stream_main(path, layouts):
+    try:
+        open(path, "rb").close()
+    except OSError as e:
+        print(f"ERROR: cannot load candidate JSON: {e}", file=sys.stderr)
+        return 2
+    failed = False
+    for e in iter_stream_errors(path, layouts):
+        if not failed:
+            print("❌ Validation failed:")
+            failed = True
+        print(" -", e, flush=True)
+    if failed:
+        return 1
+    print("✅ Validation passed.")
+    return 0
+
+def bulk_main(args):
+    started = time.perf_counter()
+    paths = expand_candidates(args.candidate, skip=[args.templates])
+    if not paths:
+        print("ERROR: no candidate files matched.", file=sys.stderr)
+        return 2
+    try:
+        load_templates(args.templates)
+    except Exception as e:
+        print(f"ERROR: cannot load templates: {e}", file=sys.stderr)
+        return 2
+    results = validate_many(paths, args.templates, workers=args.workers, cache_path=None if args.no_cache else args.cache, stream=args.stream)
+    wall = time.perf_counter() - started
+    for p, r in results.items():
+        mark = {"passed": "✅", "failed": "❌", "error": "⚠️"}[r["status"]]
+        print(f"{mark} {p} ({r['time'] * 1000:.1f} ms{', cached' if r.get('cached') else ''})")
+        for e in r["errors"]:
+            print("   -", e)
+    bad = sum(1 for r in results.values() if r["status"] != "passed")
+    cached = sum(1 for r in results.values() if r.get("cached"))
+    print(f"{len(results) - bad}/{len(results)} passed, {cached} from cache, {wall * 1000:.1f} ms")
+    if args.report_json:
+        write_json_report(args.report_json, results, wall)
+    if args.junit:
+        write_junit_report(args.junit, results, wall)
+    return 1 if bad else 0
+
 if __name__ == "__main__":
     main()